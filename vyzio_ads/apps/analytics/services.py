@@ -4,9 +4,13 @@ Services pour le tracking d'événements et calcul d'analytics
 from django.db.models import Sum, Count, Avg, F, Q
 from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from decimal import Decimal
+import base64
+import binascii
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -153,7 +157,7 @@ class AnalyticsService:
         
         # Métriques financières
         payments = Payment.objects.filter(
-            listing__seller=seller,
+            seller=seller,
             status='completed',
             created_at__gte=start_date
         )
@@ -251,7 +255,7 @@ class AnalyticsService:
         start_date = end_date - timedelta(days=days)
         
         payments = Payment.objects.filter(
-            listing__seller=seller,
+            seller=seller,
             status='completed',
             created_at__gte=start_date
         )
@@ -308,7 +312,7 @@ class AnalyticsService:
             created_at__gte=mid_date
         )
         current_payments = Payment.objects.filter(
-            listing__seller=seller,
+            seller=seller,
             status='completed',
             created_at__gte=mid_date
         )
@@ -320,7 +324,7 @@ class AnalyticsService:
             created_at__lt=mid_date
         )
         previous_payments = Payment.objects.filter(
-            listing__seller=seller,
+            seller=seller,
             status='completed',
             created_at__gte=start_date,
             created_at__lt=mid_date
@@ -351,6 +355,84 @@ class AnalyticsService:
         }
 
 
+def encode_payment_cursor(created_at, payment_id):
+    """Curseur opaque sur (created_at, id)"""
+    raw = f'{created_at.isoformat()}|{payment_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_payment_cursor(cursor):
+    """
+    Returns:
+        (created_at, id) — ValueError si le curseur est invalide
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, payment_id = raw.split('|', 1)
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            raise ValueError(cursor)
+        return parsed, uuid.UUID(payment_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(cursor) from e
+
+
+class PaymentHistoryService:
+    """
+    Historique des paiements d'un vendeur.
+    Lu via l'index (seller, -created_at, -id) de Payment, sans jointure par
+    l'annonce pour le filtre, en ne chargeant que les champs affichés.
+    """
+    
+    # Champs affichés par le dashboard et l'export
+    FIELDS = (
+        'id', 'created_at', 'amount', 'payment_type', 'status',
+        'listing_id', 'listing__title', 'user_id', 'user__username',
+    )
+    
+    @staticmethod
+    def queryset(seller, fields=FIELDS):
+        from apps.payments.models import Payment
+        
+        return Payment.objects.filter(seller=seller).order_by('-created_at', '-id').values(*fields)
+    
+    @staticmethod
+    def page(seller, cursor=None, limit=20):
+        """
+        Page de l'historique, du plus récent au plus ancien.
+        
+        Args:
+            seller: Vendeur
+            cursor: Curseur renvoyé par la page précédente (next_cursor)
+            limit: Taille de la page
+        
+        Returns:
+            (lignes, next_cursor) — next_cursor vaut None sur la dernière page
+        
+        Raises:
+            ValueError: si le curseur est invalide
+        """
+        queryset = PaymentHistoryService.queryset(seller)
+        if cursor:
+            created_at, payment_id = decode_payment_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=payment_id)
+            )
+        
+        rows = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_payment_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_cursor
+    
+    @staticmethod
+    def count(seller) -> int:
+        from apps.payments.models import Payment
+        
+        return Payment.objects.filter(seller=seller).count()
+
+
 class ExportService:
     """Service pour l'export de données"""
     
@@ -398,7 +480,6 @@ class ExportService:
         """Exporter les paiements en CSV"""
         import csv
         from io import StringIO
-        from apps.payments.models import Payment
         
         output = StringIO()
         writer = csv.writer(output)
@@ -409,20 +490,21 @@ class ExportService:
             'Type', 'Statut', 'Transaction Stripe'
         ])
         
-        payments = Payment.objects.filter(
-            listing__seller=seller
-        ).select_related('listing', 'user').order_by('-created_at')
+        payments = PaymentHistoryService.queryset(seller, fields=(
+            'id', 'created_at', 'listing__title', 'user__email', 'amount',
+            'payment_type', 'status', 'stripe_payment_intent_id',
+        ))
         
-        for payment in payments:
+        for payment in payments.iterator(chunk_size=2000):
             writer.writerow([
-                str(payment.id),
-                payment.created_at.strftime('%Y-%m-%d %H:%M'),
-                payment.listing.title if payment.listing else '',
-                payment.user.email if payment.user else '',
-                str(payment.amount),
-                payment.payment_type,
-                payment.status,
-                payment.stripe_payment_intent_id or '',
+                str(payment['id']),
+                payment['created_at'].strftime('%Y-%m-%d %H:%M'),
+                payment['listing__title'] or '',
+                payment['user__email'] or '',
+                str(payment['amount']),
+                payment['payment_type'],
+                payment['status'],
+                payment['stripe_payment_intent_id'] or '',
             ])
         
         return output.getvalue()
@@ -288,6 +288,21 @@ class TestExportService:
         assert 'ID' in csv_content
         assert 'Montant' in csv_content
     
+    def test_export_payments_csv_uses_denormalized_seller(self, seller, buyer, listing):
+        """Le vendeur est recopié depuis l'annonce à la création du paiement"""
+        from apps.payments.models import Payment
+        payment = Payment.objects.create(
+            user=buyer, amount=Decimal('42.00'), payment_type='purchase', listing=listing,
+            stripe_payment_intent_id='pi_export',
+        )
+        assert payment.seller_id == seller.id
+        
+        csv_content = ExportService.export_payments_csv(seller)
+        
+        assert str(payment.id) in csv_content
+        assert 'pi_export' in csv_content
+        assert buyer.email in csv_content
+    
     def test_export_reviews_csv(self, seller):
         """Test export CSV des avis"""
         csv_content = ExportService.export_reviews_csv(seller)
@@ -375,6 +390,47 @@ class TestDashboardViewSet:
         assert 'payments' in response.data
         assert 'total' in response.data
     
+    def test_payments_cursor_pagination(self, seller_client, buyer, listing, another_listing,
+                                        django_assert_num_queries):
+        """Pagination par curseur, requêtes constantes, champs affichés seulement"""
+        from apps.payments.models import Payment
+        client, seller = seller_client
+        now = timezone.now()
+        for i in range(5):
+            payment = Payment.objects.create(
+                user=buyer, amount=Decimal('10.00') + i, payment_type='purchase',
+                status='completed', listing=listing if i % 2 else another_listing,
+            )
+            # Deux paiements à la même date : départagés par l'id
+            Payment.objects.filter(pk=payment.pk).update(created_at=now - timedelta(minutes=min(i, 3)))
+        # Paiement d'un autre vendeur
+        Payment.objects.create(user=seller, amount=Decimal('1.00'), payment_type='subscription')
+        
+        url = analytics_url('dashboard-payments')
+        seen = []
+        cursor = None
+        for _page in range(3):
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            with django_assert_num_queries(1 if cursor else 2):
+                response = client.get(url, params)
+            assert response.status_code == status.HTTP_200_OK
+            seen.extend(p['id'] for p in response.data['payments'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        
+        assert len(seen) == len(set(seen)) == 5
+        assert not response.data['has_more']
+        first = client.get(url, {'limit': 2}).data
+        assert first['total'] == 5
+        assert first['payments'][0]['buyer']['username'] == buyer.username
+        assert first['payments'][0]['listing']['title'] in (listing.title, another_listing.title)
+    
+    def test_payments_invalid_cursor(self, seller_client):
+        client, _ = seller_client
+        response = client.get(analytics_url('dashboard-payments'), {'cursor': 'not-a-cursor'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
     def test_recent_activity_endpoint(self, seller_client):
         """Test endpoint activité récente"""
         client, _ = seller_client
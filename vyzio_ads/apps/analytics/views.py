@@ -18,7 +18,7 @@ from .serializers import (
     ListingAnalyticsSerializer, RevenueAnalyticsSerializer,
     TrendsSerializer, QuickListingSerializer
 )
-from .services import EventTracker, AnalyticsService, ExportService
+from .services import EventTracker, AnalyticsService, ExportService, PaymentHistoryService
 from apps.users.permissions import IsSeller
 
 
@@ -130,47 +130,51 @@ class DashboardViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def payments(self, request):
         """
-        Obtenir l'historique des paiements
-        GET /api/analytics/dashboard/payments/?page=1&limit=20
-        """
-        from apps.payments.models import Payment
-        
-        page = int(request.query_params.get('page', 1))
-        limit = int(request.query_params.get('limit', 20))
-        limit = min(limit, 100)
-        
-        offset = (page - 1) * limit
+        Obtenir l'historique des paiements (pagination par curseur)
+        GET /api/analytics/dashboard/payments/?limit=20
+        GET /api/analytics/dashboard/payments/?cursor=<next_cursor>
         
-        payments = Payment.objects.filter(
-            listing__seller=request.user
-        ).select_related('listing', 'user').order_by('-created_at')
+        `total` n'est renvoyé que pour la première page.
+        """
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+        limit = min(max(limit, 1), 100)
         
-        total = payments.count()
-        payments = payments[offset:offset + limit]
+        try:
+            payments, next_cursor = PaymentHistoryService.page(
+                request.user,
+                cursor=request.query_params.get('cursor'),
+                limit=limit,
+            )
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
         
         result = []
         for payment in payments:
             result.append({
-                'id': str(payment.id),
-                'date': payment.created_at.isoformat(),
+                'id': str(payment['id']),
+                'date': payment['created_at'].isoformat(),
                 'listing': {
-                    'id': str(payment.listing.id) if payment.listing else None,
-                    'title': payment.listing.title if payment.listing else None,
+                    'id': str(payment['listing_id']) if payment['listing_id'] else None,
+                    'title': payment['listing__title'],
                 },
                 'buyer': {
-                    'id': str(payment.user.id) if payment.user else None,
-                    'username': payment.user.username if payment.user else None,
+                    'id': str(payment['user_id']),
+                    'username': payment['user__username'],
                 },
-                'amount': str(payment.amount),
-                'payment_type': payment.payment_type,
-                'status': payment.status,
+                'amount': str(payment['amount']),
+                'payment_type': payment['payment_type'],
+                'status': payment['status'],
             })
         
         return Response({
             'payments': result,
-            'total': total,
-            'page': page,
-            'pages': (total + limit - 1) // limit
+            # Compté sur l'index, et seulement pour la première page
+            'total': None if request.query_params.get('cursor') else PaymentHistoryService.count(request.user),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
         })
     
     @action(detail=False, methods=['get'])
@@ -359,7 +363,7 @@ class KPIView(APIView):
         
         # KPIs revenus (30 derniers jours)
         month_payments = Payment.objects.filter(
-            listing__seller=user,
+            seller=user,
             status='completed',
             created_at__date__gte=month_ago
         )
@@ -0,0 +1,29 @@
+"""
+Recalcule les compteurs de favoris des annonces (Listing.favorites_count).
+
+Usage:
+    python manage.py reconcile_favorites --dry-run  # Lister les écarts
+    python manage.py reconcile_favorites            # Corriger
+"""
+from django.core.management.base import BaseCommand
+
+from apps.listings.services.favorites import FavoriteService
+
+
+class Command(BaseCommand):
+    help = 'Recalcule favorites_count depuis les favoris (une requête groupée)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche les écarts sans corriger')
+
+    def handle(self, *args, **options):
+        wrong = FavoriteService.reconcile_counts(dry_run=options['dry_run'])
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('✅ Aucun écart'))
+            return
+
+        action = 'à corriger' if options['dry_run'] else 'corrigée(s)'
+        self.stdout.write(self.style.WARNING(f'⚠️ {len(wrong)} annonce(s) {action}'))
+        for listing_id in wrong[:20]:
+            self.stdout.write(f'  {listing_id}')
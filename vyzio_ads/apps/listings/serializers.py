@@ -83,17 +83,56 @@ class ListingVideoSerializer(serializers.ModelSerializer):
         fields = ('id', 'video_url', 'platform')
 
 
+def is_favorite_listing(serializer, obj):
+    """
+    État favori d'une annonce pour l'utilisateur de la requête.
+    Lu dans context['favorite_ids'] (une requête par page), sinon une requête.
+    """
+    favorite_ids = serializer.context.get('favorite_ids')
+    if favorite_ids is None:
+        from apps.listings.services.favorites import FavoriteService
+        request = serializer.context.get('request')
+        favorite_ids = FavoriteService.favorited_listing_ids(request and request.user, [obj.pk])
+    return obj.pk in favorite_ids
+
+
+class ListingPageSerializer(serializers.ListSerializer):
+    """Liste d'annonces : favoris de l'utilisateur chargés en une requête pour la page"""
+    
+    def to_representation(self, data):
+        listings = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        if request is not None and 'favorite_ids' not in self.context:
+            from apps.listings.services.favorites import FavoriteService
+            self.context['favorite_ids'] = FavoriteService.favorited_listing_ids(
+                request.user, [listing.pk for listing in listings]
+            )
+        return super().to_representation(listings)
+
+
 class ListingListSerializer(serializers.ModelSerializer):
     seller = UserProfileSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     primary_image = serializers.SerializerMethodField()
+    # Présent seulement quand la requête est dans le contexte
+    is_favorite = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = ('id', 'title', 'slug', 'price', 'location', 'listing_type', 'condition', 'status',
                   'seller', 'category', 'primary_image', 'views_count', 'is_boosted', 
-                  'created_at', 'favorites_count')
+                  'created_at', 'favorites_count', 'is_favorite')
         read_only_fields = ('id', 'views_count', 'created_at')
+        list_serializer_class = ListingPageSerializer
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'request' not in self.context:
+            fields.pop('is_favorite')
+        return fields
+    
+    def get_is_favorite(self, obj):
+        return is_favorite_listing(self, obj)
     
     def get_primary_image(self, obj):
         """Retourne l'image principale avec variantes (thumbnail, card)"""
@@ -122,10 +161,7 @@ class ListingDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'views_count', 'created_at', 'updated_at')
     
     def get_is_favorite(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, listing=obj).exists()
-        return False
+        return is_favorite_listing(self, obj)
 
 
 class ListingCreateUpdateSerializer(serializers.ModelSerializer):
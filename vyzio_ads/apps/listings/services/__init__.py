@@ -14,6 +14,7 @@ from .storage import (
     is_cloudinary_configured,
     IMAGE_TRANSFORMATIONS,
 )
+from .favorites import FavoriteService
 
 __all__ = [
     'upload_image',
@@ -27,4 +28,5 @@ __all__ = [
     'cleanup_orphaned_images',
     'is_cloudinary_configured',
     'IMAGE_TRANSFORMATIONS',
+    'FavoriteService',
 ]
@@ -0,0 +1,135 @@
+"""
+Service des favoris (annonces et vendeurs).
+
+Les grilles d'annonces et les cartes vendeurs ont besoin de savoir, pour
+toute une page, ce que l'utilisateur a mis en favori : une seule requête
+(IN) par page au lieu d'un exists() par carte.
+
+Les favoris d'annonces (listings.Favorite, exposé aussi par l'app reviews)
+passent tous par add_listing / remove_listing : Listing.favorites_count est
+ajusté avec F() dans la même transaction. Les suppressions en cascade (compte
+utilisateur supprimé) sont rattrapées par `reconcile_favorites`.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import uuid
+
+
+class FavoriteService:
+    """Favoris d'un utilisateur : lecture en lot, ajout et retrait."""
+
+    MAX_BULK_IDS = 100
+
+    @staticmethod
+    def parse_ids(raw_ids) -> list:
+        """
+        Ids séparés par des virgules ("a,b,c") -> liste d'UUID normalisés.
+
+        Raises:
+            ValueError: si un id n'est pas un UUID ou s'il y en a trop
+        """
+        ids = [value.strip() for value in (raw_ids or '').split(',') if value.strip()]
+        if len(ids) > FavoriteService.MAX_BULK_IDS:
+            raise ValueError(f'Maximum {FavoriteService.MAX_BULK_IDS} ids')
+        return list(dict.fromkeys(str(uuid.UUID(value)) for value in ids))
+
+    @staticmethod
+    def favorited_listing_ids(user, listing_ids) -> set:
+        """Sous-ensemble des annonces que l'utilisateur a en favori (une requête)."""
+        from apps.listings.models import Favorite
+
+        listing_ids = list(listing_ids)
+        if not listing_ids or user is None or not user.is_authenticated:
+            return set()
+        return set(
+            Favorite.objects.filter(user=user, listing_id__in=listing_ids).values_list('listing_id', flat=True)
+        )
+
+    @staticmethod
+    def favorited_seller_ids(user, seller_ids) -> set:
+        """Sous-ensemble des vendeurs que l'utilisateur a en favori (une requête)."""
+        from apps.reviews.models import FavoriteSeller
+
+        seller_ids = list(seller_ids)
+        if not seller_ids or user is None or not user.is_authenticated:
+            return set()
+        return set(
+            FavoriteSeller.objects.filter(user=user, seller_id__in=seller_ids).values_list('seller_id', flat=True)
+        )
+
+    @staticmethod
+    def add_listing(user, listing):
+        """
+        Met une annonce en favori.
+
+        Returns:
+            (favori, créé) — créé vaut False si elle l'était déjà
+        """
+        from apps.listings.models import Favorite, Listing
+
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(user=user, listing=listing)
+            if created:
+                Listing.objects.filter(pk=listing.pk).update(favorites_count=F('favorites_count') + 1)
+        return favorite, created
+
+    @staticmethod
+    def remove_listing(user, listing_id) -> bool:
+        """Retire une annonce des favoris. Retourne False si elle n'y était pas."""
+        from apps.listings.models import Favorite, Listing
+
+        with transaction.atomic():
+            deleted, _ = Favorite.objects.filter(user=user, listing_id=listing_id).delete()
+            if deleted:
+                Listing.objects.filter(pk=listing_id, favorites_count__gt=0).update(
+                    favorites_count=F('favorites_count') - 1
+                )
+        return bool(deleted)
+
+    @staticmethod
+    def toggle_listing(user, listing):
+        """
+        Bascule l'état favori d'une annonce.
+
+        Returns:
+            (favori ou None, est_favori)
+        """
+        if FavoriteService.remove_listing(user, listing.pk):
+            return None, False
+        favorite, _created = FavoriteService.add_listing(user, listing)
+        return favorite, True
+
+    @staticmethod
+    def reconcile_counts(dry_run=False) -> list:
+        """
+        Recalcule Listing.favorites_count depuis les favoris.
+
+        Une requête groupée pour les comptes réels, une lecture des compteurs,
+        puis un UPDATE par lot de 1000 annonces fausses, recalculé par
+        sous-requête : les basculements concurrents ne sont pas écrasés par une
+        valeur lue avant.
+
+        Returns:
+            Ids des annonces dont le compteur était faux
+        """
+        from apps.listings.models import Favorite, Listing
+
+        counts = dict(
+            Favorite.objects.order_by().values('listing_id').annotate(n=Count('id')).values_list('listing_id', 'n')
+        )
+        wrong = [
+            listing_id
+            for listing_id, stored in Listing.objects.values_list('id', 'favorites_count').iterator(chunk_size=2000)
+            if stored != counts.get(listing_id, 0)
+        ]
+
+        if wrong and not dry_run:
+            favorites = Favorite.objects.filter(listing_id=OuterRef('pk')).order_by().values('listing_id').annotate(
+                n=Count('id')
+            ).values('n')
+            for start in range(0, len(wrong), 1000):
+                Listing.objects.filter(pk__in=wrong[start:start + 1000]).update(
+                    favorites_count=Coalesce(Subquery(favorites), 0)
+                )
+        return wrong
@@ -639,3 +639,48 @@ class TestModels:
             status='draft'
         )
         assert listing2.slug == 'produit-test-1'
+
+
+# ============================================
+# TESTS ÉTAT FAVORI (SÉRIALISEURS)
+# ============================================
+
+@pytest.mark.django_db
+class TestFavoriteState:
+    """is_favorite chargé en une requête par page"""
+    
+    def _request(self, user):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from rest_framework.request import Request
+        
+        django_request = APIRequestFactory().get('/')
+        force_authenticate(django_request, user=user)
+        request = Request(django_request)
+        request.user = user
+        return request
+    
+    def test_list_serializer_single_favorite_query(self, buyer_user, published_listing, published_listing2):
+        """Une seule requête sur les favoris pour toute la page"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.listings.serializers import ListingListSerializer
+        
+        Favorite.objects.create(user=buyer_user, listing=published_listing2)
+        listings = Listing.objects.filter(status='published').select_related('seller', 'category')
+        
+        with CaptureQueriesContext(connection) as queries:
+            data = ListingListSerializer(
+                listings, many=True, context={'request': self._request(buyer_user)}
+            ).data
+        
+        favorite_queries = [q for q in queries.captured_queries if 'listings_favorite' in q['sql']]
+        assert len(favorite_queries) == 1
+        states = {item['id']: item['is_favorite'] for item in data}
+        assert states == {str(published_listing.id): False, str(published_listing2.id): True}
+    
+    def test_is_favorite_omitted_without_request(self, published_listing):
+        """Sans requête dans le contexte, le champ est absent"""
+        from apps.listings.serializers import ListingListSerializer
+        
+        data = ListingListSerializer([published_listing], many=True).data
+        assert 'is_favorite' not in data[0]
@@ -6,11 +6,12 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from .models import Listing, Category, ListingImage, Favorite
+from .models import Listing, Category, ListingImage
 from .serializers import (ListingListSerializer, ListingDetailSerializer, 
                          ListingCreateUpdateSerializer, CategorySerializer, 
                          ListingImageSerializer, FavoriteSerializer)
 from .filters import ListingFilter
+from apps.users.entitlements import EntitlementService
 from apps.users.permissions import IsOwnListingOrReadOnly, IsSellerOrReadOnly
 
 
@@ -87,6 +88,7 @@ class ListingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Crée l'annonce avec le vendeur actuel après vérification des droits"""
         user = self.request.user
+        entitlements = EntitlementService.for_request(self.request)
         
         # Vérifier si le vendeur peut publier
         can_publish, reason = self._check_can_publish(user)
@@ -98,22 +100,21 @@ class ListingViewSet(viewsets.ModelViewSet):
         status_value = self.request.data.get('status', 'draft')
         
         # Si pas d'abonnement actif et pas de crédits, forcer en draft
-        if not self._has_active_subscription(user) and not self._has_credits(user):
+        if not entitlements.has_active_subscription and not entitlements.has_credits:
             status_value = 'pending_payment'
         
         listing = serializer.save(seller=user, status=status_value)
         
         # Déduire un crédit si pay-per-post
-        if status_value == 'published' and not self._has_active_subscription(user):
+        if status_value == 'published' and not entitlements.has_active_subscription:
             self._use_credit(user)
         
         # Incrémenter le compteur d'annonces de l'abonnement
-        if self._has_active_subscription(user):
-            try:
-                user.subscription.listings_used += 1
-                user.subscription.save(update_fields=['listings_used'])
-            except Exception:
-                pass
+        if entitlements.has_active_subscription:
+            from django.db.models import F
+            from apps.payments.models import Subscription
+            Subscription.objects.filter(user=user).update(listings_used=F('listings_used') + 1)
+            EntitlementService.invalidate(user.pk)
         
         # Handle images if provided
         images = self.request.FILES.getlist('images')
@@ -132,35 +133,23 @@ class ListingViewSet(viewsets.ModelViewSet):
         if user.role not in ['seller', 'professional'] and not user.is_superuser:
             return False, "Seuls les vendeurs peuvent publier des annonces"
         
+        # Droits chargés une fois pour la requête (abonnement, plan, crédits)
+        entitlements = EntitlementService.for_request(self.request)
+        
         # Vérifier abonnement actif
-        if self._has_active_subscription(user):
-            subscription = user.subscription
-            if subscription.can_create_listing:
+        if entitlements.has_active_subscription:
+            if entitlements.can_create_listing:
                 return True, None
             else:
                 return False, "Vous avez atteint la limite d'annonces de votre abonnement"
         
         # Vérifier crédits pay-per-post
-        if self._has_credits(user):
+        if entitlements.has_credits:
             return True, None
         
         # Aucun moyen de paiement
         return False, "Vous devez avoir un abonnement actif ou des crédits pour publier. Rendez-vous sur la page Abonnements."
     
-    def _has_active_subscription(self, user):
-        """Vérifie si l'utilisateur a un abonnement actif"""
-        try:
-            return hasattr(user, 'subscription') and user.subscription and user.subscription.is_active
-        except Exception:
-            return False
-    
-    def _has_credits(self, user):
-        """Vérifie si l'utilisateur a des crédits disponibles"""
-        try:
-            return hasattr(user, 'post_credits') and user.post_credits and user.post_credits.balance > 0
-        except Exception:
-            return False
-    
     def _use_credit(self, user):
         """Utilise un crédit pour publier une annonce"""
         try:
@@ -263,33 +252,26 @@ class ListingViewSet(viewsets.ModelViewSet):
                 'subscription_remaining': 0,
             })
         
-        has_sub = self._has_active_subscription(user)
-        has_credits = self._has_credits(user)
+        entitlements = EntitlementService.for_request(request)
         
         subscription_info = {}
-        if has_sub:
-            sub = user.subscription
+        if entitlements.has_active_subscription:
             subscription_info = {
-                'plan_name': sub.plan.name,
-                'remaining_listings': sub.remaining_listings,
-                'can_create': sub.can_create_listing,
+                'plan_name': entitlements.subscription['plan_name'],
+                'remaining_listings': entitlements.remaining_listings,
+                'can_create': entitlements.can_create_listing,
             }
         
-        credits_balance = 0
-        if hasattr(user, 'post_credits') and user.post_credits:
-            credits_balance = user.post_credits.balance
-        
         # Vérifier si peut publier: abonnement actif avec quota OU crédits disponibles
-        can_publish_with_sub = has_sub and hasattr(user, 'subscription') and user.subscription.can_create_listing
-        can_publish = can_publish_with_sub or has_credits
+        can_publish = entitlements.can_publish
         
         return Response({
             'can_publish': can_publish,
             'reason': None if can_publish else 'no_payment',
             'message': None if can_publish else 'Vous devez avoir un abonnement actif ou acheter des crédits',
-            'has_subscription': has_sub,
-            'has_credits': has_credits,
-            'credits_balance': credits_balance,
+            'has_subscription': entitlements.has_active_subscription,
+            'has_credits': entitlements.has_credits,
+            'credits_balance': entitlements.credits_balance,
             'subscription_info': subscription_info,
         })
     
@@ -454,11 +436,12 @@ class ListingViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def toggle_favorite(self, request, pk=None):
         """Add/remove listing from favorites"""
+        from .services.favorites import FavoriteService
+        
         listing = self.get_object()
-        favorite, created = Favorite.objects.get_or_create(user=request.user, listing=listing)
+        favorite, is_favorite = FavoriteService.toggle_listing(request.user, listing)
         
-        if not created:
-            favorite.delete()
+        if not is_favorite:
             return Response({'status': 'removed'})
         
         return Response(FavoriteSerializer(favorite).data, status=status.HTTP_201_CREATED)
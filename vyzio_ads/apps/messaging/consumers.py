@@ -2,19 +2,296 @@
 WebSockets consumers pour messagerie temps réel
 Utilisé avec Django Channels et Redis
 """
+import asyncio
 import json
+import uuid
+from collections import deque
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.utils import timezone
-from apps.messaging.models import Conversation, Message
+from apps.messaging.models import Conversation
+from apps.messaging.presence import PresenceRegistry
+from apps.messaging.services import ConversationParticipantCache, AntiSpamService
+from apps.messaging.streams import TopicLog, conversation_topic, notifications_log_topic
+from apps.messaging.writer import MessageWriter, PendingMessage, message_id_for
 from apps.users.models import CustomUser
 
 
+class ConversationSession:
+    """
+    Présence d'un utilisateur dans une conversation ouverte : permissions,
+    présence, envoi de messages et indicateur de frappe.
+    
+    Partagée par ChatConsumer (un socket par conversation) et
+    UserStreamConsumer (un socket multiplexé par utilisateur).
+    """
+    
+    # Au plus un changement d'état de frappe diffusé par intervalle (ms)
+    TYPING_THROTTLE_MS = getattr(settings, 'CHAT_TYPING_THROTTLE_MS', 1000)
+    # Sans nouvel événement de frappe, l'état repasse à False (ms)
+    TYPING_TIMEOUT_MS = getattr(settings, 'CHAT_TYPING_TIMEOUT_MS', 5000)
+    
+    def __init__(self, consumer, conversation_id):
+        self.consumer = consumer
+        self.user = consumer.scope['user']
+        self.conversation_id = str(conversation_id)
+        self.group_name = f'chat_{self.conversation_id}'
+        self.topic = conversation_topic(self.conversation_id)
+        self.conversation = None
+        self.is_blocked = False
+        self.joined = False
+        self.has_pending_writes = False
+        self.typing_state = False
+        self.typing_wanted = False
+        self.typing_last_emit = 0.0
+        self.typing_flush_handle = None
+        self.typing_expiry_handle = None
+    
+    async def join(self) -> bool:
+        """
+        Vérifier les permissions et rejoindre le groupe de la conversation
+        """
+        # Participants en cache : aucune requête à la connexion. Le blocage
+        # est vérifié à chaque envoi (validate_message).
+        self.conversation = await self.load_conversation()
+        if self.conversation is None:
+            return False
+        
+        await self.consumer.channel_layer.group_add(
+            self.group_name,
+            self.consumer.channel_name
+        )
+        self.joined = True
+        return True
+    
+    async def announce_online(self):
+        """
+        Notifier que l'utilisateur s'est connecté (une seule fois
+        quel que soit le nombre d'onglets ouverts)
+        """
+        should_announce = await self.register_presence()
+        if should_announce:
+            await self.group_send({
+                'type': 'user_online',
+                'user_id': str(self.user.id),
+                'username': self.user.username,
+            })
+    
+    async def leave(self):
+        """
+        Quitter la conversation
+        """
+        if not self.joined:
+            return
+        self.joined = False
+        
+        # L'utilisateur ne tape plus
+        self._cancel_typing_timers()
+        if self.typing_state:
+            await self._broadcast_typing(False)
+        
+        # Écrire les messages encore en file avant de partir
+        if self.has_pending_writes:
+            await MessageWriter.for_current_loop().flush()
+        
+        await self.consumer.channel_layer.group_discard(
+            self.group_name,
+            self.consumer.channel_name
+        )
+        
+        went_offline = await self.unregister_presence()
+        if went_offline:
+            # Délai de grâce : une reconnexion rapide n'émet aucun événement
+            if PresenceRegistry.OFFLINE_GRACE > 0:
+                asyncio.ensure_future(self.announce_offline(PresenceRegistry.OFFLINE_GRACE))
+            else:
+                await self.announce_offline(0)
+    
+    async def announce_offline(self, delay):
+        """
+        Notifier que l'utilisateur s'est déconnecté s'il ne s'est pas reconnecté
+        """
+        if delay:
+            await asyncio.sleep(delay)
+        
+        should_announce = await self.clear_presence_announcement()
+        if should_announce:
+            await self.group_send({
+                'type': 'user_offline',
+                'user_id': str(self.user.id),
+                'username': self.user.username,
+            })
+    
+    async def send_message(self, content, client_id=''):
+        """
+        Diffuser un message puis le confier au writer.
+        
+        Returns:
+            Message d'erreur, ou None si le message est accepté
+        """
+        error = await self.validate_message(content)
+        if error:
+            return error
+        
+        # Diffusion optimiste, l'écriture en base est faite par lots
+        message_id = message_id_for(self.conversation_id, self.user.id, client_id)
+        event = {
+            'type': 'chat_message',
+            'message_id': str(message_id),
+            'client_id': client_id,
+            'sender_id': str(self.user.id),
+            'sender_username': self.user.username,
+            'content': content,
+            'created_at': timezone.now().isoformat(),
+            'is_read': False,
+        }
+        event['event_id'] = await sync_to_async(TopicLog.append)(self.topic, event)
+        await self.group_send(event)
+        
+        MessageWriter.for_current_loop().enqueue(PendingMessage(
+            id=message_id,
+            conversation=self.conversation,
+            sender=self.user,
+            content=content,
+        ))
+        self.has_pending_writes = True
+        
+        # Envoyer un message met fin à la frappe
+        await self.set_typing(False)
+        return None
+    
+    async def group_send(self, event):
+        event['topic'] = self.topic
+        await self.consumer.channel_layer.group_send(self.group_name, event)
+    
+    # Indicateur de frappe
+    async def set_typing(self, is_typing):
+        """
+        Mettre à jour l'état de frappe voulu par le client.
+        Les changements sont limités à un par TYPING_THROTTLE_MS (le dernier
+        état demandé est diffusé en fin d'intervalle) et l'état expire
+        après TYPING_TIMEOUT_MS sans nouvel événement.
+        """
+        self.typing_wanted = is_typing
+        
+        loop = asyncio.get_running_loop()
+        if self.typing_expiry_handle is not None:
+            self.typing_expiry_handle.cancel()
+            self.typing_expiry_handle = None
+        if is_typing:
+            self.typing_expiry_handle = loop.call_later(
+                self.TYPING_TIMEOUT_MS / 1000,
+                lambda: asyncio.ensure_future(self.set_typing(False))
+            )
+        
+        await self._flush_typing()
+    
+    async def _flush_typing(self, from_timer=False):
+        if from_timer:
+            self.typing_flush_handle = None
+        if not self.joined or self.typing_wanted == self.typing_state:
+            return
+        
+        loop = asyncio.get_running_loop()
+        wait = self.typing_last_emit + self.TYPING_THROTTLE_MS / 1000 - loop.time()
+        if wait > 0:
+            if self.typing_flush_handle is None:
+                self.typing_flush_handle = loop.call_later(
+                    wait, lambda: asyncio.ensure_future(self._flush_typing(from_timer=True))
+                )
+            return
+        
+        await self._broadcast_typing(self.typing_wanted)
+    
+    async def _broadcast_typing(self, is_typing):
+        self.typing_state = is_typing
+        self.typing_last_emit = asyncio.get_running_loop().time()
+        await self.group_send({
+            'type': 'typing_status',
+            'user_id': str(self.user.id),
+            'username': self.user.username,
+            'is_typing': is_typing,
+        })
+    
+    def _cancel_typing_timers(self):
+        for handle in (self.typing_flush_handle, self.typing_expiry_handle):
+            if handle is not None:
+                handle.cancel()
+        self.typing_flush_handle = None
+        self.typing_expiry_handle = None
+    
+    # Méthodes de base de données
+    @database_sync_to_async
+    def load_conversation(self):
+        """
+        Conversation de la session construite depuis le cache des participants
+        (id, acheteur, vendeur), ou None si l'utilisateur n'y participe pas.
+        Les relations sont chargées par le writer au moment des notifications.
+        """
+        if not ConversationParticipantCache.is_participant(self.conversation_id, self.user):
+            return None
+        buyer_id, seller_id = ConversationParticipantCache.get_roles(self.conversation_id)
+        return Conversation(
+            id=uuid.UUID(self.conversation_id),
+            buyer_id=uuid.UUID(buyer_id),
+            seller_id=uuid.UUID(seller_id),
+        )
+    
+    @database_sync_to_async
+    def validate_message(self, content):
+        """
+        Règles anti-spam (contenu, blocage, rate limit en cache)
+        Retourne le message d'erreur, ou None si le message est accepté
+        """
+        # Blocage relu à chaque envoi (droits en cache, invalidés à chaque
+        # blocage) : un blocage fait pendant la session s'applique aussitôt
+        from apps.users.entitlements import EntitlementService
+        self.is_blocked = EntitlementService.for_user(self.user.id).is_blocked_with(
+            self.conversation.buyer_id, self.conversation.seller_id
+        )
+        if self.is_blocked:
+            return 'Cannot send message'
+        
+        is_valid, error_msg = AntiSpamService.check_content(content)
+        if not is_valid:
+            return error_msg
+        
+        is_allowed, error_msg = AntiSpamService.check_message_rate_cached(self.user)
+        if not is_allowed:
+            return error_msg
+        
+        return None
+    
+    # Méthodes de présence
+    @sync_to_async
+    def register_presence(self):
+        PresenceRegistry.connect(self.user.id, scope=self.conversation_id)
+        return PresenceRegistry.mark_announced(self.user.id, scope=self.conversation_id)
+    
+    @sync_to_async
+    def unregister_presence(self):
+        return PresenceRegistry.disconnect(self.user.id, scope=self.conversation_id)
+    
+    @sync_to_async
+    def heartbeat(self):
+        PresenceRegistry.heartbeat(self.user.id, scope=self.conversation_id)
+    
+    @sync_to_async
+    def clear_presence_announcement(self):
+        if PresenceRegistry.is_online(self.user.id, scope=self.conversation_id):
+            return False
+        return PresenceRegistry.clear_announced(self.user.id, scope=self.conversation_id)
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
     """
     Consumer WebSocket pour les conversations temps réel
     
     Connect URL: ws://localhost:8000/ws/chat/{conversation_id}/
+    
+    Frames client : message, {"type": "heartbeat"}, {"type": "typing", "is_typing": bool}
     """
     
     async def connect(self):
@@ -23,51 +300,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
         self.user = self.scope['user']
-        self.room_group_name = f'chat_{self.conversation_id}'
+        self.session = ConversationSession(self, self.conversation_id)
         
-        # Vérifier les permissions
-        is_participant = await self.check_participant()
-        if not is_participant:
+        # Vérifier les permissions et rejoindre le groupe
+        joined = await self.session.join()
+        if not joined:
             await self.close()
             return
         
-        # Rejoindre le groupe
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        
         await self.accept()
-        
-        # Notifier que l'utilisateur s'est connecté
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_online',
-                'user_id': self.user.id,
-                'username': self.user.username,
-            }
-        )
+        await self.session.announce_online()
     
     async def disconnect(self, close_code):
         """
         Fermer la connexion WebSocket
         """
-        # Notifier que l'utilisateur s'est déconnecté
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_offline',
-                'user_id': self.user.id,
-                'username': self.user.username,
-            }
-        )
-        
-        # Quitter le groupe
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.session.leave()
     
     async def receive(self, text_data):
         """
@@ -75,27 +323,29 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         try:
             data = json.loads(text_data)
+            
+            # Heartbeat : prolonge la présence sans écrire en base
+            if data.get('type') == 'heartbeat':
+                await self.session.heartbeat()
+                await self.send(text_data=json.dumps({'type': 'heartbeat_ack'}))
+                return
+            
+            if data.get('type') == 'typing':
+                await self.session.set_typing(bool(data.get('is_typing', False)))
+                return
+            
             message_text = data.get('message', '').strip()
+            client_id = str(data.get('client_id', ''))[:64]
             
             if not message_text:
                 return
             
-            # Créer le message en base de données
-            message = await self.save_message(message_text)
-            
-            # Envoyer au groupe
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message_id': message.id,
-                    'sender_id': self.user.id,
-                    'sender_username': self.user.username,
-                    'content': message_text,
-                    'created_at': message.created_at.isoformat(),
-                    'is_read': False,
-                }
-            )
+            error = await self.session.send_message(message_text, client_id)
+            if error:
+                await self.send(text_data=json.dumps({
+                    'error': error,
+                    'client_id': client_id,
+                }))
         
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -110,6 +360,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'message',
             'message_id': event['message_id'],
+            'client_id': event.get('client_id', ''),
             'sender_id': event['sender_id'],
             'sender_username': event['sender_username'],
             'content': event['content'],
@@ -121,7 +372,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         Notifier qu'un utilisateur s'est connecté
         """
-        if event['user_id'] != self.user.id:  # Ne pas envoyer à soi-même
+        if event['user_id'] != str(self.user.id):  # Ne pas envoyer à soi-même
             await self.send(text_data=json.dumps({
                 'type': 'user_status',
                 'status': 'online',
@@ -133,7 +384,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         Notifier qu'un utilisateur s'est déconnecté
         """
-        if event['user_id'] != self.user.id:  # Ne pas envoyer à soi-même
+        if event['user_id'] != str(self.user.id):  # Ne pas envoyer à soi-même
             await self.send(text_data=json.dumps({
                 'type': 'user_status',
                 'status': 'offline',
@@ -145,42 +396,332 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         Notifier qu'un utilisateur tape
         """
-        if event['user_id'] != self.user.id:  # Ne pas envoyer à soi-même
+        if event['user_id'] != str(self.user.id):  # Ne pas envoyer à soi-même
             await self.send(text_data=json.dumps({
                 'type': 'typing',
                 'user_id': event['user_id'],
                 'username': event['username'],
                 'is_typing': event['is_typing'],
             }))
+
+
+class UserStreamConsumer(AsyncWebsocketConsumer):
+    """
+    Socket unique par utilisateur, multiplexant conversations, notifications
+    et indicateur de frappe.
     
-    # Méthodes de base de données
-    @database_sync_to_async
-    def check_participant(self):
+    Connect URL: ws://localhost:8000/ws/stream/
+    
+    Frames client (champ "op") :
+        {"op": "subscribe", "topic": "conversation:<uuid>", "last_event_id": 12}
+        {"op": "subscribe", "topic": "notifications"}
+        {"op": "unsubscribe", "topic": "..."}
+        {"op": "message", "topic": "conversation:<uuid>", "message": "...", "client_id": "..."}
+        {"op": "typing", "topic": "conversation:<uuid>", "is_typing": true}
+        {"op": "heartbeat"}
+    
+    Frames serveur : {"topic": ..., "type": ..., "event_id": ..., "data": {...}}
+    """
+    
+    NOTIFICATIONS_TOPIC = 'notifications'
+    # Nombre maximum de topics par socket
+    MAX_SUBSCRIPTIONS = getattr(settings, 'STREAM_MAX_SUBSCRIPTIONS', 50)
+    # Taille maximale d'une frame client (octets)
+    MAX_FRAME_BYTES = getattr(settings, 'STREAM_MAX_FRAME_BYTES', 16 * 1024)
+    # Frames en attente d'envoi avant de considérer le client comme trop lent
+    OUTBOX_SIZE = getattr(settings, 'STREAM_OUTBOX_SIZE', 500)
+    # Code de fermeture : client trop lent, reconnecter et reprendre
+    SLOW_CONSUMER_CLOSE_CODE = 4008
+    # Ids d'événements déjà livrés retenus par topic (dédoublonnage) : un
+    # événement arrivé dans le désordre (publications concurrentes) reste livré
+    DEDUP_WINDOW = getattr(settings, 'STREAM_DEDUP_WINDOW', 256)
+    
+    async def connect(self):
+        """
+        Établir la connexion WebSocket
+        """
+        self.user = self.scope['user']
+        self.sessions = {}
+        self.notifications_group = None
+        self.last_event_ids = {}
+        self.seen_event_ids = {}
+        self.outbox = asyncio.Queue(maxsize=self.OUTBOX_SIZE)
+        self.sender_task = None
+        self.connected = False
+        self.closing = False
+        
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        await self.accept()
+        self.connected = True
+        self.sender_task = asyncio.ensure_future(self._drain_outbox())
+        await sync_to_async(PresenceRegistry.connect)(self.user.id)
+    
+    async def disconnect(self, close_code):
+        """
+        Fermer la connexion WebSocket
         """
-        Vérifier que l'utilisateur participe à cette conversation
+        if not self.connected:
+            return
+        self.connected = False
+        
+        for session in list(self.sessions.values()):
+            await session.leave()
+        self.sessions.clear()
+        
+        if self.notifications_group:
+            await self.channel_layer.group_discard(self.notifications_group, self.channel_name)
+        
+        await sync_to_async(PresenceRegistry.disconnect)(self.user.id)
+        
+        if self.sender_task:
+            self.sender_task.cancel()
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Recevoir une frame de contrôle du client
         """
+        if text_data is None or len(text_data) > self.MAX_FRAME_BYTES:
+            self._push({'type': 'error', 'error': 'Frame invalide ou trop volumineuse'}, durable=True)
+            return
+        
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            return (
-                self.user == conversation.buyer or 
-                self.user == conversation.seller
-            )
-        except Conversation.DoesNotExist:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            data = None
+        if not isinstance(data, dict):
+            self._push({'type': 'error', 'error': 'Frame invalide'}, durable=True)
+            return
+        
+        handlers = {
+            'subscribe': self.op_subscribe,
+            'unsubscribe': self.op_unsubscribe,
+            'message': self.op_message,
+            'typing': self.op_typing,
+            'heartbeat': self.op_heartbeat,
+        }
+        handler = handlers.get(data.get('op'))
+        if handler is None:
+            self._push({'type': 'error', 'error': 'Opération inconnue'}, durable=True)
+            return
+        
+        await handler(data)
+    
+    # Opérations client
+    async def op_subscribe(self, data):
+        topic = data.get('topic', '')
+        last_event_id = data.get('last_event_id')
+        
+        if topic == self.NOTIFICATIONS_TOPIC:
+            log_topic = notifications_log_topic(self.user.id)
+            snapshot = await self._log_position(log_topic, last_event_id)
+            if self.notifications_group is None:
+                self.notifications_group = f'notifications_{self.user.id}'
+                await self.channel_layer.group_add(self.notifications_group, self.channel_name)
+        else:
+            conversation_id = self._parse_conversation_topic(topic)
+            if conversation_id is None:
+                self._push({'type': 'error', 'topic': topic, 'error': 'Topic invalide'}, durable=True)
+                return
+            
+            log_topic = topic
+            snapshot = await self._log_position(log_topic, last_event_id)
+            if topic not in self.sessions:
+                if len(self.sessions) >= self.MAX_SUBSCRIPTIONS:
+                    self._push({'type': 'error', 'topic': topic, 'error': 'Trop d\'abonnements'}, durable=True)
+                    return
+                
+                session = ConversationSession(self, conversation_id)
+                if not await session.join():
+                    self._push({'type': 'error', 'topic': topic, 'error': 'Accès refusé'}, durable=True)
+                    return
+                self.sessions[topic] = session
+                await session.announce_online()
+        
+        if last_event_id is None:
+            # Nouvel abonnement : position lue avant de rejoindre le groupe,
+            # les événements publiés entre-temps sont rattrapés depuis le journal
+            last_event_id = snapshot
+        else:
+            # Reprise : rejouer les événements manqués depuis le journal
+            try:
+                last_event_id = int(last_event_id)
+            except (TypeError, ValueError):
+                last_event_id = 0
+        self.last_event_ids[topic] = last_event_id
+        self.seen_event_ids[topic] = deque(maxlen=self.DEDUP_WINDOW)
+        events, complete = await sync_to_async(TopicLog.since)(log_topic, last_event_id)
+        
+        self._push({'op': 'subscribed', 'topic': topic, 'last_event_id': last_event_id}, durable=True)
+        if not complete:
+            self._push({'topic': topic, 'type': 'resync_required'}, durable=True)
+        for event_id, event in events:
+            self._deliver(topic, dict(event, event_id=event_id))
+    
+    async def _log_position(self, log_topic, last_event_id):
+        """Position actuelle du journal, lue seulement pour un nouvel abonnement"""
+        if last_event_id is not None:
+            return None
+        return await sync_to_async(TopicLog.last_event_id)(log_topic)
+    
+    async def op_unsubscribe(self, data):
+        topic = data.get('topic', '')
+        
+        if topic == self.NOTIFICATIONS_TOPIC and self.notifications_group:
+            await self.channel_layer.group_discard(self.notifications_group, self.channel_name)
+            self.notifications_group = None
+        elif topic in self.sessions:
+            await self.sessions.pop(topic).leave()
+        
+        self.last_event_ids.pop(topic, None)
+        self.seen_event_ids.pop(topic, None)
+        self._push({'op': 'unsubscribed', 'topic': topic}, durable=True)
+    
+    async def op_message(self, data):
+        topic = data.get('topic', '')
+        message_text = str(data.get('message', '')).strip()
+        client_id = str(data.get('client_id', ''))[:64]
+        
+        session = self.sessions.get(topic)
+        if session is None:
+            self._push({'type': 'error', 'topic': topic, 'client_id': client_id,
+                        'error': 'Non abonné à ce topic'}, durable=True)
+            return
+        if not message_text:
+            return
+        
+        error = await session.send_message(message_text, client_id)
+        if error:
+            self._push({'type': 'error', 'topic': topic, 'client_id': client_id, 'error': error}, durable=True)
+    
+    async def op_typing(self, data):
+        session = self.sessions.get(data.get('topic', ''))
+        if session is not None:
+            await session.set_typing(bool(data.get('is_typing', False)))
+    
+    async def op_heartbeat(self, data):
+        await sync_to_async(PresenceRegistry.heartbeat)(self.user.id)
+        for session in self.sessions.values():
+            await session.heartbeat()
+        self._push({'op': 'heartbeat_ack'}, durable=True)
+    
+    @staticmethod
+    def _parse_conversation_topic(topic):
+        prefix, _, conversation_id = topic.partition(':')
+        if prefix != 'conversation':
+            return None
+        try:
+            return str(uuid.UUID(conversation_id))
+        except ValueError:
+            return None
+    
+    # Événements reçus des groupes
+    async def chat_message(self, event):
+        self._deliver(event.get('topic'), event)
+    
+    async def send_notification(self, event):
+        self._deliver(self.NOTIFICATIONS_TOPIC, event)
+    
+    async def user_online(self, event):
+        self._deliver_ephemeral(event, {'type': 'user_status', 'status': 'online'})
+    
+    async def user_offline(self, event):
+        self._deliver_ephemeral(event, {'type': 'user_status', 'status': 'offline'})
+    
+    async def typing_status(self, event):
+        self._deliver_ephemeral(event, {'type': 'typing', 'is_typing': event['is_typing']})
+    
+    def _deliver(self, topic, event):
+        """
+        Envoyer un événement durable (rejouable), sans doublon après une reprise
+        """
+        if topic != self.NOTIFICATIONS_TOPIC and topic not in self.sessions:
+            return
+        
+        event_id = event.get('event_id')
+        if event_id is not None and not self._first_delivery(topic, event_id):
+            return
+        
+        if event['type'] == 'send_notification':
+            frame_type = 'notification'
+            payload = {
+                'notification_type': event['notification_type'],
+                'title': event['title'],
+                'message': event['message'],
+                'data': event.get('data', {}),
+            }
+        else:
+            frame_type = 'message'
+            payload = {
+                key: event[key] for key in (
+                    'message_id', 'client_id', 'sender_id', 'sender_username',
+                    'content', 'created_at', 'is_read',
+                )
+            }
+        
+        self._push({
+            'topic': topic,
+            'type': frame_type,
+            'event_id': event_id,
+            'data': payload,
+        }, durable=True)
+    
+    def _first_delivery(self, topic, event_id) -> bool:
+        """
+        True si l'événement n'a pas encore été livré sur ce topic.
+        
+        last_event_ids[topic] est le plancher (position connue du client à
+        l'abonnement) ; au-dessus, les ids livrés sont retenus dans une fenêtre
+        bornée, sans supposer qu'ils arrivent dans l'ordre. Un id qui sort de
+        la fenêtre remonte le plancher.
+        """
+        seen = self.seen_event_ids.setdefault(topic, deque(maxlen=self.DEDUP_WINDOW))
+        if event_id <= self.last_event_ids.get(topic, 0) or event_id in seen:
             return False
+        if len(seen) == seen.maxlen:
+            self.last_event_ids[topic] = max(self.last_event_ids.get(topic, 0), seen[0])
+        seen.append(event_id)
+        return True
     
-    @database_sync_to_async
-    def save_message(self, content):
+    def _deliver_ephemeral(self, event, frame):
         """
-        Sauvegarder le message en base de données
+        Présence et frappe : non rejouables, abandonnées si le client est lent
         """
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=self.user,
-            content=content,
-            created_at=timezone.now()
-        )
-        return message
+        topic = event.get('topic')
+        if topic not in self.sessions or event['user_id'] == str(self.user.id):
+            return
+        
+        frame.update({
+            'topic': topic,
+            'user_id': event['user_id'],
+            'username': event['username'],
+        })
+        self._push(frame)
+    
+    # Contre-pression
+    def _push(self, frame, durable=False):
+        """
+        Ajouter une frame à la file d'envoi.
+        File pleine : les frames éphémères sont abandonnées ; pour une frame
+        durable, la connexion est fermée et le client reprend via last_event_id.
+        """
+        if self.closing:
+            return
+        
+        if self.outbox.full():
+            if durable:
+                self.closing = True
+                asyncio.ensure_future(self.close(code=self.SLOW_CONSUMER_CLOSE_CODE))
+            return
+        
+        self.outbox.put_nowait(frame)
+    
+    async def _drain_outbox(self):
+        while True:
+            frame = await self.outbox.get()
+            await self.send(text_data=json.dumps(frame))
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -237,6 +778,9 @@ class TypingIndicatorConsumer(AsyncWebsocketConsumer):
     Consumer WebSocket pour l'indicateur de frappe (typing indicator)
     
     Connect URL: ws://localhost:8000/ws/typing/{conversation_id}/
+    
+    Déprécié : envoyer {"type": "typing"} sur le socket de ChatConsumer,
+    qui limite le débit et fait expirer l'état automatiquement.
     """
     
     async def connect(self):
@@ -246,11 +790,20 @@ class TypingIndicatorConsumer(AsyncWebsocketConsumer):
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
         self.user = self.scope['user']
         self.room_group_name = f'typing_{self.conversation_id}'
+        self.joined = False
+        
+        is_participant = await database_sync_to_async(
+            ConversationParticipantCache.is_participant
+        )(self.conversation_id, self.user)
+        if not is_participant:
+            await self.close()
+            return
         
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        self.joined = True
         
         await self.accept()
     
@@ -258,6 +811,9 @@ class TypingIndicatorConsumer(AsyncWebsocketConsumer):
         """
         Fermer la connexion WebSocket
         """
+        if not self.joined:
+            return
+        
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -276,7 +832,7 @@ class TypingIndicatorConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 {
                     'type': 'typing_status',
-                    'user_id': self.user.id,
+                    'user_id': str(self.user.id),
                     'username': self.user.username,
                     'is_typing': is_typing,
                 }
@@ -289,7 +845,7 @@ class TypingIndicatorConsumer(AsyncWebsocketConsumer):
         """
         Envoyer le statut de frappe au client
         """
-        if event['user_id'] != self.user.id:  # Ne pas envoyer à soi-même
+        if event['user_id'] != str(self.user.id):  # Ne pas envoyer à soi-même
             await self.send(text_data=json.dumps({
                 'type': 'typing',
                 'user_id': event['user_id'],
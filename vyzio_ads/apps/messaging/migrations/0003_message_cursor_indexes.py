@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_notification'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='messaging_m_convers_7bc91b_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='messaging_m_convers_1f1ac3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'read_at'], name='messaging_m_sender__7c91e0_idx'),
+        ),
+    ]
@@ -48,7 +48,10 @@ class Message(models.Model):
         db_table = 'messaging_message'
         ordering = ['created_at']
         indexes = [
-            models.Index(fields=['conversation', 'created_at']),
+            # Historique paginé par curseur (created_at, id)
+            models.Index(fields=['conversation', 'created_at', 'id']),
+            # Synchronisation des accusés de lecture
+            models.Index(fields=['sender', 'read_at']),
         ]
     
     def __str__(self):
@@ -69,6 +72,20 @@ class BlockedUser(models.Model):
     
     def __str__(self):
         return f"{self.blocker.email} blocked {self.blocked.email}"
+    
+    def save(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
+        
+        super().save(*args, **kwargs)
+        EntitlementService.invalidate(self.blocker_id, self.blocked_id)
+    
+    def delete(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
+        
+        user_ids = (self.blocker_id, self.blocked_id)
+        result = super().delete(*args, **kwargs)
+        EntitlementService.invalidate(*user_ids)
+        return result
 
 
 class Report(models.Model):
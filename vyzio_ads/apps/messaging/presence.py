@@ -0,0 +1,157 @@
+"""
+Registre de présence partagé pour la messagerie temps réel.
+
+Stocké dans le cache Django (Redis en production, LocMem en local) pour
+que tous les workers Channels partagent le même état :
+
+- presence:conn:{scope}:{user_id} -> nombre de connexions ouvertes
+- presence:seen:{user_id}         -> dernier heartbeat (timestamp)
+- presence:announced:{scope}:{user_id} -> présence déjà diffusée au groupe
+
+Les compteurs et marqueurs expirent après PRESENCE_TTL secondes sans heartbeat, ce qui
+nettoie automatiquement les connexions d'un worker tombé.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GLOBAL_SCOPE = 'global'
+
+
+class PresenceRegistry:
+    """
+    Compteur de connexions par utilisateur (global et par conversation).
+
+    Les transitions hors ligne -> en ligne et inverse sont renvoyées par
+    connect()/disconnect() pour que les consumers ne diffusent un événement
+    de présence que lorsque l'état change réellement.
+    """
+
+    # Durée de vie d'une connexion sans heartbeat (secondes)
+    TTL = getattr(settings, 'PRESENCE_TTL', 60)
+    # Durée de conservation du "vu pour la dernière fois"
+    LAST_SEEN_TTL = getattr(settings, 'PRESENCE_LAST_SEEN_TTL', 60 * 60 * 24 * 7)
+    # Délai avant de diffuser user_offline (absorbe les reconnexions rapides)
+    OFFLINE_GRACE = getattr(settings, 'PRESENCE_OFFLINE_GRACE', 5)
+    # Nombre maximum d'utilisateurs par requête de statut
+    MAX_BULK_USERS = 100
+
+    @staticmethod
+    def _conn_key(user_id, scope=None):
+        return f'presence:conn:{scope or GLOBAL_SCOPE}:{user_id}'
+
+    @staticmethod
+    def _seen_key(user_id):
+        return f'presence:seen:{user_id}'
+
+    @staticmethod
+    def _announced_key(user_id, scope=None):
+        return f'presence:announced:{scope or GLOBAL_SCOPE}:{user_id}'
+
+    @classmethod
+    def _incr(cls, key, delta):
+        """Incrémente un compteur en créant la clé si elle a expiré."""
+        cache.add(key, 0, cls.TTL)
+        try:
+            value = cache.incr(key, delta)
+        except ValueError:
+            # Clé expirée entre add() et incr() (ou cache factice)
+            value = max(delta, 0)
+            cache.set(key, value, cls.TTL)
+        cache.touch(key, cls.TTL)
+        return value
+
+    @classmethod
+    def connect(cls, user_id, scope=None) -> bool:
+        """
+        Enregistre une connexion.
+
+        Returns:
+            True si l'utilisateur vient de passer en ligne dans ce scope
+        """
+        cache.set(cls._seen_key(user_id), time.time(), cls.LAST_SEEN_TTL)
+        if scope:
+            cls._incr(cls._conn_key(user_id), 1)
+        return cls._incr(cls._conn_key(user_id, scope), 1) == 1
+
+    @classmethod
+    def disconnect(cls, user_id, scope=None) -> bool:
+        """
+        Retire une connexion.
+
+        Returns:
+            True si l'utilisateur n'a plus aucune connexion dans ce scope
+        """
+        cache.set(cls._seen_key(user_id), time.time(), cls.LAST_SEEN_TTL)
+        if scope:
+            cls._release(cls._conn_key(user_id))
+        return cls._release(cls._conn_key(user_id, scope))
+
+    @classmethod
+    def _release(cls, key) -> bool:
+        remaining = cls._incr(key, -1)
+        if remaining <= 0:
+            cache.delete(key)
+            return True
+        return False
+
+    @classmethod
+    def heartbeat(cls, user_id, scope=None):
+        """Prolonge la durée de vie des connexions de l'utilisateur."""
+        cache.set(cls._seen_key(user_id), time.time(), cls.LAST_SEEN_TTL)
+        keys = [cls._conn_key(user_id)]
+        if scope:
+            keys.append(cls._conn_key(user_id, scope))
+        for key in keys:
+            if not cache.touch(key, cls.TTL):
+                # Compteur expiré (heartbeat tardif) : on le recrée
+                cache.add(key, 1, cls.TTL)
+        cache.touch(cls._announced_key(user_id, scope), cls.TTL)
+
+    @classmethod
+    def is_online(cls, user_id, scope=None) -> bool:
+        return (cache.get(cls._conn_key(user_id, scope)) or 0) > 0
+
+    @classmethod
+    def mark_announced(cls, user_id, scope=None) -> bool:
+        """
+        Marque la présence comme diffusée.
+
+        Returns:
+            True si elle ne l'était pas déjà (il faut diffuser user_online)
+        """
+        return cache.add(cls._announced_key(user_id, scope), 1, cls.TTL)
+
+    @classmethod
+    def clear_announced(cls, user_id, scope=None) -> bool:
+        """
+        Retire le marqueur de diffusion.
+
+        Returns:
+            True si la présence avait été diffusée (il faut diffuser user_offline)
+        """
+        return cache.delete(cls._announced_key(user_id, scope))
+
+    @classmethod
+    def bulk_status(cls, user_ids) -> dict:
+        """
+        Statut de présence de plusieurs utilisateurs en un seul aller-retour cache.
+
+        Returns:
+            {user_id: {'online': bool, 'last_seen': float | None}}
+        """
+        user_ids = [str(user_id) for user_id in user_ids][:cls.MAX_BULK_USERS]
+        keys = []
+        for user_id in user_ids:
+            keys.append(cls._conn_key(user_id))
+            keys.append(cls._seen_key(user_id))
+        values = cache.get_many(keys)
+
+        return {
+            user_id: {
+                'online': (values.get(cls._conn_key(user_id)) or 0) > 0,
+                'last_seen': values.get(cls._seen_key(user_id)),
+            }
+            for user_id in user_ids
+        }
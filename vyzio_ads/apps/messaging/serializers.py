@@ -11,6 +11,17 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'sender', 'created_at')
 
 
+class MessageSyncSerializer(serializers.ModelSerializer):
+    """Message allégé pour la synchronisation incrémentale"""
+    sender_id = serializers.UUIDField(read_only=True)
+    conversation_id = serializers.UUIDField(read_only=True)
+    
+    class Meta:
+        model = Message
+        fields = ('id', 'conversation_id', 'sender_id', 'content', 'is_read', 'read_at', 'created_at')
+        read_only_fields = fields
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     buyer = UserProfileSerializer(read_only=True)
     seller = UserProfileSerializer(read_only=True)
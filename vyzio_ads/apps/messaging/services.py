@@ -162,17 +162,22 @@ class NotificationService:
             data: Données additionnelles (optionnel)
         """
         try:
+            from apps.messaging.streams import TopicLog, notifications_log_topic
+            
             channel_layer = get_channel_layer()
+            event = {
+                'type': 'send_notification',
+                'notification_type': notification_type,
+                'title': title,
+                'message': message,
+                'data': data or {},
+            }
+            # Journalisée pour la reprise du socket multiplexé (ws/stream/)
+            event['event_id'] = TopicLog.append(notifications_log_topic(user_id), event)
             
             async_to_sync(channel_layer.group_send)(
                 f'notifications_{user_id}',
-                {
-                    'type': 'send_notification',
-                    'notification_type': notification_type,
-                    'title': title,
-                    'message': message,
-                    'data': data or {},
-                }
+                event
             )
             
             logger.info(f"Realtime notification sent to user {user_id}")
@@ -293,5 +298,88 @@ class AntiSpamService:
             
             if recent_count >= AntiSpamService.MAX_CONVERSATIONS_PER_HOUR:
                 return False, "Trop de conversations créées. Veuillez patienter."
-        
+
         return True, ""
+
+    @staticmethod
+    def check_message_rate_cached(user) -> tuple[bool, str]:
+        """
+        Rate limit des messages basé sur un compteur en cache (fenêtre d'une minute).
+        Utilisé par le chat WebSocket, où les messages ne sont pas encore
+        en base au moment de la vérification.
+
+        Returns:
+            (is_allowed, error_message)
+        """
+        import time
+        from django.core.cache import cache
+
+        window = int(time.time() // 60)
+        key = f'antispam:messages:{user.id}:{window}'
+        cache.add(key, 0, 120)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # Cache indisponible : ne pas bloquer l'utilisateur
+            return True, ""
+
+        if count > AntiSpamService.MAX_MESSAGES_PER_MINUTE:
+            return False, "Trop de messages envoyés. Veuillez patienter."
+
+        return True, ""
+
+
+class ConversationParticipantCache:
+    """
+    Cache des participants d'une conversation.
+    Évite une requête SQL à chaque connexion WebSocket.
+    """
+    
+    CACHE_TTL = getattr(settings, 'CONVERSATION_PARTICIPANTS_TTL', 60 * 10)
+    
+    @staticmethod
+    def _key(conversation_id):
+        return f'conversation:participants:{conversation_id}'
+    
+    @staticmethod
+    def get_roles(conversation_id):
+        """
+        Retourne (acheteur, vendeur) en IDs str, ou None si la conversation
+        n'existe pas (non mis en cache).
+        """
+        from django.core.cache import cache
+        from apps.messaging.models import Conversation
+        
+        key = ConversationParticipantCache._key(conversation_id)
+        participants = cache.get(key)
+        if participants is not None:
+            return tuple(participants)
+        
+        row = Conversation.objects.filter(id=conversation_id).values_list(
+            'buyer_id', 'seller_id'
+        ).first()
+        if row is None:
+            return None
+        
+        participants = [str(row[0]), str(row[1])]
+        cache.set(key, participants, ConversationParticipantCache.CACHE_TTL)
+        return tuple(participants)
+    
+    @staticmethod
+    def get_participants(conversation_id) -> set:
+        """
+        Retourne les IDs (str) de l'acheteur et du vendeur.
+        Ensemble vide si la conversation n'existe pas.
+        """
+        return set(ConversationParticipantCache.get_roles(conversation_id) or ())
+    
+    @staticmethod
+    def is_participant(conversation_id, user) -> bool:
+        if not user or not user.is_authenticated:
+            return False
+        return str(user.id) in ConversationParticipantCache.get_participants(conversation_id)
+    
+    @staticmethod
+    def invalidate(conversation_id):
+        from django.core.cache import cache
+        cache.delete(ConversationParticipantCache._key(conversation_id))
@@ -0,0 +1,98 @@
+"""
+Journal d'événements par topic pour la reprise après reconnexion.
+
+Chaque événement durable (message de chat, notification) reçoit un
+identifiant croissant propre à son topic et est conservé dans le cache
+partagé pendant STREAM_EVENT_TTL secondes :
+
+- stream:seq:{topic}          -> dernier event_id attribué
+- stream:event:{topic}:{id}   -> événement
+
+Un client qui se reconnecte renvoie le dernier event_id reçu pour chaque
+topic et reçoit les événements manqués. Si l'écart dépasse le journal, il
+doit se resynchroniser par l'API HTTP.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def conversation_topic(conversation_id) -> str:
+    return f'conversation:{conversation_id}'
+
+
+def notifications_log_topic(user_id) -> str:
+    """Topic interne des notifications (le client s'abonne à 'notifications')"""
+    return f'notifications:{user_id}'
+
+
+class TopicLog:
+    """
+    Journal circulaire d'événements, par topic, dans le cache.
+    """
+
+    # Nombre d'événements rejouables par topic
+    BUFFER_SIZE = getattr(settings, 'STREAM_BUFFER_SIZE', 200)
+    EVENT_TTL = getattr(settings, 'STREAM_EVENT_TTL', 60 * 15)
+
+    @staticmethod
+    def _seq_key(topic):
+        return f'stream:seq:{topic}'
+
+    @staticmethod
+    def _event_key(topic, event_id):
+        return f'stream:event:{topic}:{event_id}'
+
+    @classmethod
+    def append(cls, topic, event) -> int | None:
+        """
+        Enregistre un événement.
+
+        Returns:
+            event_id attribué, ou None si le cache ne le permet pas
+            (la reprise n'est alors pas disponible)
+        """
+        seq_key = cls._seq_key(topic)
+        cache.add(seq_key, 0, None)
+        try:
+            event_id = cache.incr(seq_key)
+        except ValueError:
+            return None
+
+        cache.set(cls._event_key(topic, event_id), event, cls.EVENT_TTL)
+        return event_id
+
+    @classmethod
+    def last_event_id(cls, topic) -> int:
+        return cache.get(cls._seq_key(topic)) or 0
+
+    @classmethod
+    def since(cls, topic, last_event_id) -> tuple[list, bool]:
+        """
+        Événements postérieurs à last_event_id.
+
+        Returns:
+            ([(event_id, event), ...], complete) — complete vaut False si des
+            événements ont quitté le journal et qu'une resynchronisation est
+            nécessaire
+        """
+        current = cls.last_event_id(topic)
+        if last_event_id == current:
+            return [], True
+        if last_event_id > current:
+            # Compteur perdu (cache vidé) : impossible de savoir ce qui manque
+            return [], False
+
+        first = max(last_event_id + 1, current - cls.BUFFER_SIZE + 1)
+        complete = first == last_event_id + 1
+
+        ids = list(range(first, current + 1))
+        values = cache.get_many([cls._event_key(topic, event_id) for event_id in ids])
+
+        events = []
+        for event_id in ids:
+            event = values.get(cls._event_key(topic, event_id))
+            if event is None:
+                complete = False
+                continue
+            events.append((event_id, event))
+        return events, complete
@@ -596,3 +596,776 @@ class TestMessagingFlow:
         
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['messages']) == 2
+
+
+# ==================== PRESENCE TESTS ====================
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'messaging-tests',
+    }
+}
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Cache réel (LocMem) : le cache de test est factice"""
+    from django.core.cache import cache
+    settings.CACHES = LOCMEM_CACHE
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+class TestPresenceRegistry:
+    """Tests du registre de présence"""
+    
+    def test_connect_disconnect_transitions(self, locmem_cache):
+        from apps.messaging.presence import PresenceRegistry
+        
+        assert PresenceRegistry.connect('u1', scope='c1') is True
+        assert PresenceRegistry.connect('u1', scope='c1') is False  # second onglet
+        assert PresenceRegistry.is_online('u1')
+        assert PresenceRegistry.is_online('u1', scope='c1')
+        
+        assert PresenceRegistry.disconnect('u1', scope='c1') is False
+        assert PresenceRegistry.disconnect('u1', scope='c1') is True
+        assert not PresenceRegistry.is_online('u1')
+        assert not PresenceRegistry.is_online('u1', scope='c1')
+    
+    def test_announce_is_coalesced(self, locmem_cache):
+        from apps.messaging.presence import PresenceRegistry
+        
+        assert PresenceRegistry.mark_announced('u1', scope='c1') is True
+        assert PresenceRegistry.mark_announced('u1', scope='c1') is False
+        assert PresenceRegistry.clear_announced('u1', scope='c1') is True
+        assert PresenceRegistry.clear_announced('u1', scope='c1') is False
+    
+    def test_bulk_status(self, locmem_cache):
+        from apps.messaging.presence import PresenceRegistry
+        
+        PresenceRegistry.connect('u1')
+        PresenceRegistry.connect('u2')
+        PresenceRegistry.disconnect('u2')
+        
+        status_map = PresenceRegistry.bulk_status(['u1', 'u2', 'u3'])
+        assert status_map['u1']['online'] is True
+        assert status_map['u2']['online'] is False
+        assert status_map['u2']['last_seen'] is not None
+        assert status_map['u3'] == {'online': False, 'last_seen': None}
+    
+    def test_dummy_cache_does_not_crash(self):
+        from apps.messaging.presence import PresenceRegistry
+        
+        PresenceRegistry.connect('u1', scope='c1')
+        PresenceRegistry.heartbeat('u1', scope='c1')
+        PresenceRegistry.disconnect('u1', scope='c1')
+
+
+@pytest.mark.django_db
+class TestConversationParticipantCache:
+    """Tests du cache des participants"""
+    
+    def test_participants_cached(self, locmem_cache, conversation, buyer, seller, another_user,
+                                 django_assert_num_queries):
+        from apps.messaging.services import ConversationParticipantCache
+        
+        assert ConversationParticipantCache.is_participant(conversation.id, buyer)
+        with django_assert_num_queries(0):
+            assert ConversationParticipantCache.is_participant(conversation.id, seller)
+            assert not ConversationParticipantCache.is_participant(conversation.id, another_user)
+    
+    def test_unknown_conversation(self, locmem_cache, buyer):
+        import uuid
+        from apps.messaging.services import ConversationParticipantCache
+        
+        assert not ConversationParticipantCache.is_participant(uuid.uuid4(), buyer)
+
+
+@pytest.mark.django_db
+class TestPresenceView:
+    """Tests de l'endpoint de présence"""
+    
+    def test_bulk_presence(self, locmem_cache, buyer_client, seller, another_user, conversation, create_user):
+        from apps.messaging.presence import PresenceRegistry
+        client, user = buyer_client
+        Conversation.objects.create(buyer=user, seller=another_user)
+        stranger = create_user(email='stranger@example.com', username='stranger')
+        PresenceRegistry.connect(seller.id)
+        PresenceRegistry.connect(stranger.id)
+        
+        response = client.get(
+            msg_url('presence'), {'user_ids': f'{seller.id},{another_user.id},{stranger.id}'}
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][str(seller.id)]['online'] is True
+        assert response.data['results'][str(another_user.id)]['online'] is False
+        # Pas de conversation commune : présence non exposée
+        assert str(stranger.id) not in response.data['results']
+    
+    def test_presence_rejects_invalid_ids(self, buyer_client):
+        client, user = buyer_client
+        response = client.get(msg_url('presence'), {'user_ids': 'not-a-uuid'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_presence_requires_ids(self, buyer_client):
+        client, user = buyer_client
+        response = client.get(msg_url('presence'))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_presence_unauthenticated(self, api_client):
+        response = api_client.get(msg_url('presence'), {'user_ids': 'x'})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db(transaction=True)
+class TestChatConsumerPresence:
+    """Tests WebSocket de la présence (événements coalescés)"""
+    
+    def test_online_event_sent_once(self, locmem_cache, monkeypatch, conversation, buyer, seller):
+        import json
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        from apps.messaging.presence import PresenceRegistry
+        
+        application = URLRouter(websocket_urlpatterns)
+        path = f'/ws/chat/{conversation.id}/'
+        
+        async def scenario():
+            seller_ws = WebsocketCommunicator(application, path)
+            seller_ws.scope['user'] = seller
+            connected, _ = await seller_ws.connect()
+            assert connected
+            
+            tabs = []
+            for _ in range(2):
+                tab = WebsocketCommunicator(application, path)
+                tab.scope['user'] = buyer
+                connected, _ = await tab.connect()
+                assert connected
+                tabs.append(tab)
+            
+            # Un seul user_online malgré deux onglets
+            event = json.loads(await seller_ws.receive_from())
+            assert event['status'] == 'online'
+            assert event['user_id'] == str(buyer.id)
+            assert await seller_ws.receive_nothing()
+            
+            # Heartbeat acquitté
+            await tabs[0].send_to(text_data=json.dumps({'type': 'heartbeat'}))
+            assert json.loads(await tabs[0].receive_from())['type'] == 'heartbeat_ack'
+            
+            # Fermer un onglet ne change pas la présence
+            await tabs[0].disconnect()
+            assert await seller_ws.receive_nothing()
+            
+            await tabs[1].disconnect()
+            event = json.loads(await seller_ws.receive_from())
+            assert event['status'] == 'offline'
+            
+            await seller_ws.disconnect()
+        
+        monkeypatch.setattr(PresenceRegistry, 'OFFLINE_GRACE', 0)
+        async_to_sync(scenario)()
+    
+    def test_non_participant_rejected(self, locmem_cache, conversation, another_user):
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        
+        async def scenario():
+            ws = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{conversation.id}/')
+            ws.scope['user'] = another_user
+            connected, _ = await ws.connect()
+            assert not connected
+        
+        async_to_sync(scenario)()
+
+
+# ==================== CHAT WRITE PATH TESTS ====================
+
+@pytest.mark.django_db
+class TestMessageWriter:
+    """Tests de l'écriture groupée des messages"""
+    
+    def test_write_batch_updates_conversation(self, conversation, buyer, seller):
+        from apps.messaging.writer import MessageWriter, PendingMessage, message_id_for
+        before = Conversation.objects.get(id=conversation.id).last_message_date
+        
+        batch = [
+            PendingMessage(id=message_id_for(conversation.id, buyer.id, f'c{i}'), conversation=conversation,
+                           sender=buyer, content=f'Message {i}')
+            for i in range(3)
+        ]
+        inserted = MessageWriter.write_batch(batch)
+        
+        assert len(inserted) == 3
+        assert Message.objects.filter(conversation=conversation).count() == 3
+        assert Conversation.objects.get(id=conversation.id).last_message_date >= before
+    
+    def test_write_batch_skips_duplicates(self, conversation, buyer):
+        from apps.messaging.writer import MessageWriter, PendingMessage, message_id_for
+        message_id = message_id_for(conversation.id, buyer.id, 'same-client-id')
+        pending = PendingMessage(id=message_id, conversation=conversation, sender=buyer, content='Bonjour')
+        
+        assert len(MessageWriter.write_batch([pending, pending])) == 1
+        assert MessageWriter.write_batch([pending]) == []
+        assert Message.objects.filter(id=message_id).count() == 1
+    
+    def test_same_client_id_in_two_conversations(self, conversation, buyer, create_user):
+        from apps.messaging.writer import MessageWriter, PendingMessage, message_id_for
+        other_seller = create_user(email='other@example.com', username='other', role='seller')
+        other_conversation = Conversation.objects.create(buyer=buyer, seller=other_seller)
+        
+        batch = [
+            PendingMessage(id=message_id_for(c.id, buyer.id, 'c1'), conversation=c, sender=buyer, content='Bonjour')
+            for c in (conversation, other_conversation)
+        ]
+        
+        assert batch[0].id != batch[1].id
+        assert len(MessageWriter.write_batch(batch)) == 2
+        assert Message.objects.filter(conversation=other_conversation).count() == 1
+    
+    def test_participant_cache_serves_session_conversation(self, locmem_cache, conversation, buyer,
+                                                           django_assert_num_queries):
+        from apps.messaging.services import ConversationParticipantCache
+        ConversationParticipantCache.get_roles(conversation.id)
+        
+        # Connexion suivante : participants et rôles lus dans le cache
+        with django_assert_num_queries(0):
+            assert ConversationParticipantCache.is_participant(conversation.id, buyer)
+            assert ConversationParticipantCache.get_roles(conversation.id) == (str(buyer.id), str(conversation.seller_id))
+    
+    def test_failed_batch_does_not_hold_back_later_batches(self, monkeypatch):
+        import uuid
+        from asgiref.sync import async_to_sync
+        from apps.messaging.writer import MessageWriter, PendingMessage
+        written = []
+        
+        def write_batch(batch):
+            if batch[0].content == 'échec':
+                raise RuntimeError('database unavailable')
+            written.extend(p.content for p in batch)
+            return []
+        
+        monkeypatch.setattr(MessageWriter, 'MAX_BATCH', 1)
+        monkeypatch.setattr(MessageWriter, 'write_batch', staticmethod(write_batch))
+        
+        async def scenario():
+            writer = MessageWriter()
+            writer._pending = [
+                PendingMessage(id=uuid.uuid4(), conversation=None, sender=None, content=content)
+                for content in ('échec', 'ok 1', 'ok 2')
+            ]
+            await writer.flush()
+            writer._flush_handle.cancel()
+            return writer._pending
+        
+        pending = async_to_sync(scenario)()
+        assert written == ['ok 1', 'ok 2']
+        assert [(p.content, p.attempts) for p in pending] == [('échec', 1)]
+    
+    def test_notify_once_per_sender(self, conversation, buyer, seller):
+        from unittest.mock import patch
+        from apps.messaging.writer import MessageWriter
+        messages = [
+            Message(conversation=conversation, sender=buyer, content=f'Message {i}')
+            for i in range(3)
+        ]
+        
+        with patch('apps.messaging.services.NotificationService.notify_new_message') as notify:
+            MessageWriter.notify(messages)
+        
+        notify.assert_called_once()
+        assert notify.call_args.kwargs['recipient'] == seller
+        assert notify.call_args.kwargs['message'] is messages[-1]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestChatConsumerMessages:
+    """Tests WebSocket de l'envoi de messages"""
+    
+    def _communicator(self, conversation, user):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        
+        ws = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{conversation.id}/')
+        ws.scope['user'] = user
+        return ws
+    
+    def test_message_broadcast_and_persisted(self, locmem_cache, conversation, buyer, seller):
+        import json
+        from unittest.mock import patch
+        from asgiref.sync import async_to_sync
+        
+        async def scenario():
+            seller_ws = self._communicator(conversation, seller)
+            buyer_ws = self._communicator(conversation, buyer)
+            await seller_ws.connect()
+            await buyer_ws.connect()
+            await seller_ws.receive_from()  # user_online de l'acheteur
+            
+            for _ in range(2):  # renvoi après reconnexion : même client_id
+                await buyer_ws.send_to(text_data=json.dumps({'message': 'Bonjour', 'client_id': 'abc'}))
+            
+            first = json.loads(await seller_ws.receive_from())
+            second = json.loads(await seller_ws.receive_from())
+            assert first['client_id'] == 'abc'
+            assert first['message_id'] == second['message_id']
+            
+            await buyer_ws.disconnect()
+            await seller_ws.disconnect()
+            return first['message_id']
+        
+        with patch('apps.messaging.services.NotificationService.notify_new_message') as notify:
+            message_id = async_to_sync(scenario)()
+        
+        message = Message.objects.get(conversation=conversation)
+        assert str(message.id) == message_id
+        assert message.sender == buyer
+        notify.assert_called_once()
+    
+    def test_spam_rejected(self, locmem_cache, conversation, buyer):
+        import json
+        from asgiref.sync import async_to_sync
+        
+        async def scenario():
+            ws = self._communicator(conversation, buyer)
+            await ws.connect()
+            await ws.send_to(text_data=json.dumps({'message': 'Achetez du bitcoin', 'client_id': 'x1'}))
+            response = json.loads(await ws.receive_from())
+            await ws.disconnect()
+            return response
+        
+        response = async_to_sync(scenario)()
+        assert response['client_id'] == 'x1'
+        assert 'error' in response
+        assert not Message.objects.filter(conversation=conversation).exists()
+    
+    def test_blocked_user_cannot_send(self, locmem_cache, conversation, buyer, seller):
+        import json
+        from asgiref.sync import async_to_sync
+        BlockedUser.objects.create(blocker=seller, blocked=buyer)
+        
+        async def scenario():
+            ws = self._communicator(conversation, buyer)
+            await ws.connect()
+            await ws.send_to(text_data=json.dumps({'message': 'Bonjour'}))
+            response = json.loads(await ws.receive_from())
+            await ws.disconnect()
+            return response
+        
+        assert async_to_sync(scenario)()['error'] == 'Cannot send message'
+    
+    def test_block_during_session_is_enforced(self, locmem_cache, conversation, buyer, seller):
+        import json
+        from unittest.mock import patch
+        from asgiref.sync import async_to_sync
+        from channels.db import database_sync_to_async
+        
+        async def scenario():
+            ws = self._communicator(conversation, buyer)
+            await ws.connect()
+            await ws.send_to(text_data=json.dumps({'message': 'Bonjour', 'client_id': 'c1'}))
+            accepted = json.loads(await ws.receive_from())
+            
+            await database_sync_to_async(BlockedUser.objects.create)(blocker=seller, blocked=buyer)
+            await ws.send_to(text_data=json.dumps({'message': 'Encore', 'client_id': 'c2'}))
+            refused = json.loads(await ws.receive_from())
+            await ws.disconnect()
+            return accepted, refused
+        
+        with patch('apps.messaging.services.NotificationService.notify_new_message'):
+            accepted, refused = async_to_sync(scenario)()
+        assert 'error' not in accepted
+        assert refused['error'] == 'Cannot send message'
+        assert Message.objects.filter(conversation=conversation).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestChatConsumerTyping:
+    """Tests de l'indicateur de frappe sur le socket du chat"""
+    
+    def test_typing_throttled_and_expires(self, locmem_cache, monkeypatch, conversation, buyer, seller):
+        import asyncio
+        import json
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        from apps.messaging.consumers import ConversationSession
+        
+        monkeypatch.setattr(ConversationSession, 'TYPING_THROTTLE_MS', 100)
+        monkeypatch.setattr(ConversationSession, 'TYPING_TIMEOUT_MS', 300)
+        application = URLRouter(websocket_urlpatterns)
+        path = f'/ws/chat/{conversation.id}/'
+        
+        async def scenario():
+            seller_ws = WebsocketCommunicator(application, path)
+            seller_ws.scope['user'] = seller
+            buyer_ws = WebsocketCommunicator(application, path)
+            buyer_ws.scope['user'] = buyer
+            await seller_ws.connect()
+            await buyer_ws.connect()
+            await seller_ws.receive_from()  # user_online de l'acheteur
+            
+            # Plusieurs frappes rapides : un seul événement
+            for _ in range(5):
+                await buyer_ws.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+            event = json.loads(await seller_ws.receive_from())
+            assert event == {
+                'type': 'typing', 'user_id': str(buyer.id),
+                'username': buyer.username, 'is_typing': True,
+            }
+            
+            # Arrêt immédiat : diffusé seulement en fin d'intervalle
+            await buyer_ws.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': False}))
+            assert await seller_ws.receive_nothing(timeout=0.03)
+            assert json.loads(await seller_ws.receive_from())['is_typing'] is False
+            
+            # Expiration automatique sans nouvel événement
+            await asyncio.sleep(0.1)
+            await buyer_ws.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+            assert json.loads(await seller_ws.receive_from())['is_typing'] is True
+            assert json.loads(await seller_ws.receive_from())['is_typing'] is False
+            
+            # L'expéditeur ne reçoit pas ses propres événements
+            assert await buyer_ws.receive_nothing()
+            
+            await buyer_ws.disconnect()
+            await seller_ws.disconnect()
+        
+        async_to_sync(scenario)()
+    
+    def test_legacy_typing_socket_requires_participant(self, locmem_cache, conversation, another_user):
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        
+        async def scenario():
+            ws = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/typing/{conversation.id}/')
+            ws.scope['user'] = another_user
+            connected, _ = await ws.connect()
+            return connected
+        
+        assert async_to_sync(scenario)() is False
+
+
+# ==================== MULTIPLEXED STREAM TESTS ====================
+
+@pytest.mark.django_db(transaction=True)
+class TestUserStreamConsumer:
+    """Tests du socket multiplexé par utilisateur"""
+    
+    def _communicator(self, user):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from config.ws_routing import websocket_urlpatterns
+        
+        ws = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/stream/')
+        ws.scope['user'] = user
+        return ws
+    
+    def test_subscribe_and_exchange(self, locmem_cache, conversation, buyer, seller):
+        import json
+        from unittest.mock import patch
+        from asgiref.sync import async_to_sync, sync_to_async
+        from apps.messaging.services import NotificationService
+        topic = f'conversation:{conversation.id}'
+        
+        async def scenario():
+            seller_ws = self._communicator(seller)
+            buyer_ws = self._communicator(buyer)
+            assert (await seller_ws.connect())[0]
+            assert (await buyer_ws.connect())[0]
+            
+            await seller_ws.send_json_to({'op': 'subscribe', 'topic': topic})
+            await seller_ws.send_json_to({'op': 'subscribe', 'topic': 'notifications'})
+            assert (await seller_ws.receive_json_from())['op'] == 'subscribed'
+            assert (await seller_ws.receive_json_from())['op'] == 'subscribed'
+            
+            await buyer_ws.send_json_to({'op': 'subscribe', 'topic': topic})
+            assert (await buyer_ws.receive_json_from())['op'] == 'subscribed'
+            presence = await seller_ws.receive_json_from()
+            assert presence['type'] == 'user_status' and presence['topic'] == topic
+            
+            await buyer_ws.send_json_to({'op': 'typing', 'topic': topic, 'is_typing': True})
+            typing = await seller_ws.receive_json_from()
+            assert typing['type'] == 'typing' and typing['is_typing'] is True
+            
+            await buyer_ws.send_json_to({'op': 'message', 'topic': topic, 'message': 'Bonjour', 'client_id': 'c1'})
+            frame = await seller_ws.receive_json_from()
+            assert frame['type'] == 'message'
+            assert frame['topic'] == topic
+            assert frame['event_id'] == 1
+            assert frame['data']['content'] == 'Bonjour'
+            assert frame['data']['client_id'] == 'c1'
+            
+            await sync_to_async(NotificationService.send_realtime_notification)(
+                str(seller.id), 'new_order', 'Nouvelle commande', 'Commande reçue'
+            )
+            notification = None
+            while notification is None:
+                frame = await seller_ws.receive_json_from()
+                if frame['topic'] == 'notifications':
+                    notification = frame
+            assert notification['type'] == 'notification'
+            assert notification['data']['title'] == 'Nouvelle commande'
+            
+            await buyer_ws.disconnect()
+            await seller_ws.disconnect()
+        
+        with patch('apps.messaging.services.NotificationService.notify_new_message'):
+            async_to_sync(scenario)()
+        
+        assert Message.objects.filter(conversation=conversation, content='Bonjour').exists()
+    
+    def test_event_published_while_subscribing_is_delivered(self, locmem_cache, monkeypatch, conversation, seller):
+        from asgiref.sync import async_to_sync, sync_to_async
+        from apps.messaging.consumers import ConversationSession
+        from apps.messaging.streams import TopicLog
+        topic = f'conversation:{conversation.id}'
+        original_join = ConversationSession.join
+        
+        async def join_then_publish(session):
+            # Message publié juste après l'entrée dans le groupe
+            joined = await original_join(session)
+            event = {'type': 'chat_message', 'message_id': 'm1', 'client_id': '', 'sender_id': 'x',
+                     'sender_username': 'buyer', 'content': 'Bonjour', 'created_at': '', 'is_read': False}
+            event['event_id'] = await sync_to_async(TopicLog.append)(topic, event)
+            await session.group_send(event)
+            return joined
+        
+        monkeypatch.setattr(ConversationSession, 'join', join_then_publish)
+        
+        async def scenario():
+            ws = self._communicator(seller)
+            await ws.connect()
+            await ws.send_json_to({'op': 'subscribe', 'topic': topic})
+            subscribed = await ws.receive_json_from()
+            frame = await ws.receive_json_from()
+            assert await ws.receive_nothing()
+            await ws.disconnect()
+            return subscribed, frame
+        
+        subscribed, frame = async_to_sync(scenario)()
+        assert subscribed['last_event_id'] == 0
+        assert frame['type'] == 'message' and frame['event_id'] == 1
+    
+    def test_out_of_order_events_are_delivered_once(self, monkeypatch):
+        from apps.messaging.consumers import UserStreamConsumer
+        monkeypatch.setattr(UserStreamConsumer, 'DEDUP_WINDOW', 3)
+        consumer = UserStreamConsumer()
+        consumer.last_event_ids = {'notifications': 4}
+        consumer.seen_event_ids = {}
+        
+        # Publications concurrentes : 6 arrive avant 5 ; rejeu de 5 et 6
+        delivered = [consumer._first_delivery('notifications', event_id) for event_id in (6, 5, 6, 5, 4)]
+        assert delivered == [True, True, False, False, False]
+        
+        # Fenêtre pleine : les ids les plus anciens remontent le plancher
+        assert consumer._first_delivery('notifications', 7)
+        assert consumer._first_delivery('notifications', 8)
+        assert consumer.last_event_ids['notifications'] == 6
+        assert not consumer._first_delivery('notifications', 6)
+    
+    def test_resume_from_last_event_id(self, locmem_cache, monkeypatch, conversation, buyer, seller):
+        from unittest.mock import patch
+        from asgiref.sync import async_to_sync
+        from apps.messaging.streams import TopicLog
+        topic = f'conversation:{conversation.id}'
+        
+        async def send_messages():
+            ws = self._communicator(buyer)
+            await ws.connect()
+            await ws.send_json_to({'op': 'subscribe', 'topic': topic})
+            await ws.receive_json_from()
+            for i in range(3):
+                await ws.send_json_to({'op': 'message', 'topic': topic, 'message': f'Message {i}', 'client_id': f'c{i}'})
+                await ws.receive_json_from()
+            await ws.disconnect()
+        
+        async def resume(last_event_id):
+            ws = self._communicator(seller)
+            await ws.connect()
+            await ws.send_json_to({'op': 'subscribe', 'topic': topic, 'last_event_id': last_event_id})
+            frames = [await ws.receive_json_from()]
+            while not await ws.receive_nothing():
+                frames.append(await ws.receive_json_from())
+            await ws.disconnect()
+            return frames
+        
+        with patch('apps.messaging.services.NotificationService.notify_new_message'):
+            async_to_sync(send_messages)()
+            frames = async_to_sync(resume)(1)
+            
+            assert frames[0]['op'] == 'subscribed'
+            replayed = [f for f in frames if f.get('type') == 'message']
+            assert [f['event_id'] for f in replayed] == [2, 3]
+            assert [f['data']['content'] for f in replayed] == ['Message 1', 'Message 2']
+            
+            # Écart plus grand que le journal : resynchronisation demandée
+            monkeypatch.setattr(TopicLog, 'BUFFER_SIZE', 1)
+            frames = async_to_sync(resume)(0)
+            assert any(f.get('type') == 'resync_required' for f in frames)
+    
+    def test_rejected_frames(self, locmem_cache, conversation, another_user):
+        import json
+        from asgiref.sync import async_to_sync
+        
+        async def scenario():
+            ws = self._communicator(another_user)
+            await ws.connect()
+            responses = []
+            for frame in (
+                json.dumps({'op': 'subscribe', 'topic': f'conversation:{conversation.id}'}),
+                json.dumps({'op': 'subscribe', 'topic': 'conversation:123'}),
+                json.dumps({'op': 'explode'}),
+                'x' * 20000,
+            ):
+                await ws.send_to(text_data=frame)
+                responses.append(await ws.receive_json_from())
+            await ws.disconnect()
+            return responses
+        
+        responses = async_to_sync(scenario)()
+        assert [r['type'] for r in responses] == ['error'] * 4
+        assert responses[0]['error'] == 'Accès refusé'
+        assert responses[1]['error'] == 'Topic invalide'
+    
+    def test_unauthenticated_rejected(self):
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth.models import AnonymousUser
+        
+        async def scenario():
+            ws = self._communicator(AnonymousUser())
+            connected, _ = await ws.connect()
+            return connected
+        
+        assert async_to_sync(scenario)() is False
+    
+    def test_backpressure_drops_ephemeral_and_closes_on_overflow(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+        from asgiref.sync import async_to_sync
+        from apps.messaging.consumers import UserStreamConsumer
+        
+        async def scenario():
+            consumer = UserStreamConsumer()
+            consumer.outbox = asyncio.Queue(maxsize=1)
+            consumer.closing = False
+            consumer.close = AsyncMock()
+            
+            consumer._push({'type': 'typing'})
+            consumer._push({'type': 'typing'})  # abandonnée
+            assert consumer.outbox.qsize() == 1
+            assert not consumer.closing
+            
+            consumer._push({'type': 'message'}, durable=True)
+            await asyncio.sleep(0)
+            assert consumer.closing
+            consumer.close.assert_awaited_once_with(code=UserStreamConsumer.SLOW_CONSUMER_CLOSE_CODE)
+        
+        async_to_sync(scenario)()
+
+
+# ==================== HISTORY & SYNC TESTS ====================
+
+@pytest.fixture
+def long_conversation(conversation, buyer, seller):
+    """Conversation avec 7 messages horodatés à la même seconde"""
+    created_at = timezone.now().replace(microsecond=0)
+    messages = [
+        Message(conversation=conversation, sender=buyer if i % 2 else seller, content=f'Message {i}')
+        for i in range(7)
+    ]
+    Message.objects.bulk_create(messages)
+    # Même horodatage : l'ordre repose sur l'id
+    Message.objects.filter(conversation=conversation).update(created_at=created_at)
+    return conversation
+
+
+@pytest.mark.django_db
+class TestMessageHistory:
+    """Tests de l'historique paginé par curseur"""
+    
+    def test_paginate_backwards(self, buyer_client, long_conversation):
+        client, user = buyer_client
+        url = msg_url('conversations-messages', pk=long_conversation.id)
+        expected = [
+            str(pk) for pk in Message.objects.filter(
+                conversation=long_conversation
+            ).order_by('created_at', 'id').values_list('id', flat=True)
+        ]
+        
+        seen = []
+        response = client.get(url, {'limit': 3})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            seen = [m['id'] for m in response.data['results']] + seen
+            if not response.data['has_more']:
+                break
+            response = client.get(url, {'limit': 3, 'before': response.data['before']})
+        
+        assert seen == expected
+    
+    def test_after_cursor(self, buyer_client, long_conversation):
+        client, user = buyer_client
+        url = msg_url('conversations-messages', pk=long_conversation.id)
+        
+        first_page = client.get(url, {'limit': 7}).data
+        latest = first_page['after']
+        assert client.get(url, {'after': latest}).data['results'] == []
+        
+        new_message = Message.objects.create(conversation=long_conversation, sender=user, content='Nouveau')
+        response = client.get(url, {'after': latest})
+        assert [m['id'] for m in response.data['results']] == [str(new_message.id)]
+    
+    def test_invalid_cursor(self, buyer_client, conversation):
+        client, user = buyer_client
+        response = client.get(msg_url('conversations-messages', pk=conversation.id), {'before': 'nope'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_history_non_participant(self, api_client, conversation, another_user):
+        api_client.force_authenticate(user=another_user)
+        response = api_client.get(msg_url('conversations-messages', pk=conversation.id))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestDeltaSync:
+    """Tests de la synchronisation incrémentale"""
+    
+    def test_sync_new_messages_and_read_receipts(self, buyer_client, conversation, buyer, seller, another_user):
+        from datetime import timedelta
+        client, user = buyer_client
+        old = Message.objects.create(conversation=conversation, sender=buyer, content='Ancien')
+        Message.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(hours=1))
+        since = timezone.now() - timedelta(minutes=1)
+        
+        reply = Message.objects.create(conversation=conversation, sender=seller, content='Réponse')
+        Message.objects.filter(id=old.id).update(is_read=True, read_at=timezone.now())
+        
+        other = Conversation.objects.create(buyer=another_user, seller=seller)
+        Message.objects.create(conversation=other, sender=another_user, content='Pas pour moi')
+        
+        response = client.get(msg_url('conversations-sync'), {'since': since.isoformat()})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [m['id'] for m in response.data['messages']] == [str(reply.id)]
+        assert response.data['messages'][0]['conversation_id'] == str(conversation.id)
+        assert [r['message_id'] for r in response.data['read_receipts']] == [str(old.id)]
+        assert response.data['truncated'] is False
+        assert response.data['next_since'] < response.data['server_time']
+    
+    def test_sync_requires_since(self, buyer_client):
+        client, user = buyer_client
+        response = client.get(msg_url('conversations-sync'))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ConversationViewSet, NotificationViewSet
+from .views import ConversationViewSet, NotificationViewSet, PresenceView
 
 app_name = 'messaging'
 
@@ -9,5 +9,6 @@ router.register(r'conversations', ConversationViewSet, basename='conversations')
 router.register(r'notifications', NotificationViewSet, basename='notifications')
 
 urlpatterns = [
+    path('presence/', PresenceView.as_view(), name='presence'),
     path('', include(router.urls)),
 ]
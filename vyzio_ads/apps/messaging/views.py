@@ -2,15 +2,53 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 from .models import Conversation, Message, BlockedUser, Report, Notification
-from .serializers import ConversationSerializer, ConversationDetailSerializer, MessageSerializer, ReportSerializer, NotificationSerializer
-from .services import NotificationService, AntiSpamService
+from .serializers import ConversationSerializer, ConversationDetailSerializer, MessageSerializer, MessageSyncSerializer, ReportSerializer, NotificationSerializer
+from .services import NotificationService, AntiSpamService, ConversationParticipantCache
+from .presence import PresenceRegistry
+from apps.users.entitlements import EntitlementService
+import base64
+import binascii
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Historique des messages
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 200
+# Synchronisation incrémentale
+SYNC_LIMIT = 500
+# Recouvrement couvrant les écritures groupées encore en cours
+SYNC_OVERLAP_SECONDS = 5
+
+
+def encode_message_cursor(message):
+    """Curseur opaque sur (created_at, id)"""
+    raw = f'{message.created_at.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_message_cursor(cursor):
+    """
+    Returns:
+        (created_at, id) — ValueError si le curseur est invalide
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, message_id = raw.split('|', 1)
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            raise ValueError(cursor)
+        return parsed, uuid.UUID(message_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(cursor) from e
+
 
 
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -28,6 +66,11 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return ConversationDetailSerializer
         return ConversationSerializer
     
+    def perform_destroy(self, instance):
+        conversation_id = instance.id
+        instance.delete()
+        ConversationParticipantCache.invalidate(conversation_id)
+    
     @action(detail=False, methods=['post'])
     def start_conversation(self, request):
         """Start a new conversation"""
@@ -58,7 +101,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Cannot message yourself'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Vérifier si l'utilisateur est bloqué
-        if BlockedUser.objects.filter(blocker=seller, blocked=request.user).exists():
+        if EntitlementService.for_request(request).is_blocked_by(seller.pk):
             return Response({'error': 'Cannot contact this user'}, status=status.HTTP_403_FORBIDDEN)
         
         conversation, created = Conversation.objects.get_or_create(
@@ -110,10 +153,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         conversation = self.get_object()
         
         # Check if users are blocked
-        if BlockedUser.objects.filter(
-            Q(blocker=request.user, blocked__in=[conversation.buyer, conversation.seller]) |
-            Q(blocker__in=[conversation.buyer, conversation.seller], blocked=request.user)
-        ).exists():
+        if EntitlementService.for_request(request).is_blocked_with(conversation.buyer_id, conversation.seller_id):
             return Response({'error': 'Cannot send message'}, status=status.HTTP_403_FORBIDDEN)
         
         content = request.data.get('content', '').strip()
@@ -153,6 +193,110 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         return Response(MessageSerializer(message).data, status=status.HTTP_201_CREATED)
     
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Historique paginé par curseur sur (created_at, id).
+        
+        GET /api/messages/conversations/{id}/messages/?limit=50
+        GET ...?before=<cursor>  - messages plus anciens
+        GET ...?after=<cursor>   - messages plus récents
+        
+        Sans curseur, retourne les derniers messages. Résultats toujours
+        triés du plus ancien au plus récent.
+        """
+        conversation = self.get_object()
+        
+        try:
+            limit = min(int(request.query_params.get('limit', MESSAGE_PAGE_SIZE)), MESSAGE_PAGE_MAX)
+        except ValueError:
+            limit = MESSAGE_PAGE_SIZE
+        limit = max(limit, 1)
+        
+        queryset = conversation.messages.select_related('sender')
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        
+        try:
+            if after:
+                created_at, message_id = decode_message_cursor(after)
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+                ).order_by('created_at', 'id')
+            else:
+                if before:
+                    created_at, message_id = decode_message_cursor(before)
+                    queryset = queryset.filter(
+                        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+                    )
+                queryset = queryset.order_by('-created_at', '-id')
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        messages = list(queryset[:limit + 1])
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not after:
+            messages.reverse()
+        
+        return Response({
+            'results': MessageSerializer(messages, many=True).data,
+            'has_more': has_more,
+            'before': encode_message_cursor(messages[0]) if messages else before,
+            'after': encode_message_cursor(messages[-1]) if messages else after,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Synchronisation incrémentale de toutes les conversations de l'utilisateur.
+        
+        GET /api/messages/conversations/sync/?since=<ISO 8601>
+        
+        Retourne les nouveaux messages et les accusés de lecture des messages
+        envoyés par l'utilisateur depuis `since`. Le client rappelle avec
+        `next_since` (léger recouvrement : dédoublonner par id).
+        """
+        since = parse_datetime(request.query_params.get('since', ''))
+        if since is None:
+            return Response({'error': 'since (ISO 8601) required'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        
+        server_time = timezone.now()
+        user = request.user
+        
+        new_messages = list(
+            Message.objects.filter(
+                conversation__in=self.get_queryset().values('id'),
+                created_at__gt=since,
+            ).order_by('created_at', 'id')[:SYNC_LIMIT + 1]
+        )
+        read_receipts = list(
+            Message.objects.filter(
+                sender=user,
+                read_at__gt=since,
+            ).order_by('read_at').values('id', 'conversation_id', 'read_at')[:SYNC_LIMIT + 1]
+        )
+        
+        # Trop de changements : recharger par l'historique paginé
+        truncated = len(new_messages) > SYNC_LIMIT or len(read_receipts) > SYNC_LIMIT
+        
+        return Response({
+            'messages': MessageSyncSerializer(new_messages[:SYNC_LIMIT], many=True).data,
+            'read_receipts': [
+                {
+                    'message_id': str(receipt['id']),
+                    'conversation_id': str(receipt['conversation_id']),
+                    'read_at': receipt['read_at'],
+                }
+                for receipt in read_receipts[:SYNC_LIMIT]
+            ],
+            'truncated': truncated,
+            'server_time': server_time,
+            'next_since': server_time - timedelta(seconds=SYNC_OVERLAP_SECONDS),
+        })
+    
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark messages as read"""
@@ -239,3 +383,44 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         """Retourne le nombre de notifications non lues"""
         count = self.get_queryset().filter(is_read=False).count()
         return Response({'unread_count': count})
+
+
+
+class PresenceView(APIView):
+    """
+    Statut de présence de plusieurs utilisateurs en une requête.
+    
+    GET /api/messages/presence/?user_ids=<uuid>,<uuid>
+    
+    Limité aux utilisateurs avec qui l'appelant a une conversation (une
+    requête) ; les autres ids sont ignorés. Statuts lus depuis le registre
+    de présence (cache).
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        raw_ids = request.query_params.get('user_ids', '')
+        user_ids = [user_id.strip() for user_id in raw_ids.split(',') if user_id.strip()]
+        
+        if not user_ids:
+            return Response({'error': 'user_ids required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(user_ids) > PresenceRegistry.MAX_BULK_USERS:
+            return Response(
+                {'error': f'Maximum {PresenceRegistry.MAX_BULK_USERS} user_ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            user_ids = {str(uuid.UUID(user_id)) for user_id in user_ids}
+        except ValueError:
+            return Response({'error': 'user_ids must be UUIDs'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        me = request.user.pk
+        contacts = {str(me)}
+        for buyer_id, seller_id in Conversation.objects.filter(
+            Q(buyer_id=me, seller_id__in=user_ids) | Q(seller_id=me, buyer_id__in=user_ids)
+        ).values_list('buyer_id', 'seller_id'):
+            contacts.update((str(buyer_id), str(seller_id)))
+        
+        return Response({'results': PresenceRegistry.bulk_status(sorted(user_ids & contacts))})
@@ -0,0 +1,206 @@
+"""
+Écriture groupée des messages du chat temps réel.
+
+Le ChatConsumer diffuse les messages immédiatement puis les confie au
+MessageWriter, qui les insère par lots (bulk_create) toutes les
+CHAT_WRITE_FLUSH_INTERVAL secondes ou dès que CHAT_WRITE_MAX_BATCH messages
+sont en attente. La latence du chat n'est donc plus liée à un aller-retour
+base de données par message.
+
+Un writer par boucle d'événements (un par process Daphne/Uvicorn).
+"""
+import asyncio
+import logging
+import uuid
+import weakref
+from dataclasses import dataclass, field
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Espace de noms des UUID dérivés des identifiants client
+CLIENT_MESSAGE_NAMESPACE = uuid.UUID('6f0b8f52-5f3c-4d0e-9a51-3b8a7c1e2d40')
+
+
+def message_id_for(conversation_id, sender_id, client_id) -> uuid.UUID:
+    """
+    ID de message déterministe pour un identifiant client.
+    Un renvoi du même message (reconnexion) produit le même ID et n'est
+    donc inséré qu'une seule fois. La conversation fait partie de la clé :
+    un client_id réutilisé dans une autre conversation donne un autre message.
+    """
+    if not client_id:
+        return uuid.uuid4()
+    return uuid.uuid5(CLIENT_MESSAGE_NAMESPACE, f'{conversation_id}:{sender_id}:{client_id}')
+
+
+@dataclass
+class PendingMessage:
+    """Message diffusé, en attente d'insertion"""
+    id: uuid.UUID
+    conversation: object
+    sender: object
+    content: str
+    attempts: int = field(default=0)
+
+
+class MessageWriter:
+    """
+    File d'écriture des messages, vidée par lots.
+    """
+
+    FLUSH_INTERVAL = getattr(settings, 'CHAT_WRITE_FLUSH_INTERVAL', 0.05)
+    MAX_BATCH = getattr(settings, 'CHAT_WRITE_MAX_BATCH', 200)
+    MAX_ATTEMPTS = 3
+
+    _instances = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self._pending = []
+        self._flush_handle = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def for_current_loop(cls) -> 'MessageWriter':
+        loop = asyncio.get_running_loop()
+        writer = cls._instances.get(loop)
+        if writer is None:
+            writer = cls()
+            cls._instances[loop] = writer
+        return writer
+
+    def enqueue(self, pending: PendingMessage):
+        """Ajoute un message à la file et planifie l'écriture"""
+        self._pending.append(pending)
+
+        if len(self._pending) >= self.MAX_BATCH:
+            self._schedule(0)
+        elif self._flush_handle is None:
+            self._schedule(self.FLUSH_INTERVAL)
+
+    def _schedule(self, delay):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(
+            delay, lambda: asyncio.ensure_future(self.flush())
+        )
+
+    async def flush(self):
+        """Écrit tous les messages en attente"""
+        async with self._lock:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+
+            # Lots en échec : remis en file après le passage, les lots
+            # suivants sont écrits sans attendre la nouvelle tentative
+            failed = []
+            while self._pending:
+                batch = self._pending[:self.MAX_BATCH]
+                self._pending = self._pending[self.MAX_BATCH:]
+
+                try:
+                    inserted = await database_sync_to_async(self.write_batch)(batch)
+                except Exception as e:
+                    logger.error(f"Failed to write chat batch ({len(batch)} messages): {e}")
+                    retry = [p for p in batch if p.attempts + 1 < self.MAX_ATTEMPTS]
+                    for pending in retry:
+                        pending.attempts += 1
+                    dropped = len(batch) - len(retry)
+                    if dropped:
+                        logger.error(f"Dropped {dropped} chat messages after {self.MAX_ATTEMPTS} attempts")
+                    failed.extend(retry)
+                    continue
+
+                if inserted:
+                    await database_sync_to_async(self.notify, thread_sensitive=False)(inserted)
+
+            if failed:
+                self._pending = failed + self._pending
+                self._schedule(self.FLUSH_INTERVAL * 10)
+
+    @staticmethod
+    def write_batch(batch) -> list:
+        """
+        Insère un lot et met à jour last_message_date par conversation.
+
+        Note: created_at (auto_now_add) est fixé à l'insertion, quelques
+        millisecondes après la diffusion optimiste.
+
+        Returns:
+            Messages réellement insérés (hors doublons)
+        """
+        from django.db import transaction
+        from apps.messaging.models import Conversation, Message
+
+        existing = set(
+            Message.objects.filter(id__in=[p.id for p in batch]).values_list('id', flat=True)
+        )
+        seen = set(existing)
+        fresh = []
+        for pending in batch:
+            if pending.id not in seen:
+                seen.add(pending.id)
+                fresh.append(pending)
+
+        if not fresh:
+            return []
+
+        messages = [
+            Message(
+                id=p.id,
+                conversation_id=p.conversation.id,
+                sender_id=p.sender.id,
+                content=p.content,
+            )
+            for p in fresh
+        ]
+
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, ignore_conflicts=True)
+
+            now = timezone.now()
+            conversation_ids = {p.conversation.id for p in fresh}
+            Conversation.objects.filter(id__in=conversation_ids).update(
+                last_message_date=now,
+                updated_at=now,
+            )
+
+        for pending, message in zip(fresh, messages):
+            message.conversation = pending.conversation
+            message.sender = pending.sender
+        return messages
+
+    @staticmethod
+    def notify(messages):
+        """
+        Notifie les destinataires : un seul appel par (conversation, expéditeur)
+        et par lot, avec le dernier message. Conversations (participants,
+        annonce) chargées en une requête pour le lot.
+        """
+        from apps.messaging.models import Conversation
+        from apps.messaging.services import NotificationService
+
+        latest = {}
+        for message in messages:
+            latest[(message.conversation.id, message.sender.id)] = message
+
+        conversations = Conversation.objects.select_related('buyer', 'seller', 'listing').in_bulk(
+            {conversation_id for conversation_id, _sender_id in latest}
+        )
+        for message in latest.values():
+            conversation = conversations.get(message.conversation.id, message.conversation)
+            recipient = conversation.seller if message.sender.id == conversation.buyer_id else conversation.buyer
+            try:
+                NotificationService.notify_new_message(
+                    recipient=recipient,
+                    sender=message.sender,
+                    conversation=conversation,
+                    message=message
+                )
+            except Exception as e:
+                logger.error(f"Failed to send message notification: {e}")
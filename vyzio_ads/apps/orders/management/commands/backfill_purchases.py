@@ -0,0 +1,27 @@
+"""
+Remplit les relations d'achat (PurchaseRelation) depuis l'historique :
+commandes terminées et paiements d'achat complétés.
+
+Usage:
+    python manage.py backfill_purchases
+    python manage.py backfill_purchases --chunk-size 5000
+
+Idempotent : les relations déjà présentes sont ignorées.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.orders.models import PurchaseRelation
+
+
+class Command(BaseCommand):
+    help = 'Remplit la table des relations d\'achat depuis les commandes et paiements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        scanned = PurchaseRelation.backfill(chunk_size=options['chunk_size'])
+        total = PurchaseRelation.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {scanned} achat(s) parcouru(s), {total} relation(s) en base'
+        ))
@@ -0,0 +1,36 @@
+"""
+Clôture des commandes livrées sans confirmation de l'acheteur.
+
+Usage:
+    python manage.py complete_orders
+    python manage.py complete_orders --days 14 --batch-size 500
+
+En production, la tâche Celery `complete_delivered_orders` s'en charge.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = 'Termine les commandes livrées depuis N jours et libère les fonds vendeurs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=OrderService.AUTO_COMPLETE_DAYS,
+            help='Jours après livraison (défaut: ORDER_AUTO_COMPLETE_DAYS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OrderService.BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        completed = OrderService.complete_delivered(
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {completed} commande(s) terminée(s)'))
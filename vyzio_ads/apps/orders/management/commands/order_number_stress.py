@@ -0,0 +1,102 @@
+"""
+Test de charge de la numérotation des commandes.
+
+Crée des dizaines de milliers de commandes en parallèle (chemin normal
+Order.save -> generate_order_number) puis vérifie :
+- aucun numéro en double, aucune IntegrityError
+- numéros strictement croissants pour chaque worker
+
+Usage:
+    python manage.py order_number_stress
+    python manage.py order_number_stress --orders 50000 --workers 32
+
+Consomme des valeurs du compteur du mois (OrderSequence) : à lancer sur une
+base de test ou de préproduction. Les commandes créées sont supprimées à la
+fin (sauf --keep).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Count
+
+
+class Command(BaseCommand):
+    help = 'Crée des commandes en parallèle et vérifie l\'unicité des numéros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000, help='Nombre total de commandes')
+        parser.add_argument('--workers', type=int, default=16, help='Créations en parallèle')
+        parser.add_argument('--keep', action='store_true', help='Conserver les commandes créées')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth import get_user_model
+        from apps.orders.models import Order
+
+        if options['orders'] < 1 or options['workers'] < 1:
+            raise CommandError('--orders et --workers doivent être positifs')
+
+        User = get_user_model()
+        run_id = uuid.uuid4().hex[:8]
+        buyer = User.objects.create_user(
+            email=f'stress_{run_id}_buyer@example.com', username=f'stress_{run_id}_buyer', password=None
+        )
+        seller = User.objects.create_user(
+            email=f'stress_{run_id}_seller@example.com', username=f'stress_{run_id}_seller', password=None
+        )
+
+        workers = options['workers']
+        shares = [options['orders'] // workers + (i < options['orders'] % workers) for i in range(workers)]
+
+        def create_orders(count):
+            numbers, errors = [], []
+            try:
+                for _ in range(count):
+                    order = Order(
+                        buyer=buyer, seller=seller, listing_title=f'Stress {run_id}',
+                        item_price=Decimal('10.00'), platform_fee=Decimal('0.50'),
+                        seller_amount=Decimal('9.50'),
+                    )
+                    while True:
+                        try:
+                            order.save()
+                            break
+                        except OperationalError:
+                            # Verrou de base (SQLite) : on réessaie avec le même numéro
+                            time.sleep(0.001)
+                        except IntegrityError as e:
+                            errors.append(str(e))
+                            break
+                    numbers.append(order.order_number)
+                return numbers, errors
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(create_orders, shares))
+            elapsed = time.monotonic() - started
+
+            errors = [error for _numbers, worker_errors in results for error in worker_errors]
+            unordered = sum(1 for numbers, _errors in results if numbers != sorted(numbers))
+            orders = Order.objects.filter(buyer=buyer)
+            created = orders.count()
+            duplicates = (
+                orders.values('order_number').annotate(n=Count('id')).filter(n__gt=1).count()
+            )
+
+            self.stdout.write(f'Commandes créées : {created} en {elapsed:.1f}s ({created / elapsed:.0f}/s)')
+            self.stdout.write(f'Workers : {workers}, erreurs d\'intégrité : {len(errors)}')
+            self.stdout.write(f'Numéros en double : {duplicates}, workers non ordonnés : {unordered}')
+
+            if errors or duplicates or unordered or created != options['orders']:
+                raise CommandError('Numérotation incorrecte sous charge')
+            self.stdout.write(self.style.SUCCESS('✅ Numéros uniques et croissants'))
+        finally:
+            if not options['keep']:
+                Order.objects.filter(buyer=buyer).delete()
+                User.objects.filter(id__in=[buyer.id, seller.id]).delete()
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSequence',
+            fields=[
+                ('period', models.CharField(max_length=4, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'orders_order_sequence',
+            },
+        ),
+    ]
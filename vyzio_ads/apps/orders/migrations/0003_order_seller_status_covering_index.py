@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_sequence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_seller__e2c3f1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(
+                fields=['seller', 'status'],
+                include=['seller_amount'],
+                name='orders_seller_status_amt_idx',
+            ),
+        ),
+    ]
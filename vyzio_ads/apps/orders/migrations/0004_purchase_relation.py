@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('listings', '0004_listing_condition'),
+        ('orders', '0003_order_seller_status_covering_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseRelation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(choices=[('order', 'Commande'), ('payment', 'Paiement')], default='order', max_length=10)),
+                ('purchased_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases_made', to=settings.AUTH_USER_MODEL)),
+                ('listing', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='listings.listing')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases_received', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'orders_purchase_relation',
+                'indexes': [
+                    models.Index(fields=['buyer', 'listing'], name='orders_purchase_buyer_lst_idx'),
+                    models.Index(fields=['seller', '-purchased_at'], name='orders_purchase_seller_idx'),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='purchaserelation',
+            constraint=models.UniqueConstraint(fields=('buyer', 'seller', 'listing'), name='orders_purchase_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='purchaserelation',
+            constraint=models.UniqueConstraint(condition=models.Q(('listing__isnull', True)), fields=('buyer', 'seller'), name='orders_purchase_unique_no_listing'),
+        ),
+    ]
@@ -2,17 +2,108 @@
 Modèles pour la gestion des commandes et du wallet vendeur.
 
 Order: Représente une transaction d'achat entre un acheteur et un vendeur
+OrderSequence: Compteur mensuel des numéros de commande
+PurchaseRelation: Achats terminés (acheteur, vendeur, annonce) pour les avis vérifiés
 SellerWallet: Solde disponible pour chaque vendeur
 WalletTransaction: Historique des mouvements du wallet
 WithdrawalRequest: Demandes de retrait des vendeurs
 """
+import threading
 import uuid
 from decimal import Decimal
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.db.models import F, Q
 from django.conf import settings
 from django.utils import timezone
 
 
+# Base32 de Crockford : ordre ASCII croissant, sans I/L/O/U
+ORDER_NUMBER_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ORDER_NUMBER_WIDTH = 7
+
+# Connexion dédiée (par thread) à la réservation des numéros de commande
+_sequence_connections = threading.local()
+
+
+def encode_order_sequence(value, width=ORDER_NUMBER_WIDTH):
+    """Encode un entier en base32 (Crockford), complété à gauche par des zéros."""
+    digits = []
+    while value:
+        value, remainder = divmod(value, 32)
+        digits.append(ORDER_NUMBER_ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+class OrderSequence(models.Model):
+    """
+    Compteur des numéros de commande, une ligne par mois (AAMM).
+    Incrémenté par un UPDATE atomique : deux workers n'obtiennent jamais
+    la même valeur.
+    """
+    
+    period = models.CharField(max_length=4, primary_key=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'orders_order_sequence'
+    
+    def __str__(self):
+        return f"{self.period}: {self.last_value}"
+    
+    @classmethod
+    def next_value(cls, period) -> int:
+        """
+        Réserve la valeur suivante du compteur de la période.
+        
+        Dans une transaction (ex. handler de webhook), la valeur est réservée
+        sur une connexion dédiée et validée aussitôt : le verrou de la ligne
+        du mois n'est pas tenu jusqu'au commit de l'appelant. Une transaction
+        annulée laisse un trou dans la numérotation.
+        """
+        if connection.in_atomic_block and cls._allocates_apart(connection):
+            return cls._next_value_apart(period)
+        with transaction.atomic():
+            updated = cls.objects.filter(period=period).update(last_value=F('last_value') + 1)
+            if not updated:
+                # Première commande du mois : création concurrente sans erreur
+                cls.objects.bulk_create([cls(period=period)], ignore_conflicts=True)
+                cls.objects.filter(period=period).update(last_value=F('last_value') + 1)
+            return cls.objects.filter(period=period).values_list('last_value', flat=True).get()
+    
+    @staticmethod
+    def _allocates_apart(connection) -> bool:
+        """
+        Réservation hors transaction possible : PostgreSQL uniquement.
+        SQLite verrouille toute la base pendant la transaction de
+        l'appelant (une seconde connexion attendrait ce verrou).
+        """
+        return connection.vendor == 'postgresql'
+    
+    @classmethod
+    def _next_value_apart(cls, period) -> int:
+        """Upsert en autocommit sur la connexion dédiée du thread."""
+        sequence_connection = getattr(_sequence_connections, 'connection', None)
+        if sequence_connection is not None:
+            sequence_connection.close_if_unusable_or_obsolete()
+        else:
+            sequence_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            _sequence_connections.connection = sequence_connection
+        
+        table = sequence_connection.ops.quote_name(cls._meta.db_table)
+        try:
+            with sequence_connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (period, last_value) VALUES (%s, 1) '
+                    f'ON CONFLICT (period) DO UPDATE SET last_value = {table}.last_value + 1 '
+                    f'RETURNING last_value',
+                    [period],
+                )
+                return cursor.fetchone()[0]
+        except Exception:
+            sequence_connection.close()
+            raise
+
+
 class Order(models.Model):
     """
     Commande représentant un achat.
@@ -112,8 +203,12 @@ class Order(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['buyer', 'status']),
-            models.Index(fields=['seller', 'status']),
-            models.Index(fields=['order_number']),
+            # Couvrant (PostgreSQL) : statistiques vendeur sans lecture de la table
+            models.Index(
+                fields=['seller', 'status'],
+                include=['seller_amount'],
+                name='orders_seller_status_amt_idx',
+            ),
             models.Index(fields=['status', '-created_at']),
         ]
     
@@ -126,15 +221,20 @@ class Order(models.Model):
         if not self.seller_amount:
             self.calculate_amounts()
         super().save(*args, **kwargs)
+        
+        from apps.orders.services import OrderStatsService
+        OrderStatsService.invalidate(self.buyer_id, self.seller_id)
     
     @staticmethod
-    def generate_order_number():
-        """Génère un numéro de commande unique."""
-        import random
-        import string
-        prefix = timezone.now().strftime('%y%m')
-        suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        return f"VYZ-{prefix}-{suffix}"
+    def generate_order_number(now=None):
+        """
+        Génère un numéro de commande unique et croissant : VYZ-AAMM-XXXXXXX,
+        XXXXXXX étant le compteur du mois en base32 (7 caractères, distincts
+        des anciens suffixes aléatoires de 6 caractères).
+        """
+        period = (now or timezone.now()).strftime('%y%m')
+        sequence = OrderSequence.next_value(period)
+        return f"VYZ-{period}-{encode_order_sequence(sequence)}"
     
     def calculate_amounts(self):
         """Calcule la commission et le montant vendeur."""
@@ -144,65 +244,183 @@ class Order(models.Model):
     
     def confirm(self):
         """Confirme la commande après paiement."""
-        self.status = 'confirmed'
-        self.confirmed_at = timezone.now()
-        self.save(update_fields=['status', 'confirmed_at', 'updated_at'])
+        from apps.orders.services import OrderService
+        OrderService.transition(self, 'confirmed')
     
     def mark_shipped(self, tracking_number='', carrier='', tracking_url=''):
         """Marque la commande comme expédiée."""
-        self.status = 'shipped'
-        self.shipped_at = timezone.now()
-        self.tracking_number = tracking_number
-        self.carrier = carrier
-        self.tracking_url = tracking_url
-        self.save(update_fields=[
-            'status', 'shipped_at', 'tracking_number', 
-            'carrier', 'tracking_url', 'updated_at'
-        ])
+        from apps.orders.services import OrderService
+        OrderService.transition(
+            self, 'shipped',
+            tracking_number=tracking_number,
+            carrier=carrier,
+            tracking_url=tracking_url,
+            seller_notes=self.seller_notes,
+        )
     
     def mark_delivered(self):
         """Marque la commande comme livrée."""
-        self.status = 'delivered'
-        self.delivered_at = timezone.now()
-        self.save(update_fields=['status', 'delivered_at', 'updated_at'])
+        from apps.orders.services import OrderService
+        OrderService.transition(self, 'delivered')
     
     def confirm_receipt(self):
-        """L'acheteur confirme la réception."""
-        self.buyer_confirmed_receipt = True
-        self.status = 'completed'
-        self.completed_at = timezone.now()
-        self.save(update_fields=[
-            'buyer_confirmed_receipt', 'status', 
-            'completed_at', 'updated_at'
-        ])
-        # Libérer les fonds au vendeur
-        self.release_funds()
+        """L'acheteur confirme la réception (et les fonds sont libérés)."""
+        from apps.orders.services import OrderService
+        OrderService.complete(self)
     
     def release_funds(self):
         """Libère les fonds au vendeur (ajoute au wallet)."""
+        from apps.orders.services import OrderService
+        
         if self.funds_released:
             return False
-        
-        wallet, created = SellerWallet.objects.get_or_create(
-            user=self.seller,
-            defaults={'balance': Decimal('0.00')}
-        )
-        wallet.credit(
-            amount=self.seller_amount,
-            description=f"Vente: {self.listing_title}",
-            order=self
-        )
-        self.funds_released = True
-        self.save(update_fields=['funds_released', 'updated_at'])
-        return True
+        released = bool(OrderService.release_funds([self.pk]))
+        if released:
+            self.funds_released = True
+        return released
     
     def cancel(self, reason=''):
         """Annule la commande."""
-        self.status = 'cancelled'
-        self.cancelled_at = timezone.now()
+        from apps.orders.services import OrderService
+        
+        internal_notes = self.internal_notes
         if reason:
-            self.internal_notes = f"{self.internal_notes}\nAnnulation: {reason}".strip()
-        self.save(update_fields=['status', 'cancelled_at', 'internal_notes', 'updated_at'])
+            internal_notes = f"{internal_notes}\nAnnulation: {reason}".strip()
+        OrderService.transition(self, 'cancelled', internal_notes=internal_notes)
+
+
+class PurchaseRelation(models.Model):
+    """
+    Relation d'achat terminée entre un acheteur et un vendeur (par annonce).
+    
+    Écrite quand une commande passe à « completed » (OrderService), et
+    remplie depuis l'historique par `backfill_purchases`. Lue par
+    l'éligibilité aux avis (acheteur vérifié) : une recherche indexée au
+    lieu de parcourir conversations et paiements.
+    """
+    
+    SOURCE_CHOICES = [
+        ('order', 'Commande'),
+        ('payment', 'Paiement'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    buyer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='purchases_made'
+    )
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='purchases_received'
+    )
+    # Sans contrainte : la relation survit à la suppression de l'annonce
+    listing = models.ForeignKey(
+        'listings.Listing',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='order')
+    purchased_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'orders_purchase_relation'
+        constraints = [
+            # Sert aussi les recherches (buyer, seller)
+            models.UniqueConstraint(
+                fields=['buyer', 'seller', 'listing'], name='orders_purchase_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['buyer', 'seller'], condition=Q(listing__isnull=True),
+                name='orders_purchase_unique_no_listing'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['buyer', 'listing'], name='orders_purchase_buyer_lst_idx'),
+            models.Index(fields=['seller', '-purchased_at'], name='orders_purchase_seller_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.buyer_id} -> {self.seller_id} ({self.listing_id})"
+    
+    @classmethod
+    def has_purchased(cls, buyer, seller, listing_id=None) -> bool:
+        """L'acheteur a-t-il un achat terminé chez ce vendeur (pour cette annonce) ?"""
+        purchases = cls.objects.filter(buyer=buyer, seller=seller)
+        if listing_id:
+            purchases = purchases.filter(listing_id=listing_id)
+        return purchases.exists()
+    
+    @classmethod
+    def record_orders(cls, order_ids) -> int:
+        """
+        Enregistre les relations des commandes terminées (une lecture, un
+        INSERT ; les relations existantes sont ignorées).
+        """
+        rows = Order.objects.filter(id__in=order_ids, status='completed').values_list(
+            'buyer_id', 'seller_id', 'listing_id', 'completed_at'
+        )
+        return cls._insert([
+            cls(buyer_id=buyer_id, seller_id=seller_id, listing_id=listing_id,
+                source='order', purchased_at=completed_at or timezone.now())
+            for buyer_id, seller_id, listing_id, completed_at in rows
+            if buyer_id != seller_id
+        ])
+    
+    @classmethod
+    def backfill(cls, chunk_size=2000) -> int:
+        """
+        Remplit la table depuis les commandes terminées et les paiements
+        d'achat complétés, par lots (parcours par clé primaire).
+        
+        Returns:
+            Nombre de relations lues (existantes comprises)
+        """
+        from apps.payments.models import Payment
+        
+        sources = [
+            (
+                'order',
+                Order.objects.filter(status='completed'),
+                ('buyer_id', 'seller_id', 'listing_id', 'completed_at'),
+            ),
+            (
+                'payment',
+                Payment.objects.filter(payment_type='purchase', status='completed', seller__isnull=False),
+                ('user_id', 'seller_id', 'listing_id', 'completed_at'),
+            ),
+        ]
+        
+        total = 0
+        for source, queryset, fields in sources:
+            last_pk = None
+            while True:
+                chunk = queryset.order_by('pk')
+                if last_pk is not None:
+                    chunk = chunk.filter(pk__gt=last_pk)
+                rows = list(chunk.values_list('pk', *fields)[:chunk_size])
+                if not rows:
+                    break
+                cls._insert([
+                    cls(buyer_id=buyer_id, seller_id=seller_id, listing_id=listing_id,
+                        source=source, purchased_at=purchased_at or timezone.now())
+                    for _pk, buyer_id, seller_id, listing_id, purchased_at in rows
+                    if buyer_id != seller_id
+                ])
+                total += len(rows)
+                last_pk = rows[-1][0]
+        return total
+    
+    @classmethod
+    def _insert(cls, relations) -> int:
+        if relations:
+            cls.objects.bulk_create(relations, ignore_conflicts=True)
+        return len(relations)
 
 
 class SellerWallet(models.Model):
@@ -264,55 +482,60 @@ class SellerWallet(models.Model):
     def credit(self, amount, description='', order=None):
         """Crédite le wallet."""
         amount = Decimal(str(amount))
-        self.balance += amount
-        self.total_earned += amount
-        self.save(update_fields=['balance', 'total_earned', 'updated_at'])
-        
-        WalletTransaction.objects.create(
-            wallet=self,
-            transaction_type='credit',
-            amount=amount,
-            balance_after=self.balance,
-            description=description,
-            order=order
-        )
+        self._post(amount, {'total_earned': amount}, {
+            'transaction_type': 'credit',
+            'amount': amount,
+            'description': description,
+            'order': order,
+        })
         return True
     
     def debit(self, amount, description='', withdrawal=None):
         """Débite le wallet (pour retrait)."""
+        from apps.payments.services.ledger import InsufficientBalance
+        
         amount = Decimal(str(amount))
-        if amount > self.balance:
+        try:
+            self._post(-amount, {'total_withdrawn': amount}, {
+                'transaction_type': 'withdrawal',
+                'amount': amount,
+                'description': description,
+                'withdrawal': withdrawal,
+            })
+        except InsufficientBalance:
             raise ValueError("Solde insuffisant")
-        
-        self.balance -= amount
-        self.total_withdrawn += amount
-        self.save(update_fields=['balance', 'total_withdrawn', 'updated_at'])
-        
-        WalletTransaction.objects.create(
-            wallet=self,
-            transaction_type='withdrawal',
-            amount=amount,
-            balance_after=self.balance,
-            description=description,
-            withdrawal=withdrawal
-        )
         return True
     
     def add_pending(self, amount):
         """Ajoute au solde en attente."""
         amount = Decimal(str(amount))
-        self.pending_balance += amount
-        self.save(update_fields=['pending_balance', 'updated_at'])
+        self._post(Decimal('0.00'), {'pending_balance': amount}, None)
     
     def release_pending(self, amount):
         """Libère du solde en attente vers le solde disponible."""
+        from django.db import transaction
+        
         amount = Decimal(str(amount))
-        if amount > self.pending_balance:
-            amount = self.pending_balance
-        self.pending_balance -= amount
-        self.balance += amount
-        self.total_earned += amount
-        self.save(update_fields=['pending_balance', 'balance', 'total_earned', 'updated_at'])
+        with transaction.atomic():
+            pending = SellerWallet.objects.select_for_update().filter(pk=self.pk).values_list(
+                'pending_balance', flat=True
+            ).get()
+            amount = min(amount, pending)
+            if amount <= 0:
+                return
+            self._post(amount, {'pending_balance': -amount, 'total_earned': amount}, {
+                'transaction_type': 'credit',
+                'amount': amount,
+                'description': 'Libération du solde en attente',
+            })
+    
+    def _post(self, delta, counters, entry):
+        """Mouvement atomique via le grand livre ; met à jour l'instance."""
+        from apps.payments.services.ledger import wallet_ledger
+        
+        values = wallet_ledger().post(self.pk, delta, counters=counters, entry=entry)
+        for field_name, value in values.items():
+            setattr(self, field_name, value)
 
 
 class WalletTransaction(models.Model):
@@ -327,6 +550,8 @@ class WalletTransaction(models.Model):
         ('adjustment', 'Ajustement'),
         ('fee', 'Frais'),
     ]
+    # Types dont le montant (positif) diminue le solde
+    DEBIT_TYPES = ['withdrawal', 'fee']
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     wallet = models.ForeignKey(
@@ -0,0 +1,410 @@
+"""
+Services pour les commandes.
+
+OrderService : machine à états des commandes.
+- Chaque transition est validée (TRANSITIONS) et appliquée par un UPDATE
+  conditionnel sur le statut courant : deux requêtes concurrentes ne
+  peuvent pas appliquer deux transitions depuis le même état.
+- Les fonds sont libérés par lots : une écriture au grand livre et une
+  mise à jour par wallet vendeur, notifications créées via bulk_create.
+- Les commandes livrées depuis ORDER_AUTO_COMPLETE_DAYS jours sont
+  terminées automatiquement (tâche Celery / commande complete_orders).
+- Une commande terminée enregistre sa relation d'achat (PurchaseRelation).
+
+OrderStatsService : statistiques acheteur / vendeur en une requête
+agrégée par rôle, mises en cache et invalidées à chaque changement de
+statut.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OrderTransitionError(ValueError):
+    """Transition de statut interdite depuis l'état courant."""
+
+
+class OrderService:
+    """
+    Transitions de statut, libération des fonds et clôture automatique.
+    """
+
+    # Statuts atteignables depuis chaque statut
+    TRANSITIONS = {
+        'pending': {'confirmed', 'processing', 'shipped', 'cancelled'},
+        'confirmed': {'processing', 'shipped', 'cancelled'},
+        'processing': {'shipped', 'cancelled'},
+        'shipped': {'delivered', 'completed', 'disputed'},
+        'delivered': {'completed', 'disputed'},
+        'disputed': {'completed', 'refunded'},
+        'completed': set(),
+        'cancelled': set(),
+        'refunded': set(),
+    }
+
+    # Horodatage renseigné à l'entrée dans un statut
+    TIMESTAMP_FIELDS = {
+        'confirmed': 'confirmed_at',
+        'shipped': 'shipped_at',
+        'delivered': 'delivered_at',
+        'completed': 'completed_at',
+        'cancelled': 'cancelled_at',
+    }
+
+    # Délai après livraison avant clôture automatique (jours)
+    AUTO_COMPLETE_DAYS = getattr(settings, 'ORDER_AUTO_COMPLETE_DAYS', 7)
+    BATCH_SIZE = getattr(settings, 'ORDER_RELEASE_BATCH_SIZE', 200)
+
+    @staticmethod
+    def can_transition(from_status, to_status) -> bool:
+        return to_status in OrderService.TRANSITIONS.get(from_status, set())
+
+    @staticmethod
+    def sources(to_status) -> list:
+        """Statuts depuis lesquels to_status est atteignable."""
+        return [
+            status for status, targets in OrderService.TRANSITIONS.items()
+            if to_status in targets
+        ]
+
+    @staticmethod
+    def transition(order, to_status, **fields):
+        """
+        Fait passer une commande à to_status.
+
+        Args:
+            order: Order (mis à jour en place)
+            to_status: Nouveau statut
+            **fields: Autres champs modifiés avec la transition
+
+        Raises:
+            OrderTransitionError: si la transition est interdite, ou si le
+                statut a changé entre-temps (requête concurrente)
+        """
+        from apps.orders.models import Order, PurchaseRelation
+
+        if not OrderService.can_transition(order.status, to_status):
+            raise OrderTransitionError(
+                f"Transition interdite : {order.status} -> {to_status}"
+            )
+
+        now = timezone.now()
+        values = {'status': to_status, 'updated_at': now, **fields}
+        timestamp_field = OrderService.TIMESTAMP_FIELDS.get(to_status)
+        if timestamp_field:
+            values[timestamp_field] = now
+
+        updated = Order.objects.filter(pk=order.pk, status=order.status).update(**values)
+        if not updated:
+            current = Order.objects.filter(pk=order.pk).values_list('status', flat=True).first()
+            raise OrderTransitionError(
+                f"Commande {order.order_number} modifiée entre-temps (statut: {current})"
+            )
+
+        for field_name, value in values.items():
+            setattr(order, field_name, value)
+        if to_status == 'completed':
+            PurchaseRelation.record_orders([order.pk])
+        OrderStatsService.invalidate(order.buyer_id, order.seller_id)
+        return order
+
+    @staticmethod
+    def transition_many(order_ids, to_status, from_statuses=None, **fields) -> list:
+        """
+        Transition en lot : un seul UPDATE pour toutes les commandes
+        encore dans un statut source.
+
+        Returns:
+            Ids des commandes effectivement passées à to_status
+        """
+        from apps.orders.models import Order, PurchaseRelation
+
+        sources = [
+            status for status in (from_statuses or OrderService.sources(to_status))
+            if OrderService.can_transition(status, to_status)
+        ]
+        now = timezone.now()
+        values = {'status': to_status, 'updated_at': now, **fields}
+        timestamp_field = OrderService.TIMESTAMP_FIELDS.get(to_status)
+        if timestamp_field:
+            values[timestamp_field] = now
+
+        with transaction.atomic():
+            rows = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(id__in=order_ids, status__in=sources)
+                .values_list('id', 'buyer_id', 'seller_id')
+            )
+            won = [order_id for order_id, _buyer_id, _seller_id in rows]
+            if won:
+                Order.objects.filter(id__in=won, status__in=sources).update(**values)
+                if to_status == 'completed':
+                    PurchaseRelation.record_orders(won)
+                OrderStatsService.invalidate(*{
+                    user_id for _order_id, buyer_id, seller_id in rows for user_id in (buyer_id, seller_id)
+                })
+
+        return won
+
+    @staticmethod
+    def complete(order):
+        """
+        L'acheteur confirme la réception : commande terminée, fonds libérés.
+        """
+        with transaction.atomic():
+            OrderService.transition(order, 'completed', buyer_confirmed_receipt=True)
+            released = OrderService.release_funds([order.pk])
+        if released:
+            order.funds_released = True
+        return order
+
+    @staticmethod
+    def release_funds(order_ids, notify=False) -> dict:
+        """
+        Libère les fonds des commandes vers les wallets vendeurs.
+
+        Les commandes sont regroupées par vendeur : un UPDATE par wallet et
+        un seul INSERT pour le journal (une ligne par commande, liée à la
+        commande). Une commande déjà libérée est ignorée.
+
+        Args:
+            order_ids: Ids des commandes
+            notify: Crée une notification par vendeur (bulk_create)
+
+        Returns:
+            {seller_id: montant crédité}
+        """
+        from apps.orders.models import Order, SellerWallet
+        from apps.payments.services.ledger import wallet_ledger
+
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update()
+                .filter(id__in=order_ids, funds_released=False)
+                .only('id', 'seller_id', 'seller_amount', 'listing_title', 'order_number')
+            )
+            if not orders:
+                return {}
+
+            Order.objects.filter(id__in=[order.id for order in orders]).update(
+                funds_released=True,
+                updated_at=timezone.now(),
+            )
+
+            seller_ids = {order.seller_id for order in orders}
+            wallets = dict(
+                SellerWallet.objects.filter(user_id__in=seller_ids).values_list('user_id', 'id')
+            )
+            missing = seller_ids - set(wallets)
+            if missing:
+                SellerWallet.objects.bulk_create(
+                    [SellerWallet(user_id=seller_id) for seller_id in missing],
+                    ignore_conflicts=True,
+                )
+                wallets.update(
+                    SellerWallet.objects.filter(user_id__in=missing).values_list('user_id', 'id')
+                )
+
+            totals = defaultdict(lambda: Decimal('0.00'))
+            postings = []
+            for order in orders:
+                totals[order.seller_id] += order.seller_amount
+                postings.append({
+                    'account_id': wallets[order.seller_id],
+                    'delta': order.seller_amount,
+                    'counters': {'total_earned': order.seller_amount},
+                    'entry': {
+                        'transaction_type': 'credit',
+                        'amount': order.seller_amount,
+                        'description': f"Vente: {order.listing_title}",
+                        'order_id': order.id,
+                    },
+                })
+            wallet_ledger().post_many(postings)
+
+            if notify:
+                OrderService._notify_sellers(orders, totals)
+
+        logger.info(f"Fonds libérés pour {len(orders)} commande(s), {len(totals)} vendeur(s)")
+        return dict(totals)
+
+    @staticmethod
+    def complete_delivered(days=None, batch_size=None) -> int:
+        """
+        Termine les commandes livrées depuis plus de `days` jours sans
+        confirmation de l'acheteur et libère leurs fonds, par lots.
+
+        Returns:
+            Nombre de commandes terminées
+        """
+        from apps.orders.models import Order
+
+        days = OrderService.AUTO_COMPLETE_DAYS if days is None else days
+        batch_size = batch_size or OrderService.BATCH_SIZE
+        cutoff = timezone.now() - timedelta(days=days)
+        completed = 0
+        # Commandes verrouillées ailleurs (SKIP LOCKED) : pas reprises dans ce passage
+        skipped = set()
+
+        while True:
+            order_ids = list(
+                Order.objects.filter(status='delivered', delivered_at__lte=cutoff)
+                .exclude(id__in=skipped)
+                .order_by('delivered_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            with transaction.atomic():
+                won = OrderService.transition_many(order_ids, 'completed', from_statuses=['delivered'])
+                if won:
+                    OrderService.release_funds(won, notify=True)
+                    OrderService._notify_buyers(won, days)
+
+            skipped.update(set(order_ids) - set(won))
+            completed += len(won)
+            if len(order_ids) < batch_size:
+                break
+
+        if completed:
+            logger.info(f"{completed} commande(s) terminée(s) automatiquement")
+        return completed
+
+    @staticmethod
+    def _notify_sellers(orders, totals):
+        from apps.messaging.models import Notification
+
+        counts = defaultdict(int)
+        for order in orders:
+            counts[order.seller_id] += 1
+
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=seller_id,
+                type='sale',
+                title='Fonds disponibles 💰',
+                message=(
+                    f"{totals[seller_id]}€ ont été ajoutés à votre portefeuille "
+                    f"({counts[seller_id]} commande(s) terminée(s))."
+                ),
+                data={
+                    'order_ids': [str(order.id) for order in orders if order.seller_id == seller_id],
+                    'amount': str(totals[seller_id]),
+                },
+            )
+            for seller_id in totals
+        ])
+
+    @staticmethod
+    def _notify_buyers(order_ids, days):
+        from apps.messaging.models import Notification
+        from apps.orders.models import Order
+
+        orders = Order.objects.filter(id__in=order_ids).values(
+            'id', 'buyer_id', 'order_number', 'listing_title'
+        )
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=order['buyer_id'],
+                type='purchase',
+                title='Commande terminée ✅',
+                message=(
+                    f"Votre commande \"{order['listing_title']}\" a été clôturée "
+                    f"automatiquement {days} jours après la livraison."
+                ),
+                data={
+                    'order_id': str(order['id']),
+                    'order_number': order['order_number'],
+                },
+            )
+            for order in orders
+        ])
+
+
+class OrderStatsService:
+    """
+    Statistiques de commandes par utilisateur.
+
+    Une seule requête par rôle (Count/Sum filtrés), servie par les index
+    (buyer, status) et (seller, status) ; résultat en cache par utilisateur,
+    invalidé à chaque création ou changement de statut d'une commande.
+    """
+
+    CACHE_TTL = getattr(settings, 'ORDER_STATS_TTL', 60 * 10)
+
+    # Statuts regroupés dans les compteurs
+    BUYER_PENDING = ['pending', 'confirmed', 'processing']
+    SELLER_PENDING = ['pending', 'confirmed']
+    SELLER_OPEN = ['pending', 'confirmed', 'processing', 'shipped']
+
+    @staticmethod
+    def _key(role, user_id):
+        return f'orders:stats:{role}:{user_id}'
+
+    @staticmethod
+    def buyer_stats(user_id) -> dict:
+        """Compteurs des achats d'un utilisateur."""
+        from apps.orders.models import Order
+
+        return OrderStatsService._cached('buyer', user_id, lambda: Order.objects.filter(
+            buyer_id=user_id
+        ).aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status__in=OrderStatsService.BUYER_PENDING)),
+            shipped=Count('id', filter=Q(status='shipped')),
+            delivered=Count('id', filter=Q(status='delivered')),
+            completed=Count('id', filter=Q(status='completed')),
+        ))
+
+    @staticmethod
+    def seller_stats(user_id) -> dict:
+        """Compteurs et chiffre d'affaires des ventes d'un utilisateur."""
+        from apps.orders.models import Order
+
+        def compute():
+            stats = Order.objects.filter(seller_id=user_id).aggregate(
+                total=Count('id'),
+                pending=Count('id', filter=Q(status__in=OrderStatsService.SELLER_PENDING)),
+                open=Count('id', filter=Q(status__in=OrderStatsService.SELLER_OPEN)),
+                to_ship=Count('id', filter=Q(status='confirmed')),
+                shipped=Count('id', filter=Q(status='shipped')),
+                completed=Count('id', filter=Q(status='completed')),
+                revenue=Sum('seller_amount', filter=Q(status='completed')),
+            )
+            stats['revenue'] = stats['revenue'] or Decimal('0.00')
+            return stats
+
+        return OrderStatsService._cached('seller', user_id, compute)
+
+    @staticmethod
+    def _cached(role, user_id, compute) -> dict:
+        from django.core.cache import cache
+
+        key = OrderStatsService._key(role, user_id)
+        stats = cache.get(key)
+        if stats is None:
+            stats = compute()
+            cache.set(key, stats, OrderStatsService.CACHE_TTL)
+        return stats
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Supprime les statistiques en cache (après commit de la transaction)."""
+        from django.core.cache import cache
+
+        keys = [
+            OrderStatsService._key(role, user_id)
+            for user_id in user_ids if user_id
+            for role in ('buyer', 'seller')
+        ]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,15 @@
+"""
+Tâches Celery des commandes.
+"""
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def complete_delivered_orders():
+    """
+    Termine les commandes livrées depuis ORDER_AUTO_COMPLETE_DAYS jours
+    et libère les fonds des vendeurs par lots.
+    """
+    from apps.orders.services import OrderService
+
+    return OrderService.complete_delivered()
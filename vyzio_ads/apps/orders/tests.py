@@ -0,0 +1,380 @@
+"""
+Tests unitaires pour les commandes et le wallet vendeur
+"""
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from apps.users.models import CustomUser
+from apps.payments.models import Payment
+
+
+# ==================== FIXTURES ====================
+
+@pytest.fixture
+def api_client():
+    """Client API pour les tests"""
+    return APIClient()
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Cache réel (LocMem) : le cache de test est factice"""
+    from django.core.cache import cache
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'orders-tests',
+        }
+    }
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture
+def create_user(db):
+    """Factory pour créer des utilisateurs"""
+    def _create_user(email='test@example.com', username='testuser',
+                     password='TestPassword123!', role='buyer', **kwargs):
+        user = CustomUser.objects.create_user(
+            email=email,
+            username=username,
+            password=password,
+            role=role,
+            **kwargs
+        )
+        return user
+    return _create_user
+
+
+# ==================== TESTS DES COMMANDES ====================
+
+@pytest.mark.django_db
+class TestOrderLifecycle:
+    """Tests de la machine à états des commandes et de la libération des fonds"""
+    
+    @pytest.fixture
+    def parties(self, create_user):
+        buyer = create_user(email='buyer@example.com', username='buyer')
+        sellers = [
+            create_user(email=f'seller{i}@example.com', username=f'seller{i}', role='seller')
+            for i in range(2)
+        ]
+        return buyer, sellers
+    
+    def _order(self, buyer, seller, status='pending', price='100.00', **kwargs):
+        from apps.orders.models import Order
+        return Order.objects.create(
+            buyer=buyer, seller=seller, listing_title='Vélo',
+            item_price=Decimal(price), platform_fee=Decimal(price) * Decimal('0.05'),
+            seller_amount=Decimal(price) * Decimal('0.95'), status=status, **kwargs
+        )
+    
+    def test_invalid_transition_is_rejected(self, parties):
+        from apps.orders.services import OrderTransitionError
+        buyer, sellers = parties
+        order = self._order(buyer, sellers[0])
+        
+        with pytest.raises(OrderTransitionError):
+            order.mark_delivered()
+        
+        order.refresh_from_db()
+        assert order.status == 'pending'
+    
+    def test_stale_instance_cannot_transition_twice(self, parties):
+        from apps.orders.models import Order
+        from apps.orders.services import OrderTransitionError
+        buyer, sellers = parties
+        order = self._order(buyer, sellers[0], status='confirmed')
+        stale = Order.objects.get(pk=order.pk)
+        
+        order.mark_shipped(tracking_number='TRK1')
+        with pytest.raises(OrderTransitionError, match='modifiée entre-temps'):
+            stale.cancel()
+        
+        order.refresh_from_db()
+        assert (order.status, order.tracking_number) == ('shipped', 'TRK1')
+        assert order.shipped_at is not None
+    
+    def test_confirm_receipt_releases_funds_once(self, parties):
+        from apps.orders.models import SellerWallet
+        buyer, sellers = parties
+        order = self._order(buyer, sellers[0], status='delivered')
+        
+        order.confirm_receipt()
+        assert order.release_funds() is False
+        
+        order.refresh_from_db()
+        wallet = SellerWallet.objects.get(user=sellers[0])
+        assert (order.status, order.funds_released, order.buyer_confirmed_receipt) == ('completed', True, True)
+        assert wallet.balance == Decimal('95.00')
+        assert wallet.transactions.get().order_id == order.id
+    
+    def test_auto_complete_batches_per_wallet(self, parties, django_assert_max_num_queries):
+        from apps.messaging.models import Notification
+        from apps.orders.models import Order, SellerWallet
+        from apps.orders.services import OrderService
+        buyer, sellers = parties
+        old = timezone.now() - timedelta(days=OrderService.AUTO_COMPLETE_DAYS + 1)
+        due = [
+            self._order(buyer, seller, status='delivered', delivered_at=old)
+            for seller in sellers for _ in range(3)
+        ]
+        recent = self._order(buyer, sellers[0], status='delivered', delivered_at=timezone.now())
+        released = self._order(buyer, sellers[1], status='delivered', delivered_at=old, funds_released=True)
+        SellerWallet.objects.create(user=sellers[0], balance=Decimal('10.00'))
+        
+        # Nombre de requêtes indépendant du nombre de commandes du lot
+        with django_assert_max_num_queries(25):
+            completed = OrderService.complete_delivered()
+        
+        assert completed == 7
+        assert Order.objects.get(pk=recent.pk).status == 'delivered'
+        assert Order.objects.filter(pk__in=[o.pk for o in due], status='completed', funds_released=True).count() == 6
+        # Commande déjà libérée : terminée sans nouveau crédit
+        assert Order.objects.get(pk=released.pk).status == 'completed'
+        
+        wallets = {w.user_id: w for w in SellerWallet.objects.all()}
+        assert wallets[sellers[0].id].balance == Decimal('295.00')
+        assert wallets[sellers[1].id].balance == Decimal('285.00')
+        assert wallets[sellers[0].id].transactions.count() == 3
+        assert sorted(wallets[sellers[0].id].transactions.values_list('balance_after', flat=True)) == [
+            Decimal('105.00'), Decimal('200.00'), Decimal('295.00')
+        ]
+        assert Notification.objects.filter(type='sale').count() == 2
+        assert Notification.objects.filter(user=buyer, type='purchase').count() == 7
+        # Relations d'achat : une par (acheteur, vendeur, annonce)
+        from apps.orders.models import PurchaseRelation
+        assert set(PurchaseRelation.objects.values_list('seller_id', flat=True)) == {s.id for s in sellers}
+        
+        assert OrderService.complete_delivered() == 0
+    
+    def test_auto_complete_does_not_revisit_locked_orders(self, parties, monkeypatch):
+        from apps.orders.models import Order
+        from apps.orders.services import OrderService
+        buyer, sellers = parties
+        old = timezone.now() - timedelta(days=OrderService.AUTO_COMPLETE_DAYS + 1)
+        locked = [self._order(buyer, sellers[0], status='delivered', delivered_at=old - timedelta(hours=1))
+                  for _ in range(2)]
+        free = self._order(buyer, sellers[1], status='delivered', delivered_at=old)
+        
+        # Deux commandes verrouillées par un autre worker (SKIP LOCKED)
+        transition_many = OrderService.transition_many
+        calls = []
+        
+        def skip_locked(order_ids, *args, **kwargs):
+            calls.append(list(order_ids))
+            return transition_many([i for i in order_ids if i not in {o.pk for o in locked}], *args, **kwargs)
+        
+        monkeypatch.setattr(OrderService, 'transition_many', staticmethod(skip_locked))
+        
+        assert OrderService.complete_delivered(batch_size=2) == 1
+        assert len(calls) == 2
+        assert Order.objects.get(pk=free.pk).status == 'completed'
+        assert set(Order.objects.filter(pk__in=[o.pk for o in locked]).values_list('status', flat=True)) == {'delivered'}
+    
+    def test_release_funds_flag_follows_posting(self, parties, monkeypatch):
+        from apps.orders.services import OrderService
+        buyer, sellers = parties
+        order = self._order(buyer, sellers[0], status='completed')
+        
+        # Rien n'a été crédité : la commande reste à libérer
+        monkeypatch.setattr(OrderService, 'release_funds', staticmethod(lambda order_ids, notify=False: {}))
+        assert order.release_funds() is False
+        assert order.funds_released is False
+    
+    def test_complete_orders_command(self, parties):
+        from django.core.management import call_command
+        buyer, sellers = parties
+        order = self._order(
+            buyer, sellers[0], status='delivered',
+            delivered_at=timezone.now() - timedelta(days=3),
+        )
+        
+        call_command('complete_orders', '--days', '2')
+        
+        order.refresh_from_db()
+        assert order.status == 'completed'
+        assert order.funds_released
+
+
+@pytest.mark.django_db
+class TestPurchaseRelation:
+    """Relations d'achat (acheteur vérifié)"""
+    
+    def test_completed_order_records_relation(self, create_user):
+        from apps.orders.models import Order, PurchaseRelation
+        buyer = create_user(email='buyer@example.com', username='buyer')
+        seller = create_user(email='seller@example.com', username='seller', role='seller')
+        order = Order.objects.create(
+            buyer=buyer, seller=seller, listing_title='Vélo', status='delivered',
+            item_price=Decimal('50.00'), platform_fee=Decimal('2.50'), seller_amount=Decimal('47.50'),
+        )
+        assert not PurchaseRelation.has_purchased(buyer, seller)
+        
+        order.confirm_receipt()
+        
+        relation = PurchaseRelation.objects.get()
+        assert (relation.buyer_id, relation.seller_id, relation.source) == (buyer.id, seller.id, 'order')
+        assert relation.purchased_at == Order.objects.get(pk=order.pk).completed_at
+        assert PurchaseRelation.has_purchased(buyer, seller)
+        assert not PurchaseRelation.has_purchased(seller, buyer)
+    
+    def test_backfill_from_orders_and_payments(self, create_user):
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.listings.models import Category, Listing
+        from apps.orders.models import Order, PurchaseRelation
+        buyer = create_user(email='buyer@example.com', username='buyer')
+        other = create_user(email='other@example.com', username='other')
+        seller = create_user(email='seller@example.com', username='seller', role='seller')
+        listing = Listing.objects.create(
+            seller=seller, category=Category.objects.create(name='Vélos', slug='velos'),
+            title='Vélo', description='Vélo de route', price=Decimal('50.00'), status='published',
+        )
+        
+        # Historique écrit sans passer par OrderService
+        Order.objects.create(
+            buyer=buyer, seller=seller, listing=listing, listing_title=listing.title, status='completed',
+            item_price=Decimal('50.00'), platform_fee=Decimal('2.50'), seller_amount=Decimal('47.50'),
+        )
+        Payment.objects.create(
+            user=other, listing=listing, amount=Decimal('50.00'), payment_type='purchase',
+            status='completed', completed_at=timezone.now(),
+        )
+        # Ignorés : paiement en attente, boost payé par le vendeur lui-même
+        Payment.objects.create(user=buyer, listing=listing, amount=Decimal('5.00'), payment_type='purchase')
+        Payment.objects.create(
+            user=seller, listing=listing, amount=Decimal('5.00'), payment_type='boost', status='completed',
+        )
+        
+        call_command('backfill_purchases', '--chunk-size', '1', stdout=StringIO())
+        call_command('backfill_purchases', stdout=StringIO())
+        
+        relations = set(PurchaseRelation.objects.values_list('buyer_id', 'listing_id', 'source'))
+        assert relations == {(buyer.id, listing.id, 'order'), (other.id, listing.id, 'payment')}
+
+
+@pytest.mark.django_db
+class TestOrderStats:
+    """Statistiques de commandes : une requête agrégée par rôle, en cache"""
+    
+    @pytest.fixture
+    def orders(self, create_user):
+        from apps.orders.models import Order
+        seller = create_user(email='seller@example.com', username='seller', role='seller')
+        buyer = create_user(email='buyer@example.com', username='buyer')
+        statuses = ['pending', 'confirmed', 'confirmed', 'processing', 'shipped', 'delivered', 'completed', 'completed']
+        for i, order_status in enumerate(statuses):
+            Order.objects.create(
+                buyer=buyer, seller=seller, listing_title=f'Article {i}',
+                item_price=Decimal('20.00'), platform_fee=Decimal('1.00'),
+                seller_amount=Decimal('19.00'), status=order_status,
+            )
+        return buyer, seller
+    
+    def test_seller_stats_single_query(self, api_client, orders, django_assert_num_queries):
+        buyer, seller = orders
+        api_client.force_authenticate(user=seller)
+        
+        # Statistiques + wallet
+        with django_assert_num_queries(2):
+            response = api_client.get(reverse('seller-stats'))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_sales'] == 2
+        assert response.data['completed_orders'] == 2
+        assert response.data['pending_orders'] == 5
+        assert Decimal(response.data['total_revenue']) == Decimal('38.00')
+    
+    def test_summary_cached_and_invalidated_on_status_change(
+        self, api_client, orders, locmem_cache, django_assert_max_num_queries,
+        django_capture_on_commit_callbacks
+    ):
+        from apps.orders.models import Order
+        buyer, seller = orders
+        api_client.force_authenticate(user=seller)
+        
+        response = api_client.get(reverse('orders-summary'))
+        assert response.data['sales'] == {
+            'total': 8, 'pending': 3, 'to_ship': 2, 'shipped': 1, 'completed': 2,
+            'revenue': Decimal('38.00'),
+        }
+        assert response.data['purchases']['total'] == 0
+        
+        # En cache : au plus la lecture du wallet
+        with django_assert_max_num_queries(1):
+            api_client.get(reverse('orders-summary'))
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Order.objects.get(status='delivered').confirm_receipt()
+        
+        response = api_client.get(reverse('orders-summary'))
+        assert response.data['sales']['completed'] == 3
+        assert response.data['sales']['revenue'] == Decimal('57.00')
+        
+        api_client.force_authenticate(user=buyer)
+        response = api_client.get(reverse('orders-summary'))
+        assert response.data['purchases'] == {
+            'total': 8, 'pending': 4, 'shipped': 1, 'delivered': 0, 'completed': 3,
+        }
+
+
+@pytest.mark.django_db
+def test_order_numbers_are_sequential_per_month(create_user):
+    """Numéros croissants par mois, encodés en base32 sur 7 caractères"""
+    from apps.orders.models import Order, OrderSequence
+    october = timezone.datetime(2026, 10, 1, tzinfo=timezone.utc)
+    
+    numbers = [Order.generate_order_number(now=october) for _ in range(33)]
+    
+    assert numbers[:2] == ['VYZ-2610-0000001', 'VYZ-2610-0000002']
+    assert numbers[30:32] == ['VYZ-2610-000000Z', 'VYZ-2610-0000010']
+    assert numbers == sorted(numbers)
+    assert Order.generate_order_number(now=october.replace(month=11)) == 'VYZ-2611-0000001'
+    assert OrderSequence.objects.get(period='2610').last_value == 33
+
+
+@pytest.mark.django_db(transaction=True)
+def test_order_number_reserved_outside_caller_transaction(monkeypatch):
+    """Numéro réservé sur une connexion dédiée : validé même si l'appelant annule"""
+    from apps.orders import models as order_models
+    from apps.orders.models import Order, OrderSequence
+    # Connexion dédiée (PostgreSQL en production), ici sur la base SQLite de test
+    monkeypatch.setattr(OrderSequence, '_allocates_apart', staticmethod(lambda connection: True))
+    october = timezone.datetime(2026, 10, 1, tzinfo=timezone.utc)
+    
+    try:
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                assert Order.generate_order_number(now=october) == 'VYZ-2610-0000001'
+                assert Order.generate_order_number(now=october) == 'VYZ-2610-0000002'
+                raise RuntimeError('rollback')
+    finally:
+        order_models._sequence_connections.connection.close()
+        del order_models._sequence_connections.connection
+    
+    # Trou accepté : les valeurs réservées ne sont pas réutilisées
+    assert OrderSequence.objects.get(period='2610').last_value == 2
+    assert Order.generate_order_number(now=october) == 'VYZ-2610-0000003'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_order_number_stress_command():
+    """Commandes créées en parallèle : pas de doublon ni d'IntegrityError"""
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.orders.models import Order
+    out = StringIO()
+    
+    call_command('order_number_stress', '--orders', '200', '--workers', '4', stdout=out)
+    
+    assert 'Commandes créées : 200' in out.getvalue()
+    assert 'Numéros en double : 0, workers non ordonnés : 0' in out.getvalue()
+    assert not Order.objects.exists()
@@ -7,12 +7,12 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from django.db.models import Sum, Count, Q
 from django.shortcuts import get_object_or_404
 from decimal import Decimal
 import logging
 
 from .models import Order, SellerWallet, WalletTransaction, WithdrawalRequest
+from .services import OrderStatsService, OrderTransitionError
 from .serializers import (
     OrderListSerializer, OrderDetailSerializer, OrderShipSerializer,
     SellerWalletSerializer, WalletBankDetailsSerializer,
@@ -60,7 +60,10 @@ class BuyerOrderViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.confirm_receipt()
+        try:
+            order.confirm_receipt()
+        except OrderTransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         # Créer notification pour le vendeur
         try:
@@ -144,11 +147,14 @@ class SellerOrderViewSet(viewsets.ReadOnlyModelViewSet):
         if serializer.validated_data.get('seller_notes'):
             order.seller_notes = serializer.validated_data['seller_notes']
         
-        order.mark_shipped(
-            tracking_number=serializer.validated_data.get('tracking_number', ''),
-            carrier=serializer.validated_data.get('carrier', ''),
-            tracking_url=serializer.validated_data.get('tracking_url', ''),
-        )
+        try:
+            order.mark_shipped(
+                tracking_number=serializer.validated_data.get('tracking_number', ''),
+                carrier=serializer.validated_data.get('carrier', ''),
+                tracking_url=serializer.validated_data.get('tracking_url', ''),
+            )
+        except OrderTransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         # Notifier l'acheteur
         try:
@@ -188,7 +194,10 @@ class SellerOrderViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.mark_delivered()
+        try:
+            order.mark_delivered()
+        except OrderTransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         # Notifier l'acheteur
         try:
@@ -214,19 +223,7 @@ class SellerOrderViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Statistiques de vente."""
-        orders = self.get_queryset()
-        
-        # Calculer les stats
-        total_sales = orders.filter(status='completed').count()
-        total_revenue = orders.filter(status='completed').aggregate(
-            total=Sum('seller_amount')
-        )['total'] or Decimal('0.00')
-        
-        pending_orders = orders.filter(
-            status__in=['pending', 'confirmed', 'processing', 'shipped']
-        ).count()
-        
-        completed_orders = orders.filter(status='completed').count()
+        sales = OrderStatsService.seller_stats(request.user.id)
         
         # Wallet
         wallet_balance = Decimal('0.00')
@@ -239,10 +236,10 @@ class SellerOrderViewSet(viewsets.ReadOnlyModelViewSet):
             pass
         
         data = {
-            'total_sales': total_sales,
-            'total_revenue': total_revenue,
-            'pending_orders': pending_orders,
-            'completed_orders': completed_orders,
+            'total_sales': sales['completed'],
+            'total_revenue': sales['revenue'],
+            'pending_orders': sales['open'],
+            'completed_orders': sales['completed'],
             'wallet_balance': wallet_balance,
             'pending_balance': pending_balance,
         }
@@ -361,27 +358,12 @@ class OrderSummaryView(APIView):
     def get(self, request):
         user = request.user
         
-        # Achats
-        purchases = Order.objects.filter(buyer=user)
-        purchases_summary = {
-            'total': purchases.count(),
-            'pending': purchases.filter(status__in=['pending', 'confirmed', 'processing']).count(),
-            'shipped': purchases.filter(status='shipped').count(),
-            'delivered': purchases.filter(status='delivered').count(),
-            'completed': purchases.filter(status='completed').count(),
-        }
-        
-        # Ventes
-        sales = Order.objects.filter(seller=user)
+        # Une requête agrégée par rôle (en cache)
+        purchases_summary = OrderStatsService.buyer_stats(user.id)
+        seller_stats = OrderStatsService.seller_stats(user.id)
         sales_summary = {
-            'total': sales.count(),
-            'pending': sales.filter(status__in=['pending', 'confirmed']).count(),
-            'to_ship': sales.filter(status='confirmed').count(),
-            'shipped': sales.filter(status='shipped').count(),
-            'completed': sales.filter(status='completed').count(),
-            'revenue': sales.filter(status='completed').aggregate(
-                total=Sum('seller_amount')
-            )['total'] or Decimal('0.00'),
+            key: seller_stats[key]
+            for key in ('total', 'pending', 'to_ship', 'shipped', 'completed', 'revenue')
         }
         
         # Wallet
@@ -1,8 +1,9 @@
 from django.contrib import admin
 from .models import (
     Payment, SubscriptionPlan, Subscription, Invoice, Coupon,
-    PostCreditPack, PostCredit, PostCreditTransaction
+    PostCreditPack, PostCredit, PostCreditTransaction, WebhookEvent
 )
+from .services.webhook_queue import WebhookQueue
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -45,3 +46,16 @@ class PostCreditTransactionAdmin(admin.ModelAdmin):
     list_display = ('post_credit', 'transaction_type', 'amount', 'balance_after', 'created_at')
     list_filter = ('transaction_type', 'created_at')
     readonly_fields = ('post_credit', 'transaction_type', 'amount', 'balance_after', 'description', 'created_at')
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('stripe_event_id', 'event_type', 'status', 'retry_count', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('stripe_event_id',)
+    readonly_fields = ('stripe_event_id', 'event_type', 'payload', 'processed_at', 'error_message', 'created_at')
+    actions = ['replay_events']
+
+    @admin.action(description='Rejouer les événements sélectionnés')
+    def replay_events(self, request, queryset):
+        count = WebhookQueue.replay(queryset)
+        self.message_user(request, f'{count} événement(s) remis en file')
@@ -0,0 +1,57 @@
+"""
+Worker local des webhooks Stripe (sans Celery).
+
+Usage:
+    python manage.py process_webhooks              # Boucle infinie
+    python manage.py process_webhooks --once       # Un seul passage
+    python manage.py process_webhooks --interval=5 --batch-size=50
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.webhook_queue import WebhookQueue
+
+
+class Command(BaseCommand):
+    help = 'Traite la file des webhooks Stripe en interrogeant la base'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Traiter les événements en attente puis quitter',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Pause entre deux passages quand la file est vide (défaut: 2s)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=WebhookQueue.BATCH_SIZE,
+            help=f'Événements réservés par passage (défaut: {WebhookQueue.BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            processed = WebhookQueue.process_batch(limit=options['batch_size'])
+            total += processed
+
+            if processed:
+                self.stdout.write(f'{processed} webhook(s) traité(s)')
+
+            if options['once']:
+                # Vider la file avant de quitter
+                if processed:
+                    continue
+                break
+
+            if not processed:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} webhook(s) traité(s)'))
@@ -0,0 +1,98 @@
+"""
+Rapprochement des soldes avec leurs journaux.
+
+Vérifie que :
+- PostCredit.balance == somme des PostCreditTransaction.amount
+- SellerWallet.balance == crédits - débits des WalletTransaction
+
+Usage:
+    python manage.py reconcile_ledgers
+    python manage.py reconcile_ledgers --ledger wallets --limit 50
+
+Sort en erreur (code 1) si des écarts sont trouvés.
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+class Command(BaseCommand):
+    help = 'Compare les soldes (crédits, wallets) aux sommes de leurs journaux'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ledger',
+            choices=['all', 'credits', 'wallets'],
+            default='all',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Écarts affichés par journal (défaut: 20)',
+        )
+
+    def handle(self, *args, **options):
+        checks = {
+            'credits': self.post_credit_mismatches,
+            'wallets': self.wallet_mismatches,
+        }
+        total = 0
+
+        for name, check in checks.items():
+            if options['ledger'] not in ('all', name):
+                continue
+
+            mismatches = check()
+            total += len(mismatches)
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS(f'✅ {name}: aucun écart'))
+                continue
+
+            self.stdout.write(self.style.WARNING(f'⚠️ {name}: {len(mismatches)} écart(s)'))
+            for row in mismatches[:options['limit']]:
+                self.stdout.write(
+                    f"  {row['email']}: solde {row['balance']}, journal {row['ledger_sum']}"
+                )
+
+        if total:
+            raise CommandError(f'{total} solde(s) incohérent(s) avec le journal')
+
+    @staticmethod
+    def _mismatches(queryset):
+        """Comptes dont le solde diffère de la somme du journal (calculée en base)."""
+        return list(
+            queryset.exclude(balance=F('ledger_sum'))
+            .annotate(email=F('user__email'))
+            .values('email', 'balance', 'ledger_sum')
+        )
+
+    def post_credit_mismatches(self):
+        from apps.payments.models import PostCredit, PostCreditTransaction
+
+        sums = PostCreditTransaction.objects.filter(
+            post_credit=OuterRef('pk')
+        ).values('post_credit').annotate(total=Sum('amount')).values('total')
+
+        return self._mismatches(PostCredit.objects.annotate(
+            ledger_sum=Coalesce(Subquery(sums), Value(0)),
+        ))
+
+    def wallet_mismatches(self):
+        from apps.orders.models import SellerWallet, WalletTransaction
+
+        money = DecimalField(max_digits=12, decimal_places=2)
+        signed = Case(
+            When(transaction_type__in=WalletTransaction.DEBIT_TYPES, then=-F('amount')),
+            default=F('amount'),
+            output_field=money,
+        )
+        sums = WalletTransaction.objects.filter(
+            wallet=OuterRef('pk')
+        ).values('wallet').annotate(total=Sum(signed)).values('total')
+
+        return self._mismatches(SellerWallet.objects.annotate(
+            ledger_sum=Coalesce(Subquery(sums, output_field=money), Value(Decimal('0.00')), output_field=money),
+        ))
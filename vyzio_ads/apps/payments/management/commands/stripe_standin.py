@@ -0,0 +1,53 @@
+"""
+Serveur Stripe local pour le développement et la CI.
+
+Usage:
+    python manage.py stripe_standin
+    python manage.py stripe_standin --port 12111 --webhook-url http://127.0.0.1:8000/api/payments/webhook/
+
+Puis lancer Django avec :
+    STRIPE_SECRET_KEY=sk_test_standin
+    STRIPE_API_BASE=http://127.0.0.1:12111
+    STRIPE_WEBHOOK_SECRET=<même secret que --webhook-secret>
+
+Simuler le paiement d'une session (émet les webhooks) :
+    curl -X POST http://127.0.0.1:12111/_standin/checkout/sessions/<session_id>/complete
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.payments.services.stripe_standin import StripeStandIn
+
+
+class Command(BaseCommand):
+    help = 'Lance un serveur imitant l\'API Stripe (endpoints utilisés par StripeService)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument(
+            '--webhook-url',
+            default='http://127.0.0.1:8000/api/payments/webhook/',
+            help='Endpoint qui reçoit les webhooks signés',
+        )
+        parser.add_argument(
+            '--webhook-secret',
+            default=getattr(settings, 'STRIPE_WEBHOOK_SECRET', '') or 'whsec_standin',
+            help='Secret de signature (défaut: STRIPE_WEBHOOK_SECRET)',
+        )
+
+    def handle(self, *args, **options):
+        standin = StripeStandIn(
+            webhook_secret=options['webhook_secret'],
+            webhook_url=options['webhook_url'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Stripe stand-in sur http://{options['host']}:{options['port']} "
+            f"(webhooks -> {options['webhook_url']})"
+        ))
+
+        try:
+            standin.serve_forever(host=options['host'], port=options['port'])
+        except KeyboardInterrupt:
+            self.stdout.write('Arrêt du serveur')
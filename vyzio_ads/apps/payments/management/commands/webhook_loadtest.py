@@ -0,0 +1,369 @@
+"""
+Test de charge du traitement des webhooks Stripe.
+
+Rejoue des milliers d'événements checkout.session.completed et
+invoice.payment_succeeded signés (avec une part de doublons, comme les
+renvois de Stripe ; une livraison en échec est renvoyée), puis mesure :
+- débit et latence (p50/p99) de l'accusé de réception HTTP
+- débit du traitement de la file
+- traitements en double (crédits ou paiements enregistrés plusieurs fois)
+
+Usage:
+    python manage.py webhook_loadtest                          # En process (Client Django)
+    python manage.py webhook_loadtest --events 5000 --concurrency 16
+    python manage.py webhook_loadtest --url http://127.0.0.1:8000/api/payments/webhook/
+
+Avec --url, les événements sont envoyés au serveur indiqué (qui doit partager
+la base et STRIPE_WEBHOOK_SECRET) et traités par ses workers ; la commande
+attend la fin du traitement. Les données créées sont supprimées à la fin
+(sauf --keep).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from apps.payments.services.stripe_standin import StripeStandIn
+
+
+def percentile(values, pct):
+    """Percentile (méthode du rang le plus proche) d'une liste non vide."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Rejoue des webhooks Stripe signés en parallèle et mesure le traitement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000, help='Nombre total de livraisons')
+        parser.add_argument('--concurrency', type=int, default=8, help='Livraisons (et workers) en parallèle')
+        parser.add_argument(
+            '--types',
+            default='checkout,invoice',
+            help='Types d\'événements : checkout, invoice (séparés par des virgules)',
+        )
+        parser.add_argument(
+            '--duplicate-ratio',
+            type=float,
+            default=0.1,
+            help='Part des livraisons qui renvoient un événement déjà envoyé (défaut: 0.1)',
+        )
+        parser.add_argument('--subscriptions', type=int, default=20, help='Abonnements ciblés par les factures')
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=3,
+            help='Nouvelles livraisons d\'un webhook en échec, comme Stripe (défaut: 3)',
+        )
+        parser.add_argument('--url', default='', help='Endpoint webhook distant (défaut: en process)')
+        parser.add_argument('--timeout', type=float, default=300, help='Attente max du traitement (secondes)')
+        parser.add_argument('--keep', action='store_true', help='Conserver les données créées')
+
+    def handle(self, *args, **options):
+        types = {t.strip() for t in options['types'].split(',') if t.strip()}
+        if not types or not types <= {'checkout', 'invoice'}:
+            raise CommandError('--types accepte : checkout, invoice')
+        if options['events'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--events et --concurrency doivent être positifs')
+
+        secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+        if options['url'] and not secret:
+            raise CommandError('STRIPE_WEBHOOK_SECRET doit être celui du serveur cible')
+
+        self.run_id = uuid.uuid4().hex[:8]
+        self.standin = StripeStandIn(webhook_secret=secret or 'whsec_loadtest', webhook_url=options['url'] or None)
+
+        overrides = {}
+        if not options['url']:
+            # En process : signature locale, traitement par les workers de la commande
+            overrides = {'STRIPE_WEBHOOK_SECRET': self.standin.webhook_secret, 'STRIPE_WEBHOOK_DISPATCH': 'poll'}
+
+        with override_settings(**overrides):
+            fixtures = self.create_fixtures(types, options)
+            try:
+                events = self.build_events(fixtures, options)
+                sent = self.send(events, options)
+                drained = self.drain(options)
+                self.report(fixtures, events, sent, drained)
+            finally:
+                if not options['keep']:
+                    self.cleanup(fixtures)
+
+    # ==================== Préparation ====================
+
+    def create_fixtures(self, types, options) -> dict:
+        from django.contrib.auth import get_user_model
+        from apps.payments.models import Payment, Subscription, SubscriptionPlan
+
+        User = get_user_model()
+        unique = max(1, int(options['events'] * (1 - options['duplicate_ratio'])))
+        fixtures = {'users': [], 'payments': [], 'subscriptions': [], 'plan': None, 'unique': unique}
+
+        def new_user(label):
+            user = User.objects.create_user(
+                email=f'loadtest_{self.run_id}_{label}@example.com',
+                username=f'loadtest_{self.run_id}_{label}',
+                password=None,
+            )
+            fixtures['users'].append(user)
+            return user
+
+        checkout_count = unique // len(types) if 'checkout' in types else 0
+        if checkout_count:
+            buyer = new_user('buyer')
+            fixtures['payments'] = Payment.objects.bulk_create([
+                Payment(
+                    user=buyer,
+                    amount=Decimal('1.00'),
+                    payment_type='post_credit',
+                    stripe_checkout_session_id=f'cs_loadtest_{self.run_id}_{i}',
+                    metadata={'credits': 1},
+                )
+                for i in range(checkout_count)
+            ])
+
+        if 'invoice' in types:
+            plan = SubscriptionPlan.objects.first()
+            if plan is None:
+                plan = SubscriptionPlan.objects.create(
+                    name='Load test', slug=f'loadtest-{self.run_id}',
+                    plan_type='basic', billing_cycle='monthly', price=Decimal('1.00'),
+                )
+                fixtures['plan'] = plan
+            for i in range(max(1, options['subscriptions'])):
+                fixtures['subscriptions'].append(Subscription.objects.create(
+                    user=new_user(f'sub{i}'),
+                    plan=plan,
+                    stripe_subscription_id=f'sub_loadtest_{self.run_id}_{i}',
+                    stripe_customer_id=f'cus_loadtest_{self.run_id}_{i}',
+                ))
+
+        return fixtures
+
+    def build_events(self, fixtures, options) -> list:
+        """Événements uniques, puis renvois de certains d'entre eux, mélangés."""
+        unique_events = []
+        for payment in fixtures['payments']:
+            unique_events.append(self.standin.build_event(
+                'checkout.session.completed',
+                {
+                    'id': payment.stripe_checkout_session_id,
+                    'object': 'checkout.session',
+                    'metadata': {'payment_type': 'post_credit'},
+                    'payment_intent': f'pi_loadtest_{payment.id.hex[:12]}',
+                },
+                event_id=f'evt_loadtest_{self.run_id}_{len(unique_events)}',
+            ))
+
+        subscriptions = fixtures['subscriptions']
+        invoice_count = fixtures['unique'] - len(unique_events) if subscriptions else 0
+        for i in range(invoice_count):
+            subscription = subscriptions[i % len(subscriptions)]
+            unique_events.append(self.standin.build_event(
+                'invoice.payment_succeeded',
+                {
+                    'id': f'in_loadtest_{self.run_id}_{i}',
+                    'object': 'invoice',
+                    'customer': subscription.stripe_customer_id,
+                    'subscription': subscription.stripe_subscription_id,
+                    'amount_paid': 100,
+                },
+                event_id=f'evt_loadtest_{self.run_id}_{len(unique_events)}',
+            ))
+
+        duplicates = [random.choice(unique_events) for _ in range(options['events'] - len(unique_events))]
+        events = unique_events + duplicates
+        random.shuffle(events)
+        return events
+
+    # ==================== Envoi ====================
+
+    def send(self, events, options) -> dict:
+        concurrency = options['concurrency']
+        path = reverse('payments:stripe-webhook')
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def post_in_process(client, payload, signature):
+            response = client.post(
+                path, data=payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+            )
+            return response.status_code
+
+        def post_remote(_client, payload, signature):
+            from urllib.error import HTTPError
+            from urllib.request import Request, urlopen
+            request = Request(
+                options['url'], data=payload.encode('utf-8'), method='POST',
+                headers={'Content-Type': 'application/json', 'Stripe-Signature': signature},
+            )
+            try:
+                with urlopen(request, timeout=30) as response:
+                    return response.status
+            except HTTPError as e:
+                return e.code
+
+        post = post_remote if options['url'] else post_in_process
+
+        undelivered = []
+
+        def worker(chunk):
+            client = Client()
+            local_latencies, local_statuses, local_undelivered = [], {}, 0
+            try:
+                for event in chunk:
+                    payload, signature = self.standin.signed_request(event)
+                    for attempt in range(options['retries'] + 1):
+                        if attempt:
+                            time.sleep(0.05 * attempt)
+                        start = time.perf_counter()
+                        try:
+                            status_code = post(client, payload, signature)
+                        except Exception:
+                            status_code = 'error'
+                        local_latencies.append(time.perf_counter() - start)
+                        local_statuses[status_code] = local_statuses.get(status_code, 0) + 1
+                        if status_code == 200:
+                            break
+                    else:
+                        local_undelivered += 1
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                undelivered.append(local_undelivered)
+                for status_code, count in local_statuses.items():
+                    statuses[status_code] = statuses.get(status_code, 0) + count
+
+        self.stdout.write(f'Envoi de {len(events)} webhooks ({concurrency} en parallèle)...')
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, [events[i::concurrency] for i in range(concurrency)]))
+        return {
+            'duration': time.perf_counter() - start,
+            'latencies': latencies,
+            'statuses': statuses,
+            'undelivered': sum(undelivered),
+        }
+
+    # ==================== Traitement ====================
+
+    def _outstanding(self):
+        from apps.payments.models import WebhookEvent
+        return WebhookEvent.objects.filter(
+            stripe_event_id__startswith=f'evt_loadtest_{self.run_id}_',
+            status__in=['pending', 'processing'],
+        ).count()
+
+    def drain(self, options) -> dict:
+        """Traite la file (en process) ou attend les workers du serveur cible."""
+        from apps.payments.services.webhook_queue import WebhookQueue
+
+        deadline = time.monotonic() + options['timeout']
+        start = time.perf_counter()
+
+        def worker():
+            try:
+                while time.monotonic() < deadline:
+                    if not WebhookQueue.process_batch() and not self._outstanding():
+                        return
+                    time.sleep(0.01)
+            finally:
+                connection.close()
+
+        if options['url']:
+            while self._outstanding() and time.monotonic() < deadline:
+                time.sleep(0.5)
+        else:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                for _ in range(options['concurrency']):
+                    executor.submit(worker)
+
+        return {'duration': time.perf_counter() - start, 'outstanding': self._outstanding()}
+
+    # ==================== Rapport ====================
+
+    def duplicate_counts(self, fixtures, events) -> dict:
+        """Traitements en trop : crédits ou paiements enregistrés plus d'une fois."""
+        from apps.payments.models import Payment, PostCreditTransaction
+
+        payment_ids = [str(p.id) for p in fixtures['payments']]
+        credit_rows = PostCreditTransaction.objects.filter(
+            post_credit__user__in=fixtures['users'], transaction_type='purchase',
+        ).values('description').annotate(n=Count('id')).filter(n__gt=1)
+        credits = sum(
+            row['n'] - 1 for row in credit_rows
+            if row['description'].rsplit(' ', 1)[-1] in payment_ids
+        )
+
+        invoice_ids = {e['data']['object']['id'] for e in events if e['type'] == 'invoice.payment_succeeded'}
+        invoice_rows = Payment.objects.filter(
+            stripe_invoice_id__in=invoice_ids,
+        ).values('stripe_invoice_id').annotate(n=Count('id')).filter(n__gt=1)
+        invoices = sum(row['n'] - 1 for row in invoice_rows)
+
+        return {'checkout': credits, 'invoice': invoices}
+
+    def report(self, fixtures, events, sent, drained):
+        from apps.payments.models import WebhookEvent
+
+        run_events = WebhookEvent.objects.filter(stripe_event_id__startswith=f'evt_loadtest_{self.run_id}_')
+        by_status = dict(run_events.values_list('status').annotate(n=Count('id')))
+        processed = by_status.get('processed', 0)
+        duplicates = self.duplicate_counts(fixtures, events)
+        latencies = sent['latencies']
+        self.results = {
+            'sent': len(events),
+            'unique': len({e['id'] for e in events}),
+            'statuses': sent['statuses'],
+            'undelivered': sent['undelivered'],
+            'ack_throughput': len(events) / sent['duration'] if sent['duration'] else 0,
+            'ack_p50_ms': percentile(latencies, 50) * 1000,
+            'ack_p99_ms': percentile(latencies, 99) * 1000,
+            'processed': processed,
+            'process_throughput': processed / drained['duration'] if drained['duration'] else 0,
+            'outstanding': drained['outstanding'],
+            'dead': by_status.get('dead', 0),
+            'duplicates': duplicates,
+        }
+        r = self.results
+
+        self.stdout.write('')
+        self.stdout.write(f"Livraisons        : {r['sent']} ({r['unique']} événements uniques)")
+        self.stdout.write(f"Réponses HTTP     : {r['statuses']} ({r['undelivered']} non livrés)")
+        self.stdout.write(f"Accusé (débit)    : {r['ack_throughput']:.0f} req/s")
+        self.stdout.write(f"Accusé (latence)  : p50 {r['ack_p50_ms']:.1f} ms, p99 {r['ack_p99_ms']:.1f} ms")
+        self.stdout.write(f"Traitement        : {r['processed']} événements, {r['process_throughput']:.0f} évt/s")
+        self.stdout.write(f"Restants / dead   : {r['outstanding']} / {r['dead']}")
+        self.stdout.write(
+            f"Doublons traités  : checkout {duplicates['checkout']}, invoice {duplicates['invoice']}"
+        )
+
+        if duplicates['checkout'] or duplicates['invoice']:
+            self.stdout.write(self.style.ERROR('❌ Des événements ont été traités plusieurs fois'))
+        elif r['outstanding'] or r['dead'] or r['undelivered']:
+            self.stdout.write(self.style.WARNING('⚠️ Tous les événements n\'ont pas été traités'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Aucun traitement en double'))
+
+    def cleanup(self, fixtures):
+        from apps.payments.models import WebhookEvent
+
+        WebhookEvent.objects.filter(stripe_event_id__startswith=f'evt_loadtest_{self.run_id}_').delete()
+        for user in fixtures['users']:
+            user.delete()
+        if fixtures['plan']:
+            fixtures['plan'].delete()
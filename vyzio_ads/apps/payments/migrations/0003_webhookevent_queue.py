@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def mark_existing_processed(apps, schema_editor):
+    WebhookEvent = apps.get_model('payments', 'WebhookEvent')
+    WebhookEvent.objects.filter(processed=True).update(status='processed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_alter_payment_payment_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('processed', 'Traité'), ('dead', 'Échec définitif')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='payments_we_status_a02aee_idx'),
+        ),
+        migrations.RunPython(mark_existing_processed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_webhookevent_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='last_stripe_event_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_created',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='object_id',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(fields=['object_id', 'status', 'event_created'], name='payments_we_object__a110bc_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:02
+
+from django.db import migrations
+
+
+def backfill_customer_ids(apps, schema_editor):
+    """Reprend le customer Stripe le plus récent (abonnement, puis paiements)."""
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Payment = apps.get_model('payments', 'Payment')
+    Subscription = apps.get_model('payments', 'Subscription')
+
+    customer_ids = {}
+    payments = Payment.objects.filter(
+        stripe_customer_id__startswith='cus_'
+    ).exclude(stripe_customer_id__startswith='cus_test_').order_by('created_at')
+    for user_id, customer_id in payments.values_list('user_id', 'stripe_customer_id').iterator():
+        customer_ids[user_id] = customer_id
+
+    subscriptions = Subscription.objects.filter(
+        stripe_customer_id__startswith='cus_'
+    ).exclude(stripe_customer_id__startswith='cus_test_')
+    for user_id, customer_id in subscriptions.values_list('user_id', 'stripe_customer_id').iterator():
+        customer_ids[user_id] = customer_id
+
+    for user_id, customer_id in customer_ids.items():
+        CustomUser.objects.filter(id=user_id, stripe_customer_id='').update(stripe_customer_id=customer_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_webhook_event_ordering'),
+        ('users', '0002_customuser_stripe_customer_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customer_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_payment_seller(apps, schema_editor):
+    """Vendeur = vendeur actuel de l'annonce liée."""
+    Listing = apps.get_model('listings', 'Listing')
+    Payment = apps.get_model('payments', 'Payment')
+
+    Payment.objects.filter(listing__isnull=False, seller__isnull=True).update(
+        seller_id=models.Subquery(
+            Listing.objects.filter(pk=models.OuterRef('listing_id')).values('seller_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0005_backfill_user_stripe_customer_id'),
+        ('listings', '0004_listing_condition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='seller',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listing_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='payments_seller_created_idx'),
+        ),
+        migrations.RunPython(backfill_payment_seller, migrations.RunPython.noop),
+    ]
@@ -50,6 +50,11 @@ class Payment(models.Model):
         'listings.Listing', on_delete=models.SET_NULL, 
         null=True, blank=True, related_name='payments'
     )
+    # Vendeur de l'annonce (dénormalisé) : historique vendeur sans jointure
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='listing_payments'
+    )
     
     # Metadata
     description = models.TextField(blank=True)
@@ -67,6 +72,7 @@ class Payment(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['seller', '-created_at', '-id'], name='payments_seller_created_idx'),
             models.Index(fields=['status']),
             models.Index(fields=['payment_type']),
         ]
@@ -74,6 +80,11 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment {self.id} - {self.user.email} - {self.amount}€ ({self.status})"
     
+    def save(self, *args, **kwargs):
+        if self.listing_id and not self.seller_id:
+            self.seller_id = self.listing.seller_id
+        super().save(*args, **kwargs)
+    
     def mark_completed(self):
         """Marque le paiement comme complété."""
         self.status = 'completed'
@@ -139,6 +150,15 @@ class SubscriptionPlan(models.Model):
     
     def __str__(self):
         return f"{self.name} - {self.get_billing_cycle_display()} ({self.price}€)"
+    
+    def save(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
+        
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # Limites du plan copiées dans les droits en cache des abonnés
+        if not adding:
+            EntitlementService.invalidate(*self.subscriptions.values_list('user_id', flat=True))
 
 
 class Subscription(models.Model):
@@ -180,6 +200,10 @@ class Subscription(models.Model):
     auto_renew = models.BooleanField(default=True)
     cancel_at_period_end = models.BooleanField(default=False)
     
+    # Date (created) du dernier événement Stripe appliqué : un événement
+    # plus ancien reçu en retard est ignoré
+    last_stripe_event_at = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -187,13 +211,29 @@ class Subscription(models.Model):
         db_table = 'payments_subscription'
         ordering = ['-created_at']
     
+    ACTIVE_STATUSES = ('active', 'trialing')
+    
     def __str__(self):
         return f"{self.user.email} - {self.plan.name} ({self.status})"
     
+    def save(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
+        
+        super().save(*args, **kwargs)
+        EntitlementService.invalidate(self.user_id)
+    
+    def delete(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
+        
+        user_id = self.user_id
+        result = super().delete(*args, **kwargs)
+        EntitlementService.invalidate(user_id)
+        return result
+    
     @property
     def is_active(self):
         """Vérifie si l'abonnement est actif."""
-        return self.status in ('active', 'trialing')
+        return self.status in self.ACTIVE_STATUSES
     
     @property
     def can_create_listing(self):
@@ -355,56 +395,54 @@ class PostCredit(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.balance} crédits"
     
-    def add_credits(self, amount: int, source: str = ''):
-        """Ajoute des crédits au compte."""
-        self.balance += amount
-        self.total_purchased += amount
-        self.save(update_fields=['balance', 'total_purchased', 'updated_at'])
+    def save(self, *args, **kwargs):
+        from apps.users.entitlements import EntitlementService
         
-        # Log la transaction
-        PostCreditTransaction.objects.create(
-            post_credit=self,
-            transaction_type='purchase',
-            amount=amount,
-            balance_after=self.balance,
-            description=source,
-        )
-        return self.balance
+        super().save(*args, **kwargs)
+        EntitlementService.invalidate(self.user_id)
+    
+    def add_credits(self, amount: int, source: str = '', payment=None):
+        """Ajoute des crédits au compte."""
+        return self._post(amount, {'total_purchased': amount}, {
+            'transaction_type': 'purchase',
+            'amount': amount,
+            'payment': payment,
+            'description': source,
+        })
     
     def use_credit(self, listing=None):
         """Utilise un crédit pour une annonce."""
-        if self.balance <= 0:
-            raise ValueError("Pas assez de crédits")
-        
-        self.balance -= 1
-        self.total_used += 1
-        self.save(update_fields=['balance', 'total_used', 'updated_at'])
+        from apps.payments.services.ledger import InsufficientBalance
         
-        # Log la transaction
-        PostCreditTransaction.objects.create(
-            post_credit=self,
-            transaction_type='use',
-            amount=-1,
-            balance_after=self.balance,
-            listing=listing,
-            description=f"Annonce: {listing.title}" if listing else '',
-        )
-        return self.balance
+        try:
+            return self._post(-1, {'total_used': 1}, {
+                'transaction_type': 'use',
+                'amount': -1,
+                'listing': listing,
+                'description': f"Annonce: {listing.title}" if listing else '',
+            })
+        except InsufficientBalance:
+            raise ValueError("Pas assez de crédits")
     
     def refund_credit(self, listing=None, reason: str = ''):
         """Rembourse un crédit (annonce supprimée/rejetée)."""
-        self.balance += 1
-        self.total_used -= 1
-        self.save(update_fields=['balance', 'total_used', 'updated_at'])
+        return self._post(1, {'total_used': -1}, {
+            'transaction_type': 'refund',
+            'amount': 1,
+            'listing': listing,
+            'description': reason,
+        })
+    
+    def _post(self, delta, counters, entry):
+        """Mouvement atomique via le grand livre ; met à jour l'instance."""
+        from apps.payments.services.ledger import post_credit_ledger
         
-        PostCreditTransaction.objects.create(
-            post_credit=self,
-            transaction_type='refund',
-            amount=1,
-            balance_after=self.balance,
-            listing=listing,
-            description=reason,
-        )
+        from apps.users.entitlements import EntitlementService
+        
+        values = post_credit_ledger().post(self.pk, delta, counters=counters, entry=entry)
+        EntitlementService.invalidate(self.user_id)
+        for field_name, value in values.items():
+            setattr(self, field_name, value)
         return self.balance
 
 
@@ -454,19 +492,40 @@ class WebhookEvent(models.Model):
     """
     Log des webhooks Stripe reçus.
     Pour débogage et idempotence.
+    
+    Sert aussi de file de traitement : la vue enregistre l'événement et
+    répond 200 immédiatement, un worker le traite ensuite.
     """
     
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),
+        ('processed', 'Traité'),
+        ('dead', 'Échec définitif'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     stripe_event_id = models.CharField(max_length=100, unique=True, db_index=True)
     event_type = models.CharField(max_length=100, db_index=True)
     
     payload = models.JSONField()
     
+    # Objet Stripe concerné (abonnement ou client) : les événements d'un même
+    # objet sont traités dans l'ordre de event_created, un à la fois
+    object_id = models.CharField(max_length=100, blank=True, default='')
+    # Date de création de l'événement chez Stripe (champ `created`)
+    event_created = models.DateTimeField(null=True, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     processed = models.BooleanField(default=False)
     processed_at = models.DateTimeField(null=True, blank=True)
     
     error_message = models.TextField(blank=True)
     retry_count = models.IntegerField(default=0)
+    # Prochaine tentative (backoff exponentiel)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Bail du worker qui traite l'événement (reprise si le worker meurt)
+    locked_until = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -475,12 +534,16 @@ class WebhookEvent(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['event_type', '-created_at']),
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['object_id', 'status', 'event_created']),
         ]
     
     def __str__(self):
         return f"{self.event_type} - {self.stripe_event_id}"
     
     def mark_processed(self):
+        self.status = 'processed'
         self.processed = True
         self.processed_at = timezone.now()
-        self.save(update_fields=['processed', 'processed_at'])
+        self.locked_until = None
+        self.save(update_fields=['status', 'processed', 'processed_at', 'locked_until'])
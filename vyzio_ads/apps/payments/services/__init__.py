@@ -3,5 +3,6 @@ Services de paiement.
 """
 from .stripe_service import StripeService
 from .webhook_handler import WebhookHandler
+from .webhook_queue import WebhookQueue
 
-__all__ = ['StripeService', 'WebhookHandler']
+__all__ = ['StripeService', 'WebhookHandler', 'WebhookQueue']
@@ -0,0 +1,196 @@
+"""
+Moteur de grand livre (ledger) pour les soldes.
+Phase 6 - Paiements
+
+Chaque mouvement de solde est :
+- un UPDATE conditionnel unique côté base
+  (SET balance = balance + x WHERE balance + x >= 0 RETURNING balance),
+  sans lecture préalable en Python : pas de mise à jour perdue
+- une ligne de journal (append-only) écrite dans la même transaction,
+  avec le solde obtenu (balance_after)
+
+Utilisé par PostCredit (PostCreditTransaction) et SellerWallet
+(WalletTransaction). La commande `reconcile_ledgers` compare les soldes aux
+sommes des journaux.
+"""
+from decimal import Decimal
+
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+
+class InsufficientBalance(ValueError):
+    """Le mouvement rendrait un solde négatif."""
+
+
+class Ledger:
+    """
+    Grand livre d'un type de compte.
+
+    Args:
+        account_model: Modèle portant les soldes (ex. PostCredit)
+        entry_model: Modèle du journal (ex. PostCreditTransaction)
+        account_field: Clé étrangère du journal vers le compte
+        balance_field: Solde principal (balance_after du journal)
+        non_negative: Champs qui ne peuvent pas devenir négatifs
+    """
+
+    def __init__(self, account_model, entry_model, account_field,
+                 balance_field='balance', non_negative=('balance',)):
+        self.account_model = account_model
+        self.entry_model = entry_model
+        self.account_field = account_field
+        self.balance_field = balance_field
+        self.non_negative = tuple(non_negative)
+
+    def post(self, account_id, delta, counters=None, entry=None) -> dict:
+        """
+        Applique un mouvement et l'inscrit au journal.
+
+        Args:
+            account_id: PK du compte
+            delta: Variation du solde principal (négative pour un débit)
+            counters: Autres champs à incrémenter ({'total_used': 1})
+            entry: Champs de la ligne de journal (None = pas de ligne)
+
+        Returns:
+            Nouvelles valeurs des champs modifiés
+
+        Raises:
+            InsufficientBalance: si un champ de non_negative deviendrait négatif
+        """
+        return self.post_many([{
+            'account_id': account_id,
+            'delta': delta,
+            'counters': counters,
+            'entry': entry,
+        }])[account_id]
+
+    def post_many(self, postings) -> dict:
+        """
+        Applique des mouvements en lot : un UPDATE par compte et un seul
+        INSERT pour le journal. Tout ou rien.
+
+        Args:
+            postings: [{'account_id', 'delta', 'counters', 'entry'}, ...]
+
+        Returns:
+            {account_id: nouvelles valeurs}
+        """
+        by_account = {}
+        for posting in postings:
+            deltas = by_account.setdefault(posting['account_id'], {self.balance_field: 0})
+            deltas[self.balance_field] += posting['delta']
+            for field_name, value in (posting.get('counters') or {}).items():
+                deltas[field_name] = deltas.get(field_name, 0) + value
+
+        results = {}
+        entries = []
+        with transaction.atomic(using=router.db_for_write(self.account_model)):
+            # Ordre stable des verrous : pas d'interblocage entre deux lots
+            for account_id in sorted(by_account, key=str):
+                results[account_id] = self._apply(account_id, by_account[account_id])
+
+            running = {
+                account_id: values[self.balance_field] - by_account[account_id][self.balance_field]
+                for account_id, values in results.items()
+            }
+            for posting in postings:
+                account_id = posting['account_id']
+                running[account_id] += posting['delta']
+                if posting.get('entry') is not None:
+                    entries.append(self.entry_model(
+                        **{f'{self.account_field}_id': account_id},
+                        balance_after=running[account_id],
+                        **posting['entry'],
+                    ))
+
+            if entries:
+                self.entry_model.objects.bulk_create(entries)
+
+        return results
+
+    def _apply(self, account_id, deltas) -> dict:
+        """UPDATE ... SET f = f + x WHERE f + x >= 0 RETURNING f"""
+        model = self.account_model
+        opts = model._meta
+        connection = connections[router.db_for_write(model)]
+        qn = connection.ops.quote_name
+
+        fields = [opts.get_field(name) for name in deltas]
+        sets, params = [], []
+        for field in fields:
+            sets.append(f'{qn(field.column)} = {qn(field.column)} + %s')
+            params.append(self._prep(field, deltas[field.name], connection))
+
+        updated_at = next((f for f in opts.concrete_fields if f.name == 'updated_at'), None)
+        if updated_at is not None:
+            sets.append(f'{qn(updated_at.column)} = %s')
+            params.append(updated_at.get_db_prep_value(timezone.now(), connection))
+
+        where = [f'{qn(opts.pk.column)} = %s']
+        params.append(opts.pk.get_db_prep_value(account_id, connection))
+        for field in fields:
+            if field.name in self.non_negative and deltas[field.name] < 0:
+                where.append(f'{qn(field.column)} + %s >= 0')
+                params.append(self._prep(field, deltas[field.name], connection))
+
+        sql = f'UPDATE {qn(opts.db_table)} SET {", ".join(sets)} WHERE {" AND ".join(where)}'
+
+        with connection.cursor() as cursor:
+            if self._can_return_from_update(connection):
+                cursor.execute(f'{sql} RETURNING {", ".join(qn(f.column) for f in fields)}', params)
+                row = cursor.fetchone()
+            else:
+                cursor.execute(sql, params)
+                row = None
+                if cursor.rowcount:
+                    row = model.objects.filter(pk=account_id).values_list(*deltas).get()
+
+        if row is None:
+            if not model.objects.filter(pk=account_id).exists():
+                raise model.DoesNotExist(f'{opts.object_name} {account_id} introuvable')
+            raise InsufficientBalance('Solde insuffisant')
+
+        return {field.name: self._to_python(field, value) for field, value in zip(fields, row)}
+
+    @staticmethod
+    def _can_return_from_update(connection) -> bool:
+        """
+        UPDATE ... RETURNING : PostgreSQL et SQLite >= 3.35 (même version
+        que INSERT ... RETURNING). MySQL/MariaDB et Oracle : UPDATE puis relecture.
+        """
+        if connection.vendor == 'postgresql':
+            return True
+        if connection.vendor == 'sqlite':
+            return connection.features.can_return_columns_from_insert
+        return False
+
+    @staticmethod
+    def _prep(field, value, connection):
+        if isinstance(field, models.DecimalField):
+            return connection.ops.adapt_decimalfield_value(
+                Decimal(str(value)), field.max_digits, field.decimal_places
+            )
+        return value
+
+    @staticmethod
+    def _to_python(field, value):
+        if isinstance(field, models.DecimalField):
+            return Decimal(str(value)).quantize(Decimal(1).scaleb(-field.decimal_places))
+        return field.to_python(value)
+
+
+def post_credit_ledger() -> Ledger:
+    """Crédits d'annonces (PostCredit)."""
+    from apps.payments.models import PostCredit, PostCreditTransaction
+    return Ledger(PostCredit, PostCreditTransaction, account_field='post_credit')
+
+
+def wallet_ledger() -> Ledger:
+    """Portefeuilles vendeurs (SellerWallet) ; le solde en attente est aussi protégé."""
+    from apps.orders.models import SellerWallet, WalletTransaction
+    return Ledger(
+        SellerWallet, WalletTransaction, account_field='wallet',
+        non_negative=('balance', 'pending_balance'),
+    )
@@ -21,6 +21,7 @@ logger = logging.getLogger(__name__)
 def get_stripe():
     """Configure et retourne le module Stripe."""
     stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+    stripe.api_base = getattr(settings, 'STRIPE_API_BASE', '') or 'https://api.stripe.com'
     return stripe
 
 
@@ -35,6 +36,9 @@ class StripeService:
     Gère les abonnements (Option A) et pay-per-post (Option B).
     """
     
+    # Durée de validité d'une vérification de customer (secondes)
+    CUSTOMER_VERIFY_TTL = getattr(settings, 'STRIPE_CUSTOMER_VERIFY_TTL', 60 * 60 * 24)
+    
     def __init__(self):
         self.stripe = get_stripe()
         self.frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
@@ -46,6 +50,11 @@ class StripeService:
         """
         Récupère ou crée un customer Stripe pour un utilisateur.
         
+        Le customer ID est stocké sur l'utilisateur (stripe_customer_id) et
+        vérifié auprès de Stripe au plus une fois par STRIPE_CUSTOMER_VERIFY_TTL.
+        La création est sérialisée par utilisateur (verrou de ligne + clé
+        d'idempotence Stripe) : des checkouts simultanés partagent le même customer.
+        
         Args:
             user: Instance CustomUser
             
@@ -55,47 +64,110 @@ class StripeService:
         if not is_stripe_configured():
             return f"cus_test_{user.id}"
         
-        # Vérifier si l'utilisateur a déjà un customer ID
-        from apps.payments.models import Payment
-        existing_customer_id = None
+        customer_id = user.stripe_customer_id or self._legacy_customer_id(user)
+        
+        if customer_id and self._verify_customer(customer_id):
+            if user.stripe_customer_id != customer_id:
+                self._store_customer_id(user, customer_id)
+            return customer_id
+        
+        return self._create_customer(user, stale_customer_id=customer_id)
+    
+    @staticmethod
+    def _verified_cache_key(customer_id):
+        return f'stripe:customer:verified:{customer_id}'
+    
+    def _verify_customer(self, customer_id) -> bool:
+        """
+        Vérifie qu'un customer existe chez Stripe (résultat positif en cache).
+        """
+        from django.core.cache import cache
+        
+        key = self._verified_cache_key(customer_id)
+        if cache.get(key):
+            return True
+        
+        try:
+            customer = self.stripe.Customer.retrieve(customer_id)
+        except stripe.error.InvalidRequestError:
+            # Customer n'existe pas (probablement créé en mode test)
+            logger.warning(f"Customer {customer_id} non trouvé dans Stripe, création d'un nouveau")
+            return False
+        
+        if customer.get('deleted'):
+            logger.warning(f"Customer {customer_id} supprimé dans Stripe, création d'un nouveau")
+            return False
+        
+        cache.set(key, True, self.CUSTOMER_VERIFY_TTL)
+        return True
+    
+    @staticmethod
+    def _legacy_customer_id(user) -> Optional[str]:
+        """Customer ID enregistré avant stripe_customer_id (paiements, abonnement)."""
+        from apps.payments.models import Payment, Subscription
         
         existing = Payment.objects.filter(
             user=user,
             stripe_customer_id__startswith='cus_'
-        ).first()
-        
-        if existing and existing.stripe_customer_id:
-            existing_customer_id = existing.stripe_customer_id
+        ).exclude(
+            stripe_customer_id__startswith='cus_test_'
+        ).values_list('stripe_customer_id', flat=True).first()
+        if existing:
+            return existing
         
-        # Vérifier dans l'abonnement
-        if not existing_customer_id and hasattr(user, 'subscription') and user.subscription.stripe_customer_id:
-            existing_customer_id = user.subscription.stripe_customer_id
+        return Subscription.objects.filter(
+            user=user,
+            stripe_customer_id__startswith='cus_'
+        ).exclude(
+            stripe_customer_id__startswith='cus_test_'
+        ).values_list('stripe_customer_id', flat=True).first()
+    
+    @staticmethod
+    def _store_customer_id(user, customer_id):
+        from django.contrib.auth import get_user_model
         
-        # Si on a un customer ID existant, vérifier qu'il existe vraiment dans Stripe
-        if existing_customer_id:
+        get_user_model().objects.filter(pk=user.pk).update(stripe_customer_id=customer_id)
+        user.stripe_customer_id = customer_id
+    
+    def _create_customer(self, user, stale_customer_id=None) -> str:
+        """
+        Crée le customer, une seule fois par utilisateur même en cas d'appels
+        concurrents : le premier crée, les suivants relisent son ID.
+        """
+        from django.core.cache import cache
+        from django.contrib.auth import get_user_model
+        from django.db import transaction
+        
+        User = get_user_model()
+        
+        with transaction.atomic():
+            current = User.objects.select_for_update().filter(pk=user.pk).values_list(
+                'stripe_customer_id', flat=True
+            ).first()
+            if current and current != stale_customer_id:
+                user.stripe_customer_id = current
+                return current
+            
             try:
-                self.stripe.Customer.retrieve(existing_customer_id)
-                return existing_customer_id
-            except stripe.error.InvalidRequestError:
-                # Customer n'existe pas (probablement créé en mode test)
-                logger.warning(f"Customer {existing_customer_id} non trouvé dans Stripe, création d'un nouveau")
-                existing_customer_id = None
-        
-        # Créer un nouveau customer
-        try:
-            customer = self.stripe.Customer.create(
-                email=user.email,
-                name=user.get_full_name() or user.username,
-                metadata={
-                    'user_id': str(user.id),
-                    'username': user.username,
-                }
-            )
-            logger.info(f"Customer Stripe créé: {customer.id} pour {user.email}")
-            return customer.id
-        except stripe.error.StripeError as e:
-            logger.error(f"Erreur création customer Stripe: {e}")
-            raise
+                customer = self.stripe.Customer.create(
+                    email=user.email,
+                    name=user.get_full_name() or user.username,
+                    metadata={
+                        'user_id': str(user.id),
+                        'username': user.username,
+                    },
+                    # Coalescence entre processus (et sans verrou de ligne, ex. SQLite)
+                    idempotency_key=f'customer-create-{user.id}-{stale_customer_id or "new"}',
+                )
+            except stripe.error.StripeError as e:
+                logger.error(f"Erreur création customer Stripe: {e}")
+                raise
+            
+            self._store_customer_id(user, customer.id)
+        
+        cache.set(self._verified_cache_key(customer.id), True, self.CUSTOMER_VERIFY_TTL)
+        logger.info(f"Customer Stripe créé: {customer.id} pour {user.email}")
+        return customer.id
     
     # ==================== Subscription (Option A) ====================
     
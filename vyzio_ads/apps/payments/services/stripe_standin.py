@@ -0,0 +1,324 @@
+"""
+Serveur local imitant l'API Stripe (tests de bout en bout et charge).
+Phase 6 - Paiements
+
+Implémente les endpoints utilisés par StripeService :
+- POST/GET /v1/customers
+- POST /v1/checkout/sessions
+- GET/POST/DELETE /v1/subscriptions/{id}
+- POST /v1/billing_portal/sessions
+
+et émet des webhooks signés comme Stripe (en-tête Stripe-Signature).
+
+Usage:
+    STRIPE_SECRET_KEY=sk_test_standin
+    STRIPE_API_BASE=http://127.0.0.1:12111
+    python manage.py stripe_standin --port 12111 \\
+        --webhook-url http://127.0.0.1:8000/api/payments/webhook/
+
+Les données sont en mémoire et perdues à l'arrêt du serveur.
+"""
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def sign_payload(payload: str, secret: str, timestamp=None) -> str:
+    """En-tête Stripe-Signature pour un corps de webhook."""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(
+        secret.encode('utf-8'),
+        msg=f'{timestamp}.{payload}'.encode('utf-8'),
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def decode_form(body: str) -> dict:
+    """
+    Décode un corps form-encoded à la manière de Stripe
+    (metadata[user_id]=..., line_items[0][quantity]=...).
+    """
+    data = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _lists(data)
+
+
+def _lists(node):
+    """Convertit les dictionnaires à clés numériques en listes."""
+    if not isinstance(node, dict):
+        return node
+    node = {key: _lists(value) for key, value in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+    return node
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class StripeStandIn:
+    """
+    Faux Stripe en mémoire, servi en WSGI.
+    """
+
+    def __init__(self, webhook_secret='whsec_standin', webhook_url=None, base_url='http://127.0.0.1'):
+        self.webhook_secret = webhook_secret
+        self.webhook_url = webhook_url
+        self.base_url = base_url
+        self.customers = {}
+        self.sessions = {}
+        self.subscriptions = {}
+        # Réponses déjà renvoyées par clé d'idempotence (en-tête Idempotency-Key)
+        self.idempotent_responses = {}
+        # Webhooks émis, dans l'ordre
+        self.events = []
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._server = None
+
+    def new_id(self, prefix) -> str:
+        with self._lock:
+            return f'{prefix}_standin{next(self._ids):08d}'
+
+    # ==================== Serveur ====================
+
+    def start(self, host='127.0.0.1', port=0) -> str:
+        """Démarre le serveur dans un thread. Retourne son URL (STRIPE_API_BASE)."""
+        self._server = make_server(
+            host, port, self, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler
+        )
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f'http://{host}:{self._server.server_port}'
+        return self.base_url
+
+    def serve_forever(self, host='127.0.0.1', port=12111):
+        self._server = make_server(
+            host, port, self, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler
+        )
+        self.base_url = f'http://{host}:{port}'
+        self._server.serve_forever()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length).decode('utf-8') if length else ''
+        params = decode_form(body or environ.get('QUERY_STRING', ''))
+
+        idempotency_key = environ.get('HTTP_IDEMPOTENCY_KEY')
+        if method == 'POST' and idempotency_key:
+            with self._lock:
+                response = self.idempotent_responses.get(idempotency_key)
+                if response is None:
+                    response = self.route(method, path, params)
+                    self.idempotent_responses[idempotency_key] = response
+            status, data = response
+        else:
+            status, data = self.route(method, path, params)
+
+        payload = json.dumps(data).encode('utf-8')
+        start_response(status, [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(payload))),
+            ('Request-Id', self.new_id('req')),
+        ])
+        return [payload]
+
+    def route(self, method, path, params):
+        routes = [
+            ('POST', r'^/v1/customers$', self.create_customer),
+            ('GET', r'^/v1/customers/(?P<obj_id>[\w-]+)$', self.retrieve_customer),
+            ('POST', r'^/v1/checkout/sessions$', self.create_checkout_session),
+            ('GET', r'^/v1/subscriptions/(?P<obj_id>[\w-]+)$', self.retrieve_subscription),
+            ('POST', r'^/v1/subscriptions/(?P<obj_id>[\w-]+)$', self.modify_subscription),
+            ('DELETE', r'^/v1/subscriptions/(?P<obj_id>[\w-]+)$', self.delete_subscription),
+            ('POST', r'^/v1/billing_portal/sessions$', self.create_portal_session),
+            # Simulation du paiement par le client (hors API Stripe)
+            ('POST', r'^/_standin/checkout/sessions/(?P<obj_id>[\w-]+)/complete$', self.complete_checkout),
+        ]
+        for route_method, pattern, view in routes:
+            match = re.match(pattern, path)
+            if match and route_method == method:
+                try:
+                    return '200 OK', view(params, **match.groupdict())
+                except KeyError as e:
+                    return '404 Not Found', self._error(f'No such object: {e.args[0]}')
+        return '404 Not Found', self._error(f'Unrecognized request URL ({method}: {path})')
+
+    @staticmethod
+    def _error(message):
+        return {'error': {'type': 'invalid_request_error', 'message': message}}
+
+    # ==================== Ressources ====================
+
+    def create_customer(self, params):
+        customer = {
+            'id': self.new_id('cus'),
+            'object': 'customer',
+            'email': params.get('email'),
+            'name': params.get('name'),
+            'metadata': params.get('metadata', {}),
+            'created': int(time.time()),
+        }
+        self.customers[customer['id']] = customer
+        return customer
+
+    def retrieve_customer(self, params, obj_id):
+        return self.customers[obj_id]
+
+    def create_checkout_session(self, params):
+        session_id = self.new_id('cs')
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'customer': params.get('customer'),
+            'mode': params.get('mode', 'payment'),
+            'metadata': params.get('metadata', {}),
+            'line_items': params.get('line_items', []),
+            'payment_status': 'unpaid',
+            'status': 'open',
+            'subscription': None,
+            'payment_intent': None,
+            'url': f'{self.base_url}/checkout/{session_id}',
+        }
+        self.sessions[session_id] = session
+        return session
+
+    def retrieve_subscription(self, params, obj_id):
+        return self.subscriptions[obj_id]
+
+    def modify_subscription(self, params, obj_id):
+        subscription = self.subscriptions[obj_id]
+        if 'cancel_at_period_end' in params:
+            subscription['cancel_at_period_end'] = params['cancel_at_period_end'].lower() == 'true'
+        subscription['metadata'].update(params.get('metadata', {}))
+        self.emit('customer.subscription.updated', subscription)
+        return subscription
+
+    def delete_subscription(self, params, obj_id):
+        subscription = self.subscriptions[obj_id]
+        subscription['status'] = 'canceled'
+        self.emit('customer.subscription.deleted', subscription)
+        return subscription
+
+    def create_portal_session(self, params):
+        return {
+            'id': self.new_id('bps'),
+            'object': 'billing_portal.session',
+            'customer': params.get('customer'),
+            'return_url': params.get('return_url'),
+            'url': f'{self.base_url}/portal/{params.get("customer")}',
+        }
+
+    # ==================== Paiement et webhooks ====================
+
+    def complete_checkout(self, params=None, obj_id=None):
+        """
+        Simule le paiement d'une session : crée l'abonnement le cas échéant
+        et émet les webhooks correspondants.
+
+        Returns:
+            La session complétée
+        """
+        session = self.sessions[obj_id]
+        session['status'] = 'complete'
+        session['payment_status'] = 'paid'
+        session['payment_intent'] = self.new_id('pi')
+
+        subscription = None
+        if session['mode'] == 'subscription':
+            now = int(time.time())
+            subscription = {
+                'id': self.new_id('sub'),
+                'object': 'subscription',
+                'customer': session['customer'],
+                'status': 'active',
+                'cancel_at_period_end': False,
+                'current_period_start': now,
+                'current_period_end': now + 30 * 24 * 3600,
+                'metadata': dict(session['metadata']),
+                'items': {'data': [{'price': {'id': None}}]},
+            }
+            self.subscriptions[subscription['id']] = subscription
+            session['subscription'] = subscription['id']
+
+        self.emit('checkout.session.completed', session)
+        if subscription:
+            self.emit('customer.subscription.created', subscription)
+            self.emit('invoice.payment_succeeded', self.invoice_for(subscription))
+        return session
+
+    def invoice_for(self, subscription, amount_paid=0) -> dict:
+        return {
+            'id': self.new_id('in'),
+            'object': 'invoice',
+            'customer': subscription['customer'],
+            'subscription': subscription['id'],
+            'amount_paid': amount_paid,
+        }
+
+    def build_event(self, event_type, obj, event_id=None, created=None) -> dict:
+        return {
+            'id': event_id or self.new_id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(created or time.time()),
+            'data': {'object': obj},
+        }
+
+    def signed_request(self, event) -> tuple:
+        """(corps, en-tête Stripe-Signature) d'un événement."""
+        payload = json.dumps(event)
+        return payload, sign_payload(payload, self.webhook_secret)
+
+    def emit(self, event_type, obj):
+        """Envoie un webhook signé à webhook_url (si configurée)."""
+        event = self.build_event(event_type, json.loads(json.dumps(obj)))
+        self.events.append(event)
+        if self.webhook_url:
+            try:
+                self.deliver(event)
+            except Exception as e:
+                logger.error(f"Échec livraison webhook {event_type}: {e}")
+        return event
+
+    def deliver(self, event) -> int:
+        """POST signé vers webhook_url. Retourne le code HTTP."""
+        payload, signature = self.signed_request(event)
+        request = Request(
+            self.webhook_url,
+            data=payload.encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Stripe-Signature': signature},
+            method='POST',
+        )
+        with urlopen(request, timeout=10) as response:
+            return response.status
@@ -5,8 +5,11 @@ Phase 6 - Paiements
 SÉCURITÉ:
 - Vérification de signature obligatoire
 - Idempotence via WebhookEvent
+- Événements périmés (created antérieur au dernier appliqué) ignorés
 - Ne pas logguer de données sensibles
 """
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 import logging
@@ -40,51 +43,113 @@ class WebhookHandler:
         """
         Traite un événement Stripe.
         
+        Idempotent même en cas de livraisons concurrentes : l'événement est
+        inséré sans conflit (INSERT ... ON CONFLICT DO NOTHING) puis réservé
+        par un UPDATE conditionnel sur status='pending' qui ne réussit qu'une
+        fois. La réservation et le handler partagent la même transaction :
+        un échec annule les deux et l'événement reste à traiter.
+        
         Args:
             event: Dictionnaire de l'événement Stripe
             
         Returns:
-            True si traité avec succès
+            True si traité avec succès (ou déjà traité). False en cas d'échec,
+            ou si l'événement est accepté mais encore en file (réservé par un
+            worker qui n'a pas terminé) : il n'est pas encore appliqué.
         """
         from apps.payments.models import WebhookEvent
+        from apps.payments.services.webhook_queue import WebhookQueue
         
         event_id = event.get('id')
         event_type = event.get('type')
         
-        # Vérifier l'idempotence
-        if WebhookEvent.objects.filter(stripe_event_id=event_id, processed=True).exists():
+        # Enregistrer l'événement (sans erreur s'il existe déjà)
+        WebhookEvent.objects.bulk_create(
+            [WebhookEvent(stripe_event_id=event_id, **WebhookQueue.event_fields(event))],
+            ignore_conflicts=True,
+        )
+        
+        try:
+            claimed = self._run_claimed(
+                WebhookEvent.objects.filter(stripe_event_id=event_id, status='pending'),
+                event_type,
+                event,
+            )
+        except Exception as e:
+            logger.error(f"Erreur traitement webhook {event_type}: {e}")
+            WebhookEvent.objects.filter(stripe_event_id=event_id).update(
+                error_message=str(e),
+                retry_count=F('retry_count') + 1,
+            )
+            return False
+        
+        if claimed:
+            return True
+        
+        status = WebhookEvent.objects.filter(
+            stripe_event_id=event_id
+        ).values_list('status', flat=True).first()
+        if status == 'processed':
             logger.info(f"Webhook déjà traité: {event_id}")
             return True
+        logger.info(f"Webhook accepté, toujours en file ({status}): {event_id}")
+        return False
+    
+    def process_stored_event(self, webhook_event) -> bool:
+        """
+        Traite un événement réservé par la file (WebhookQueue).
         
-        # Enregistrer l'événement
-        webhook_event, created = WebhookEvent.objects.get_or_create(
-            stripe_event_id=event_id,
-            defaults={
-                'event_type': event_type,
-                'payload': event,
-            }
+        La finalisation est conditionnée au bail du worker : si le bail a
+        expiré et qu'un autre worker a repris l'événement, rien n'est fait.
+        Lève l'exception du handler en cas d'échec (retentative gérée par la file).
+        
+        Returns:
+            False si l'événement n'appartient plus à ce worker
+        """
+        from apps.payments.models import WebhookEvent
+        
+        claimed = self._run_claimed(
+            WebhookEvent.objects.filter(
+                id=webhook_event.id,
+                status='processing',
+                locked_until=webhook_event.locked_until,
+            ),
+            webhook_event.event_type,
+            webhook_event.payload,
         )
         
-        # Obtenir le handler
-        handler = self.handlers.get(event_type)
+        if claimed:
+            webhook_event.status = 'processed'
+            webhook_event.processed = True
+        return claimed
+    
+    def _run_claimed(self, claim_queryset, event_type, event) -> bool:
+        """
+        Réserve l'événement (UPDATE conditionnel) et exécute son handler
+        dans une seule transaction.
         
-        if not handler:
-            logger.info(f"Webhook non géré: {event_type}")
-            webhook_event.mark_processed()
-            return True
+        Returns:
+            False si un autre traitement a déjà réservé l'événement
+        """
+        handler = self.handlers.get(event_type)
         
-        try:
-            handler(event['data']['object'], event)
-            webhook_event.mark_processed()
-            logger.info(f"Webhook traité: {event_type} ({event_id})")
-            return True
+        with transaction.atomic():
+            claimed = claim_queryset.update(
+                status='processed',
+                processed=True,
+                processed_at=timezone.now(),
+                locked_until=None,
+            )
+            if not claimed:
+                return False
             
-        except Exception as e:
-            logger.error(f"Erreur traitement webhook {event_type}: {e}")
-            webhook_event.error_message = str(e)
-            webhook_event.retry_count += 1
-            webhook_event.save()
-            return False
+            if handler:
+                handler(event['data']['object'], event)
+                logger.info(f"Webhook traité: {event_type} ({event.get('id')})")
+            else:
+                logger.info(f"Webhook non géré: {event_type}")
+        
+        return True
     
     # ==================== Handlers ====================
     
@@ -155,9 +220,8 @@ class WebhookHandler:
         if not subscription_id:
             return
         
-        try:
-            subscription = Subscription.objects.get(stripe_subscription_id=subscription_id)
-        except Subscription.DoesNotExist:
+        subscription = self._lock_subscription(stripe_subscription_id=subscription_id)
+        if subscription is None:
             logger.warning(f"Subscription non trouvée: {subscription_id}")
             return
         
@@ -175,6 +239,9 @@ class WebhookHandler:
             description=f'Renouvellement {subscription.plan.name}',
         )
         
+        if not self._accept_event(subscription, event):
+            return
+        
         # Mettre à jour l'abonnement
         subscription.status = 'active'
         subscription.current_period_start = timezone.now()
@@ -207,9 +274,8 @@ class WebhookHandler:
         if not subscription_id:
             return
         
-        try:
-            subscription = Subscription.objects.get(stripe_subscription_id=subscription_id)
-        except Subscription.DoesNotExist:
+        subscription = self._lock_subscription(stripe_subscription_id=subscription_id)
+        if subscription is None:
             return
         
         # Créer un Payment échoué
@@ -224,6 +290,9 @@ class WebhookHandler:
             error_message=invoice.get('last_payment_error', {}).get('message', 'Paiement échoué'),
         )
         
+        if not self._accept_event(subscription, event):
+            return
+        
         # Mettre à jour le statut
         subscription.status = 'past_due'
         subscription.save()
@@ -243,9 +312,8 @@ class WebhookHandler:
         
         subscription_id = sub_data.get('id')
         
-        try:
-            subscription = Subscription.objects.get(stripe_subscription_id=subscription_id)
-        except Subscription.DoesNotExist:
+        subscription = self._lock_subscription(stripe_subscription_id=subscription_id)
+        if subscription is None or not self._accept_event(subscription, event):
             return
         
         # Mettre à jour le statut
@@ -290,9 +358,8 @@ class WebhookHandler:
         
         subscription_id = sub_data.get('id')
         
-        try:
-            subscription = Subscription.objects.get(stripe_subscription_id=subscription_id)
-        except Subscription.DoesNotExist:
+        subscription = self._lock_subscription(stripe_subscription_id=subscription_id)
+        if subscription is None or not self._accept_event(subscription, event):
             return
         
         subscription.status = 'cancelled'
@@ -323,12 +390,14 @@ class WebhookHandler:
         from apps.payments.models import Payment
         payment = Payment.objects.filter(stripe_customer_id=customer_id).first()
         
-        if not payment:
+        user = User.objects.filter(stripe_customer_id=customer_id).first() if customer_id else None
+        if user is None and payment:
+            user = payment.user
+        
+        if user is None:
             logger.warning(f"User non trouvé pour customer: {customer_id}")
             return
         
-        user = payment.user
-        
         # Trouver le plan via le price_id
         price_id = sub_data.get('items', {}).get('data', [{}])[0].get('price', {}).get('id')
         
@@ -336,12 +405,18 @@ class WebhookHandler:
             plan = SubscriptionPlan.objects.get(stripe_price_id=price_id)
         except SubscriptionPlan.DoesNotExist:
             # Utiliser le plan du payment
-            if payment.subscription_plan:
+            if payment and payment.subscription_plan:
                 plan = payment.subscription_plan
             else:
                 logger.warning(f"Plan non trouvé pour price: {price_id}")
                 return
         
+        # Un événement plus récent a déjà été appliqué à cet abonnement
+        existing = self._lock_subscription(user=user)
+        if existing and existing.stripe_subscription_id == sub_data.get('id'):
+            if not self._accept_event(existing, event):
+                return
+        
         # Créer ou mettre à jour l'abonnement
         Subscription.objects.update_or_create(
             user=user,
@@ -349,6 +424,7 @@ class WebhookHandler:
                 'plan': plan,
                 'status': 'active',
                 'stripe_subscription_id': sub_data.get('id'),
+                'last_stripe_event_at': self._event_time(event),
                 'stripe_customer_id': customer_id,
                 'current_period_start': timezone.datetime.fromtimestamp(
                     sub_data.get('current_period_start', timezone.now().timestamp()),
@@ -368,6 +444,46 @@ class WebhookHandler:
     
     # ==================== Helpers ====================
     
+    @staticmethod
+    def _event_time(event: dict):
+        """Date de création de l'événement chez Stripe (None si absente)."""
+        created = event.get('created')
+        if not created:
+            return None
+        return timezone.datetime.fromtimestamp(created, tz=timezone.utc)
+    
+    def _lock_subscription(self, **lookup):
+        """
+        Abonnement verrouillé (SELECT ... FOR UPDATE) jusqu'à la fin de la
+        transaction du handler, ou None.
+        """
+        from apps.payments.models import Subscription
+        
+        return Subscription.objects.select_for_update().filter(**lookup).first()
+    
+    def _accept_event(self, subscription, event: dict) -> bool:
+        """
+        Vérifie qu'un événement plus récent n'a pas déjà été appliqué à
+        l'abonnement, et enregistre sa date (sauvegardée par l'appelant).
+        
+        Returns:
+            False si l'événement est périmé et doit être ignoré
+        """
+        event_time = self._event_time(event)
+        if event_time is None:
+            return True
+        
+        last = subscription.last_stripe_event_at
+        if last and event_time < last:
+            logger.info(
+                f"Webhook périmé ignoré: {event.get('type')} ({event.get('id')}) "
+                f"pour {subscription.stripe_subscription_id}"
+            )
+            return False
+        
+        subscription.last_stripe_event_at = event_time
+        return True
+    
     def _activate_subscription(self, payment, session: dict):
         """Active l'abonnement après checkout réussi."""
         from apps.payments.models import Subscription
@@ -426,7 +542,7 @@ class WebhookHandler:
         
         if credits:
             post_credit, _ = PostCredit.objects.get_or_create(user=user)
-            post_credit.add_credits(credits, source=f'Achat pack - Payment {payment.id}')
+            post_credit.add_credits(credits, source=f'Achat pack - Payment {payment.id}', payment=payment)
             
             logger.info(f"Crédité {credits} crédits pour {user.email}")
     
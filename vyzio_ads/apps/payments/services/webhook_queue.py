@@ -0,0 +1,234 @@
+"""
+File de traitement des webhooks Stripe.
+Phase 6 - Paiements
+
+La vue webhook vérifie la signature, enregistre l'événement (WebhookEvent)
+et répond 200 immédiatement. Les événements sont ensuite traités par :
+- une tâche Celery (STRIPE_WEBHOOK_DISPATCH = 'celery', défaut)
+- ou la commande `process_webhooks` qui interroge la base (dev)
+
+Chaque worker réserve des événements avec SELECT ... FOR UPDATE SKIP LOCKED,
+les échecs sont retentés avec un backoff exponentiel (retry_count) puis
+passent en 'dead' (rejouables depuis l'admin).
+
+Ordre par objet : les événements sont partitionnés par objet Stripe
+(abonnement, à défaut client). Un événement n'est réservé que si aucun
+événement plus ancien du même objet n'est encore en attente ou en cours :
+un abonnement est traité en série, des abonnements différents en parallèle.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    """
+    Réservation, traitement et reprise des WebhookEvent.
+    """
+
+    # Nombre de tentatives avant le passage en 'dead'
+    MAX_ATTEMPTS = getattr(settings, 'STRIPE_WEBHOOK_MAX_ATTEMPTS', 8)
+    # Délai de la première nouvelle tentative, doublé à chaque échec (secondes)
+    BACKOFF_BASE = getattr(settings, 'STRIPE_WEBHOOK_BACKOFF_BASE', 30)
+    BACKOFF_MAX = getattr(settings, 'STRIPE_WEBHOOK_BACKOFF_MAX', 60 * 60 * 6)
+    # Durée du bail d'un worker sur un événement (secondes)
+    LEASE_SECONDS = getattr(settings, 'STRIPE_WEBHOOK_LEASE_SECONDS', 300)
+    BATCH_SIZE = 20
+
+    @staticmethod
+    def partition_key(event: dict) -> str:
+        """
+        Objet Stripe dont l'événement modifie l'état.
+        Chaîne vide si l'événement n'a pas besoin d'être ordonné.
+        """
+        event_type = event.get('type', '')
+        obj = (event.get('data') or {}).get('object') or {}
+
+        if event_type.startswith('customer.subscription.'):
+            return obj.get('id') or ''
+        if event_type.startswith('invoice.'):
+            return obj.get('subscription') or obj.get('customer') or ''
+        if event_type == 'checkout.session.completed':
+            return obj.get('subscription') or ''
+        return ''
+
+    @staticmethod
+    def event_fields(event: dict) -> dict:
+        """Champs d'un WebhookEvent (hors stripe_event_id) pour un événement"""
+        created = event.get('created')
+        return {
+            'event_type': event.get('type', ''),
+            'payload': event,
+            'object_id': WebhookQueue.partition_key(event),
+            'event_created': datetime.fromtimestamp(created, tz=dt_timezone.utc) if created else None,
+        }
+
+    @staticmethod
+    def enqueue(event: dict):
+        """
+        Enregistre un événement vérifié et planifie son traitement.
+        Un événement déjà reçu (renvoi Stripe) n'est pas dupliqué.
+
+        Returns:
+            WebhookEvent
+        """
+        from apps.payments.models import WebhookEvent
+
+        webhook_event, created = WebhookEvent.objects.get_or_create(
+            stripe_event_id=event.get('id'),
+            defaults=WebhookQueue.event_fields(event),
+        )
+
+        if created:
+            transaction.on_commit(lambda: WebhookQueue.dispatch(webhook_event.id))
+
+        return webhook_event
+
+    @staticmethod
+    def dispatch(webhook_event_id):
+        """Déclenche le traitement asynchrone (Celery) si configuré."""
+        if getattr(settings, 'STRIPE_WEBHOOK_DISPATCH', 'celery') != 'celery':
+            return
+
+        from apps.payments.tasks import process_webhook_event
+
+        try:
+            process_webhook_event.delay(str(webhook_event_id))
+        except Exception as e:
+            # Le balayage périodique reprendra l'événement
+            logger.error(f"Impossible de planifier le webhook {webhook_event_id}: {e}")
+
+    @staticmethod
+    def claim_batch(limit=None, event_ids=None) -> list:
+        """
+        Réserve des événements prêts à être traités.
+
+        SKIP LOCKED : plusieurs workers se partagent la file sans se bloquer.
+        Un événement dont le bail a expiré (worker mort) est repris.
+        Un événement attend tant qu'un événement plus ancien du même objet
+        n'est pas terminé ('dead' ne bloque pas), ou qu'un autre est en cours.
+        """
+        from apps.payments.models import WebhookEvent
+
+        now = timezone.now()
+
+        blocking = WebhookEvent.objects.filter(
+            object_id=OuterRef('object_id'),
+            status__in=['pending', 'processing'],
+        ).exclude(id=OuterRef('id')).filter(
+            Q(event_created__lt=OuterRef('event_created')) |
+            Q(event_created=OuterRef('event_created'), created_at__lt=OuterRef('created_at')) |
+            Q(status='processing', locked_until__gte=now)
+        )
+        ready = (
+            (Q(status='pending', next_attempt_at__lte=now) |
+             Q(status='processing', locked_until__lt=now)) &
+            (Q(object_id='') | ~Exists(blocking))
+        )
+        locked_until = now + timedelta(seconds=WebhookQueue.LEASE_SECONDS)
+
+        with transaction.atomic():
+            queryset = WebhookEvent.objects.select_for_update(skip_locked=True).filter(ready)
+            if event_ids is not None:
+                queryset = queryset.filter(id__in=event_ids)
+
+            candidates = list(
+                queryset.order_by('event_created', 'created_at')[:limit or WebhookQueue.BATCH_SIZE]
+            )
+
+            # UPDATE conditionnel par ligne : même sans SKIP LOCKED (SQLite),
+            # un événement n'est réservé que par un seul worker, et un seul
+            # événement par objet est en cours à la fois
+            events = []
+            for webhook_event in candidates:
+                won = WebhookEvent.objects.filter(ready, id=webhook_event.id).update(
+                    status='processing',
+                    locked_until=locked_until,
+                )
+                if won:
+                    webhook_event.status = 'processing'
+                    webhook_event.locked_until = locked_until
+                    events.append(webhook_event)
+
+        return events
+
+    @staticmethod
+    def process_batch(limit=None, event_ids=None) -> int:
+        """
+        Réserve et traite un lot d'événements.
+
+        Returns:
+            Nombre d'événements traités avec succès
+        """
+        from apps.payments.services.webhook_handler import WebhookHandler
+
+        handler = WebhookHandler()
+        processed = 0
+
+        for webhook_event in WebhookQueue.claim_batch(limit=limit, event_ids=event_ids):
+            try:
+                if handler.process_stored_event(webhook_event):
+                    processed += 1
+            except Exception as e:
+                logger.error(f"Erreur traitement webhook {webhook_event.event_type}: {e}")
+                WebhookQueue.record_failure(webhook_event, e)
+
+        return processed
+
+    @staticmethod
+    def backoff_delay(retry_count) -> float:
+        """Délai avant la tentative suivante (exponentiel, avec gigue)."""
+        delay = min(WebhookQueue.BACKOFF_BASE * (2 ** (retry_count - 1)), WebhookQueue.BACKOFF_MAX)
+        return delay * random.uniform(0.8, 1.2)
+
+    @staticmethod
+    def record_failure(webhook_event, error):
+        """Planifie une nouvelle tentative, ou passe l'événement en 'dead'."""
+        webhook_event.retry_count += 1
+        webhook_event.error_message = str(error)
+        webhook_event.locked_until = None
+
+        if webhook_event.retry_count >= WebhookQueue.MAX_ATTEMPTS:
+            webhook_event.status = 'dead'
+            logger.error(
+                f"Webhook {webhook_event.stripe_event_id} abandonné après "
+                f"{webhook_event.retry_count} tentatives"
+            )
+        else:
+            webhook_event.status = 'pending'
+            webhook_event.next_attempt_at = timezone.now() + timedelta(
+                seconds=WebhookQueue.backoff_delay(webhook_event.retry_count)
+            )
+
+        webhook_event.save(update_fields=[
+            'retry_count', 'error_message', 'locked_until', 'status', 'next_attempt_at'
+        ])
+
+    @staticmethod
+    def replay(queryset) -> int:
+        """
+        Remet des événements en file (action admin), y compris les 'dead'.
+
+        Returns:
+            Nombre d'événements remis en file
+        """
+        event_ids = list(queryset.exclude(status='processed').values_list('id', flat=True))
+
+        queryset.model.objects.filter(id__in=event_ids).update(
+            status='pending',
+            retry_count=0,
+            error_message='',
+            next_attempt_at=timezone.now(),
+            locked_until=None,
+        )
+
+        for event_id in event_ids:
+            transaction.on_commit(lambda event_id=event_id: WebhookQueue.dispatch(event_id))
+
+        return len(event_ids)
@@ -0,0 +1,23 @@
+"""
+Tâches Celery des paiements.
+"""
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def process_webhook_event(webhook_event_id):
+    """Traite un webhook Stripe dès sa réception."""
+    from apps.payments.services.webhook_queue import WebhookQueue
+
+    return WebhookQueue.process_batch(limit=1, event_ids=[webhook_event_id])
+
+
+@shared_task(ignore_result=True)
+def process_webhook_queue():
+    """
+    Balayage périodique : nouvelles tentatives (backoff) et événements
+    dont le worker est mort.
+    """
+    from apps.payments.services.webhook_queue import WebhookQueue
+
+    return WebhookQueue.process_batch()
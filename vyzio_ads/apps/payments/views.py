@@ -23,6 +23,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django.conf import settings
+import json
 import logging
 
 from .models import (
@@ -36,7 +37,8 @@ from .serializers import (
     CreateSubscriptionCheckoutSerializer, CreatePostCreditCheckoutSerializer,
     CreateSinglePostCheckoutSerializer, CheckoutResponseSerializer, BillingPortalSerializer
 )
-from .services import StripeService, WebhookHandler
+from .services import StripeService, WebhookQueue
+from apps.users.entitlements import EntitlementService
 
 logger = logging.getLogger(__name__)
 
@@ -107,7 +109,7 @@ class CreateSubscriptionCheckoutView(APIView):
             )
         
         # Vérifier si l'utilisateur a déjà un abonnement actif
-        if hasattr(request.user, 'subscription') and request.user.subscription.is_active:
+        if EntitlementService.for_request(request).has_active_subscription:
             return Response(
                 {'error': 'Vous avez déjà un abonnement actif. Annulez-le d\'abord.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -315,6 +317,9 @@ class StripeWebhookView(APIView):
     - Vérification de signature obligatoire
     - Pas d'authentification JWT (Stripe ne peut pas)
     - Idempotence via WebhookEvent
+    
+    L'événement est enregistré puis traité en arrière-plan (WebhookQueue) :
+    la réponse 200 ne dépend pas de la durée du traitement.
     """
     permission_classes = [AllowAny]
     authentication_classes = []  # Pas d'auth pour les webhooks
@@ -331,14 +336,14 @@ class StripeWebhookView(APIView):
             logger.warning("Webhook Stripe avec signature invalide")
             return HttpResponse(status=400)
         
-        # Traiter l'événement
-        webhook_handler = WebhookHandler()
-        success = webhook_handler.process_event(event)
+        # Enregistrer l'événement (payload brut, déjà vérifié)
+        try:
+            event_data = json.loads(payload)
+        except ValueError:
+            return HttpResponse(status=400)
         
-        if success:
-            return HttpResponse(status=200)
-        else:
-            return HttpResponse(status=500)
+        WebhookQueue.enqueue(event_data)
+        return HttpResponse(status=200)
 
 
 # ==================== Dev: Simulate Payment Confirmation ====================
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Review, ReviewPhoto, ReviewReport
+from .models import Review, ReviewPhoto, ReviewReport, SellerRating
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -8,6 +8,12 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'is_approved', 'created_at')
     search_fields = ('reviewer__email', 'seller__email')
 
+@admin.register(SellerRating)
+class SellerRatingAdmin(admin.ModelAdmin):
+    list_display = ('seller', 'rating_count', 'rating_sum', 'updated_at')
+    search_fields = ('seller__email',)
+    readonly_fields = ('seller', 'rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
 @admin.register(ReviewPhoto)
 class ReviewPhotoAdmin(admin.ModelAdmin):
     list_display = ('review', 'image')
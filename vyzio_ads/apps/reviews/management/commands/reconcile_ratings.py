@@ -0,0 +1,35 @@
+"""
+Reconstruction des agrégats de notes vendeurs (SellerRating) depuis les avis.
+
+Les agrégats sont tenus à jour de façon incrémentale par Review.save/delete ;
+les suppressions en cascade ou les update() en masse les contournent.
+
+Usage:
+    python manage.py reconcile_ratings
+    python manage.py reconcile_ratings --dry-run
+
+En production, la tâche Celery `reconcile_seller_ratings` s'en charge.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.reviews.models import SellerRating
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les notes vendeurs (somme, nombre, histogramme) depuis les avis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche les écarts sans corriger')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        wrong = SellerRating.reconcile(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('✅ Aucun écart'))
+            return
+
+        action = 'à corriger' if options['dry_run'] else 'corrigé(s)'
+        self.stdout.write(self.style.WARNING(f'⚠️ {len(wrong)} vendeur(s) {action}'))
+        for seller_id in wrong[:20]:
+            self.stdout.write(f'  {seller_id}')
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_seller_ratings(apps, schema_editor):
+    """Agrégats initiaux depuis les avis approuvés et non signalés."""
+    Review = apps.get_model('reviews', 'Review')
+    SellerRating = apps.get_model('reviews', 'SellerRating')
+
+    rows = Review.objects.filter(is_approved=True, is_flagged=False).order_by().values('seller_id').annotate(
+        rating_count=models.Count('id'),
+        rating_sum=models.Sum('rating'),
+        **{f'rating_{star}': models.Count('id', filter=models.Q(rating=star)) for star in range(1, 6)},
+    )
+    SellerRating.objects.bulk_create([SellerRating(**row) for row in rows.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_stripe_customer_id'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerRating',
+            fields=[
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'reviews_seller_rating',
+            },
+        ),
+        migrations.RunPython(backfill_seller_ratings, migrations.RunPython.noop),
+    ]
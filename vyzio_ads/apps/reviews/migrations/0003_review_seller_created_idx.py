@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0002_seller_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='reviews_seller_created_idx'),
+        ),
+    ]
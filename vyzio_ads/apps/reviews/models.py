@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg
+from django.db.models import Count, F, Q, Sum
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
 User = get_user_model()
@@ -34,38 +35,233 @@ class Review(models.Model):
         unique_together = ('reviewer', 'seller', 'listing')
         indexes = [
             models.Index(fields=['seller', 'rating']),
+            # Pagination par curseur des avis d'un vendeur
+            models.Index(fields=['seller', '-created_at', '-id'], name='reviews_seller_created_idx'),
         ]
     
     def __str__(self):
         return f"Review by {self.reviewer.email} for {self.seller.email} - {self.rating}★"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État chargé : permet de ne toucher aux agrégats que si la note,
+        # l'approbation ou le signalement changent
+        if {'seller_id', 'rating', 'is_approved', 'is_flagged'} <= set(field_names):
+            instance._counted_rating = instance.counted_rating()
+        return instance
+    
+    def counted_rating(self):
+        """(seller_id, note) si l'avis compte dans la note du vendeur, sinon None"""
+        if self.is_approved and not self.is_flagged:
+            return (self.seller_id, self.rating)
+        return None
+    
+    def _stored_counted_rating(self):
+        if self._state.adding:
+            return None
+        if hasattr(self, '_counted_rating'):
+            return self._counted_rating
+        row = Review.objects.filter(pk=self.pk).values_list(
+            'seller_id', 'rating', 'is_approved', 'is_flagged'
+        ).first()
+        if row is None:
+            return None
+        seller_id, rating, is_approved, is_flagged = row
+        return (seller_id, rating) if is_approved and not is_flagged else None
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update seller's average rating
-        self.update_seller_rating()
+        from apps.reviews.services import SellerReputationService
+        
+        with transaction.atomic():
+            previous = self._stored_counted_rating()
+            super().save(*args, **kwargs)
+            current = self.counted_rating()
+            if previous != current:
+                SellerRating.apply(previous, current)
+            # Toute écriture (note, réponse du vendeur...) change la réputation
+            SellerReputationService.invalidate(self.seller_id, previous and previous[0])
+        self._counted_rating = current
     
     def delete(self, *args, **kwargs):
-        seller = self.seller
-        super().delete(*args, **kwargs)
-        # Update seller's average rating after deletion
-        self._update_seller_rating_static(seller)
+        from apps.reviews.services import SellerReputationService
+        
+        with transaction.atomic():
+            previous = self._stored_counted_rating()
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                SellerRating.apply(previous, None)
+            SellerReputationService.invalidate(self.seller_id)
+        return result
+
+
+class SellerRating(models.Model):
+    """
+    Agrégats des notes d'un vendeur (avis approuvés et non signalés).
+    
+    Mis à jour de façon incrémentale (F()) quand un avis est créé, supprimé,
+    ou change de note / d'approbation / de signalement. CustomUser.avg_rating
+    et total_reviews en sont dérivés. `rebuild` les recalcule depuis les
+    avis (commande reconcile_ratings, tâche périodique).
+    """
+    
+    STAR_FIELDS = {star: f'rating_{star}' for star in range(1, 6)}
+    
+    seller = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats'
+    )
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'reviews_seller_rating'
+    
+    def __str__(self):
+        return f"Rating {self.seller_id}: {self.average} ({self.rating_count})"
     
-    def update_seller_rating(self):
-        """Update seller's average rating"""
-        self._update_seller_rating_static(self.seller)
+    @property
+    def average(self):
+        return self.compute_average(self.rating_sum, self.rating_count)
+    
+    @property
+    def distribution(self):
+        """Histogramme {'1': n, ..., '5': n}"""
+        return {str(star): getattr(self, field) for star, field in self.STAR_FIELDS.items()}
     
     @staticmethod
-    def _update_seller_rating_static(seller):
-        """Static method to update seller rating"""
-        reviews = Review.objects.filter(seller=seller, is_approved=True, is_flagged=False)
-        if reviews.exists():
-            avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
-            seller.avg_rating = round(avg_rating, 2) if avg_rating else 0
-            seller.total_reviews = reviews.count()
-        else:
-            seller.avg_rating = 0
-            seller.total_reviews = 0
-        seller.save(update_fields=['avg_rating', 'total_reviews'])
+    def compute_average(rating_sum, rating_count):
+        if not rating_count:
+            return Decimal('0.00')
+        return (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    @classmethod
+    def for_seller(cls, seller_id):
+        """Agrégats d'un vendeur (instance vide non enregistrée s'il n'a aucun avis)."""
+        return cls.objects.filter(seller_id=seller_id).first() or cls(seller_id=seller_id)
+    
+    @classmethod
+    def apply(cls, previous, current):
+        """
+        Retire l'ancienne note comptée et ajoute la nouvelle.
+        
+        Args:
+            previous: (seller_id, note) compté avant l'écriture, ou None
+            current: (seller_id, note) compté après l'écriture, ou None
+        """
+        changes = {}
+        for counted, sign in ((previous, -1), (current, 1)):
+            if counted is None:
+                continue
+            seller_id, rating = counted
+            deltas = changes.setdefault(seller_id, {'rating_count': 0, 'rating_sum': 0})
+            deltas['rating_count'] += sign
+            deltas['rating_sum'] += sign * rating
+            field = cls.STAR_FIELDS[rating]
+            deltas[field] = deltas.get(field, 0) + sign
+        
+        with transaction.atomic():
+            for seller_id, deltas in changes.items():
+                updates = {name: F(name) + delta for name, delta in deltas.items() if delta}
+                if not updates:
+                    continue
+                if not cls.objects.filter(seller_id=seller_id).update(**updates):
+                    cls.objects.bulk_create([cls(seller_id=seller_id)], ignore_conflicts=True)
+                    cls.objects.filter(seller_id=seller_id).update(**updates)
+                # La ligne reste verrouillée jusqu'au commit : lecture cohérente
+                rating_sum, rating_count = cls.objects.filter(seller_id=seller_id).values_list(
+                    'rating_sum', 'rating_count'
+                ).get()
+                User.objects.filter(pk=seller_id).update(
+                    avg_rating=cls.compute_average(rating_sum, rating_count),
+                    total_reviews=rating_count,
+                )
+    
+    @classmethod
+    def rebuild(cls, seller_ids=None, dry_run=False) -> list:
+        """
+        Recalcule les agrégats depuis les avis (une requête groupée).
+        
+        Args:
+            seller_ids: Vendeurs à recalculer (None = tous)
+            dry_run: Ne corrige rien, retourne seulement les écarts
+        
+        Returns:
+            Ids des vendeurs dont les agrégats étaient faux
+        """
+        reviews = Review.objects.filter(is_approved=True, is_flagged=False)
+        stored = cls.objects.all()
+        users = User.objects.filter(Q(total_reviews__gt=0) | Q(avg_rating__gt=0))
+        if seller_ids is not None:
+            reviews = reviews.filter(seller_id__in=seller_ids)
+            stored = stored.filter(seller_id__in=seller_ids)
+            users = users.filter(pk__in=seller_ids)
+        
+        fields = ['rating_count', 'rating_sum', *cls.STAR_FIELDS.values()]
+        expected = {
+            row.pop('seller_id'): row
+            for row in reviews.order_by().values('seller_id').annotate(
+                rating_count=Count('id'),
+                rating_sum=Sum('rating'),
+                **{field: Count('id', filter=Q(rating=star)) for star, field in cls.STAR_FIELDS.items()},
+            )
+        }
+        current = {row.pop('seller_id'): row for row in stored.values('seller_id', *fields)}
+        user_values = {
+            pk: (avg_rating, total_reviews)
+            for pk, avg_rating, total_reviews in users.values_list('pk', 'avg_rating', 'total_reviews')
+        }
+        
+        empty = dict.fromkeys(fields, 0)
+        wrong = []
+        for seller_id in set(expected) | set(current) | set(user_values):
+            values = expected.get(seller_id, empty)
+            user_expected = (cls.compute_average(values['rating_sum'], values['rating_count']), values['rating_count'])
+            if current.get(seller_id, empty) != values or user_values.get(seller_id, (0, 0)) != user_expected:
+                wrong.append(seller_id)
+        
+        if dry_run or not wrong:
+            return wrong
+        
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(seller_id=seller_id, **expected.get(seller_id, empty)) for seller_id in wrong],
+                update_conflicts=True,
+                unique_fields=['seller'],
+                update_fields=fields,
+            )
+            for seller_id in wrong:
+                values = expected.get(seller_id, empty)
+                User.objects.filter(pk=seller_id).update(
+                    avg_rating=cls.compute_average(values['rating_sum'], values['rating_count']),
+                    total_reviews=values['rating_count'],
+                )
+        
+        from apps.reviews.services import SellerReputationService
+        SellerReputationService.invalidate(*wrong)
+        return wrong
+    
+    @classmethod
+    def reconcile(cls, chunk_size=1000, dry_run=False) -> list:
+        """Reconstruit les agrégats de tous les vendeurs, par lots d'utilisateurs."""
+        wrong = []
+        last_pk = None
+        while True:
+            users = User.objects.order_by('pk')
+            if last_pk is not None:
+                users = users.filter(pk__gt=last_pk)
+            seller_ids = list(users.values_list('pk', flat=True)[:chunk_size])
+            if not seller_ids:
+                break
+            wrong.extend(cls.rebuild(seller_ids=seller_ids, dry_run=dry_run))
+            last_pk = seller_ids[-1]
+        return wrong
 
 
 class ReviewPhoto(models.Model):
@@ -24,6 +24,9 @@ class ReviewSerializer(serializers.ModelSerializer):
                            'seller_response_date', 'is_verified_buyer', 'is_flagged')
     
     def get_reports_count(self, obj):
+        # Annoté par les requêtes de liste (Count('reports'))
+        if hasattr(obj, 'reports_count'):
+            return obj.reports_count
         return obj.reports.count()
 
 
@@ -119,5 +122,6 @@ class SellerReputationSerializer(serializers.Serializer):
     avg_rating = serializers.DecimalField(max_digits=3, decimal_places=2)
     total_reviews = serializers.IntegerField()
     rating_distribution = serializers.DictField()
+    response_rate = serializers.FloatField()
     badges = serializers.ListField(child=serializers.CharField())
     recent_reviews = ReviewSerializer(many=True)
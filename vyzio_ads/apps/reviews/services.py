@@ -0,0 +1,218 @@
+"""
+Services des avis.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+import base64
+import binascii
+import uuid
+
+
+def encode_review_cursor(created_at, review_id):
+    """Curseur opaque sur (created_at, id)"""
+    raw = f'{created_at.isoformat()}|{review_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_review_cursor(cursor):
+    """
+    Returns:
+        (created_at, id) — ValueError si le curseur est invalide
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, review_id = raw.split('|', 1)
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            raise ValueError(cursor)
+        return parsed, uuid.UUID(review_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(cursor) from e
+
+
+class SellerReviewService:
+    """
+    Avis publiés d'un vendeur, du plus récent au plus ancien.
+
+    Lus via l'index (seller, -created_at, -id) de Review ; nombre de
+    signalements annoté et photos préchargées : nombre de requêtes constant
+    quelle que soit la taille de la page.
+    """
+
+    PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    def queryset(seller_id):
+        from apps.reviews.models import Review
+
+        return Review.objects.filter(
+            seller_id=seller_id, is_approved=True, is_flagged=False
+        ).select_related('reviewer').prefetch_related('photos').annotate(
+            reports_count=Count('reports')
+        ).order_by('-created_at', '-id')
+
+    @staticmethod
+    def page(seller_id, cursor=None, limit=PAGE_SIZE):
+        """
+        Page d'avis.
+
+        Args:
+            seller_id: Vendeur
+            cursor: Curseur renvoyé par la page précédente (next_cursor)
+            limit: Taille de la page
+
+        Returns:
+            (avis, next_cursor) — next_cursor vaut None sur la dernière page
+
+        Raises:
+            ValueError: si le curseur est invalide
+        """
+        queryset = SellerReviewService.queryset(seller_id)
+        if cursor:
+            created_at, review_id = decode_review_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=review_id)
+            )
+
+        reviews = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(reviews) > limit:
+            reviews = reviews[:limit]
+            next_cursor = encode_review_cursor(reviews[-1].created_at, reviews[-1].id)
+        return reviews, next_cursor
+
+
+class SellerReputationService:
+    """
+    Réputation des vendeurs (distribution, badges, taux de réponse).
+
+    Instantané par vendeur construit depuis SellerRating, mis en cache sous
+    une clé versionnée : changer VERSION (règles de badges, format) invalide
+    tous les instantanés. Supprimé à chaque événement d'avis (création,
+    modification, réponse, suppression) et reconstruit à la lecture suivante.
+    """
+
+    VERSION = 1
+    CACHE_TTL = getattr(settings, 'SELLER_REPUTATION_TTL', 60 * 60)
+    MAX_BATCH = 100
+
+    @staticmethod
+    def _key(seller_id):
+        return f'reviews:reputation:v{SellerReputationService.VERSION}:{seller_id}'
+
+    @staticmethod
+    def get(seller_id) -> dict:
+        """Instantané de réputation d'un vendeur."""
+        return SellerReputationService.get_many([seller_id])[str(seller_id)]
+
+    @staticmethod
+    def get_many(seller_ids) -> dict:
+        """
+        Instantanés de plusieurs vendeurs (cartes d'annonces).
+
+        Un seul aller-retour cache ; les manquants sont calculés ensemble
+        (deux requêtes au plus) puis remis en cache.
+
+        Returns:
+            {seller_id (str): instantané}
+        """
+        from django.core.cache import cache
+
+        seller_ids = list(dict.fromkeys(str(seller_id) for seller_id in seller_ids))
+        keys = {SellerReputationService._key(seller_id): seller_id for seller_id in seller_ids}
+        cached = cache.get_many(list(keys))
+        snapshots = {keys[key]: value for key, value in cached.items()}
+
+        missing = [seller_id for seller_id in seller_ids if seller_id not in snapshots]
+        if missing:
+            computed = SellerReputationService._compute(missing)
+            cache.set_many(
+                {SellerReputationService._key(seller_id): value for seller_id, value in computed.items()},
+                SellerReputationService.CACHE_TTL,
+            )
+            snapshots.update(computed)
+
+        return {seller_id: snapshots[seller_id] for seller_id in seller_ids}
+
+    @staticmethod
+    def _compute(seller_ids) -> dict:
+        from apps.reviews.models import Review, SellerRating
+
+        ratings = {
+            str(rating.seller_id): rating
+            for rating in SellerRating.objects.filter(seller_id__in=seller_ids)
+        }
+        reviewed = [seller_id for seller_id, rating in ratings.items() if rating.rating_count]
+        responded = {}
+        if reviewed:
+            responded = {
+                str(seller_id): count
+                for seller_id, count in Review.objects.filter(
+                    seller_id__in=reviewed, is_approved=True, is_flagged=False
+                ).exclude(seller_response='').order_by().values('seller_id').annotate(
+                    n=Count('id')
+                ).values_list('seller_id', 'n')
+            }
+
+        return {
+            seller_id: SellerReputationService.snapshot(
+                seller_id,
+                ratings.get(seller_id) or SellerRating(seller_id=seller_id),
+                responded.get(seller_id, 0),
+            )
+            for seller_id in seller_ids
+        }
+
+    @staticmethod
+    def snapshot(seller_id, rating, responded) -> dict:
+        """Instantané sérialisable (cache, réponse API)."""
+        total = rating.rating_count
+        average = rating.average
+        response_rate = responded / total if total else 0.0
+        return {
+            'seller_id': str(seller_id),
+            'avg_rating': float(average),
+            'total_reviews': total,
+            'rating_distribution': rating.distribution,
+            'response_rate': round(response_rate, 2),
+            'badges': SellerReputationService.badges(total, average, response_rate),
+        }
+
+    @staticmethod
+    def badges(total_reviews, avg_rating, response_rate) -> list:
+        """Badges d'un vendeur"""
+        badges = []
+
+        # Badge: Nouveau vendeur
+        if total_reviews == 0:
+            badges.append('new_seller')
+
+        # Badge: Vendeur vérifié (plus de 10 avis)
+        if total_reviews >= 10:
+            badges.append('verified_seller')
+
+        # Badge: Top vendeur (plus de 50 avis avec note >= 4.5)
+        if total_reviews >= 50 and avg_rating >= 4.5:
+            badges.append('top_seller')
+
+        # Badge: Excellente réputation (note >= 4.8)
+        if total_reviews >= 5 and avg_rating >= 4.8:
+            badges.append('excellent_reputation')
+
+        # Badge: Super réactif (répond à plus de 80% des avis)
+        if total_reviews >= 5 and response_rate >= 0.8:
+            badges.append('responsive_seller')
+
+        return badges
+
+    @staticmethod
+    def invalidate(*seller_ids):
+        """Supprime les instantanés en cache (après commit de la transaction)."""
+        from django.core.cache import cache
+
+        keys = [SellerReputationService._key(seller_id) for seller_id in seller_ids if seller_id]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
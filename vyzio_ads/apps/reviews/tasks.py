@@ -0,0 +1,18 @@
+"""
+Tâches Celery des avis.
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def reconcile_seller_ratings():
+    """Reconstruit les agrégats de notes vendeurs qui ont dérivé."""
+    from apps.reviews.models import SellerRating
+
+    wrong = SellerRating.reconcile()
+    if wrong:
+        logger.warning(f"Notes vendeurs corrigées: {len(wrong)}")
+    return len(wrong)
@@ -3,6 +3,7 @@ Tests unitaires pour le système d'avis, favoris et réputation
 Phase 8 - Avis, favoris et réputation
 """
 import pytest
+import uuid
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -10,7 +11,8 @@ from decimal import Decimal
 
 from apps.users.models import CustomUser, SellerProfile
 from apps.listings.models import Listing, Category, Favorite as ListingFavorite
-from apps.reviews.models import Review, ReviewReport, FavoriteSeller
+from apps.reviews.models import Review, ReviewReport, FavoriteSeller, SellerRating
+from apps.reviews.services import SellerReputationService
 
 
 # Helper pour les URLs
@@ -27,6 +29,21 @@ def api_client():
     return APIClient()
 
 
+@pytest.fixture
+def locmem_cache(settings):
+    """Cache réel (LocMem) : le cache de test est factice"""
+    from django.core.cache import cache
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'reviews-tests',
+        }
+    }
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
 @pytest.fixture
 def create_user(db):
     """Factory pour créer des utilisateurs"""
@@ -219,6 +236,64 @@ class TestReviewModel:
         assert seller.total_reviews == 1
 
 
+@pytest.mark.django_db
+class TestSellerRating:
+    """Tests des agrégats de notes incrémentaux"""
+    
+    def test_histogram_follows_review_lifecycle(self, buyer, seller, another_buyer):
+        """Création, changement de note, signalement et suppression"""
+        first = Review.objects.create(reviewer=buyer, seller=seller, rating=5)
+        second = Review.objects.create(reviewer=another_buyer, seller=seller, rating=2)
+        
+        stats = SellerRating.for_seller(seller.id)
+        assert (stats.rating_count, stats.rating_sum) == (2, 7)
+        assert stats.distribution == {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1}
+        assert stats.average == Decimal('3.50')
+        
+        second.rating = 4
+        second.save()
+        stats = SellerRating.for_seller(seller.id)
+        assert stats.distribution == {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1}
+        assert stats.average == Decimal('4.50')
+        
+        second.is_flagged = True
+        second.save()
+        stats = SellerRating.for_seller(seller.id)
+        assert (stats.rating_count, stats.rating_4) == (1, 0)
+        
+        first.delete()
+        stats = SellerRating.for_seller(seller.id)
+        assert (stats.rating_count, stats.rating_sum) == (0, 0)
+        seller.refresh_from_db()
+        assert seller.avg_rating == Decimal('0.00')
+        assert seller.total_reviews == 0
+    
+    def test_seller_response_does_not_touch_aggregates(self, review, django_assert_num_queries):
+        """Une réponse du vendeur ne recalcule rien"""
+        review = Review.objects.get(pk=review.pk)
+        review.seller_response = 'Merci !'
+        # SAVEPOINT + UPDATE de l'avis + RELEASE : aucune requête d'agrégat
+        with django_assert_num_queries(3):
+            review.save()
+    
+    def test_reconcile_fixes_drift(self, buyer, seller, another_buyer):
+        """Le reconciler corrige les agrégats qui ont dérivé"""
+        Review.objects.create(reviewer=buyer, seller=seller, rating=5)
+        Review.objects.create(reviewer=another_buyer, seller=seller, rating=3)
+        # update() en masse : contourne Review.save
+        Review.objects.filter(seller=seller, rating=3).update(rating=1)
+        
+        assert SellerRating.reconcile(dry_run=True) == [seller.id]
+        assert SellerRating.for_seller(seller.id).rating_3 == 1
+        
+        assert SellerRating.reconcile() == [seller.id]
+        stats = SellerRating.for_seller(seller.id)
+        assert (stats.rating_1, stats.rating_3, stats.rating_sum) == (1, 0, 6)
+        seller.refresh_from_db()
+        assert seller.avg_rating == Decimal('3.00')
+        assert SellerRating.reconcile() == []
+
+
 @pytest.mark.django_db
 class TestReviewReportModel:
     """Tests pour le modèle ReviewReport"""
@@ -312,6 +387,37 @@ class TestReviewViewSet:
         assert response.data['rating'] == 5
         assert Review.objects.filter(reviewer=buyer, seller=seller).exists()
     
+    def test_verified_buyer_from_purchase_relation(self, buyer_client, seller, listing):
+        """Acheteur vérifié : relation d'achat enregistrée"""
+        from django.utils import timezone
+        from apps.orders.models import PurchaseRelation
+        client, buyer = buyer_client
+        url = review_url('reviews-list')
+        
+        response = client.post(url, {'seller_id': str(seller.id), 'rating': 4}, format='json')
+        assert response.data['is_verified_buyer'] is False
+        
+        PurchaseRelation.objects.create(buyer=buyer, seller=seller, listing=listing, purchased_at=timezone.now())
+        response = client.post(url, {
+            'seller_id': str(seller.id), 'listing_id': str(listing.id), 'rating': 5
+        }, format='json')
+        assert response.data['is_verified_buyer'] is True
+    
+    def test_can_review(self, buyer_client, seller, listing, django_assert_num_queries):
+        """Éligibilité à l'avis pour l'interface"""
+        client, buyer = buyer_client
+        url = review_url('reviews-can-review')
+        
+        with django_assert_num_queries(2):
+            response = client.get(url, {'seller_id': str(seller.id), 'listing_id': str(listing.id)})
+        assert response.data == {'can_review': True, 'already_reviewed': False, 'is_verified_buyer': False}
+        
+        Review.objects.create(reviewer=buyer, seller=seller, listing=listing, rating=5)
+        response = client.get(url, {'seller_id': str(seller.id), 'listing_id': str(listing.id)})
+        assert response.data['can_review'] is False
+        
+        assert client.get(url, {'seller_id': 'invalide'}).status_code == status.HTTP_400_BAD_REQUEST
+    
     def test_create_review_unauthenticated(self, api_client, seller):
         """Test création d'avis sans authentification"""
         url = review_url('reviews-list')
@@ -362,6 +468,61 @@ class TestReviewViewSet:
         assert 'reviews' in response.data
         assert 'average_rating' in response.data
         assert 'rating_distribution' in response.data
+    
+    def test_seller_reviews_cursor_pagination(self, api_client, seller, create_user):
+        """Pages par curseur, nombre de requêtes indépendant de la taille de page"""
+        from apps.reviews.models import ReviewPhoto
+        
+        reviews = []
+        for i in range(7):
+            user = create_user(email=f'reviewer{i}@example.com', username=f'reviewer{i}')
+            reviews.append(Review.objects.create(reviewer=user, seller=seller, rating=4))
+            ReviewPhoto.objects.create(review=reviews[-1], image=f'review_photos/{i}.jpg')
+        ReviewReport.objects.create(review=reviews[-1], reporter=reviews[0].reviewer, reason='spam')
+        
+        url = review_url('reviews-seller-reviews')
+        seen = []
+        cursor = None
+        while True:
+            params = {'seller_id': str(seller.id), 'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = api_client.get(url, params)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data['count'] == 7
+            seen.extend(review['id'] for review in response.data['reviews'])
+            cursor = response.data['next_cursor']
+            assert response.data['has_more'] is (cursor is not None)
+            if not cursor:
+                break
+        
+        assert seen == [str(review.id) for review in reversed(reviews)]
+        
+        first = api_client.get(url, {'seller_id': str(seller.id), 'limit': 3}).data['reviews'][0]
+        assert first['reports_count'] == 1
+        assert len(first['photos']) == 1
+    
+    def test_seller_reviews_constant_queries(
+        self, api_client, seller, create_user, django_assert_num_queries
+    ):
+        """Signalements annotés et photos préchargées : pas de N+1"""
+        for i in range(10):
+            user = create_user(email=f'reviewer{i}@example.com', username=f'reviewer{i}')
+            Review.objects.create(reviewer=user, seller=seller, rating=5)
+        url = review_url('reviews-seller-reviews')
+        
+        # Avis (+ nombre de signalements), photos, agrégats du vendeur
+        with django_assert_num_queries(3):
+            api_client.get(url, {'seller_id': str(seller.id), 'limit': 2})
+        with django_assert_num_queries(3):
+            response = api_client.get(url, {'seller_id': str(seller.id), 'limit': 10})
+        assert len(response.data['reviews']) == 10
+    
+    def test_seller_reviews_invalid_cursor(self, api_client, seller):
+        """Curseur invalide"""
+        url = review_url('reviews-seller-reviews')
+        response = api_client.get(url, {'seller_id': str(seller.id), 'cursor': 'invalide'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
 @pytest.mark.django_db
@@ -478,6 +639,66 @@ class TestSellerReputation:
         seller.refresh_from_db()
         assert seller.total_reviews == 10
         assert seller.avg_rating >= Decimal('4.5')
+    
+    def test_reputation_snapshot_cached_and_invalidated(
+        self, seller, review, another_buyer, locmem_cache,
+        django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        """Instantané en cache, supprimé à chaque événement d'avis"""
+        with django_assert_num_queries(2):
+            snapshot = SellerReputationService.get(seller.id)
+        assert snapshot['total_reviews'] == 1
+        assert snapshot['response_rate'] == 0.0
+        
+        with django_assert_num_queries(0):
+            assert SellerReputationService.get(seller.id) == snapshot
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            review.seller_response = 'Merci !'
+            review.save()
+            Review.objects.create(reviewer=another_buyer, seller=seller, rating=1)
+        
+        snapshot = SellerReputationService.get(seller.id)
+        assert snapshot['total_reviews'] == 2
+        assert snapshot['response_rate'] == 0.5
+        assert snapshot['rating_distribution']['1'] == 1
+    
+    def test_responsive_seller_badge(self, seller, create_user):
+        """Badge réactif : réponse à au moins 80% des avis"""
+        for i in range(5):
+            user = create_user(email=f'reviewer{i}@example.com', username=f'reviewer{i}')
+            Review.objects.create(
+                reviewer=user, seller=seller, rating=5,
+                seller_response='Merci' if i < 4 else ''
+            )
+        
+        snapshot = SellerReputationService.get(seller.id)
+        assert snapshot['response_rate'] == 0.8
+        assert 'responsive_seller' in snapshot['badges']
+        assert 'excellent_reputation' in snapshot['badges']
+    
+    def test_batch_reputations_endpoint(
+        self, api_client, seller, buyer, review, locmem_cache, django_assert_max_num_queries
+    ):
+        """Réputation de plusieurs vendeurs en une requête"""
+        url = review_url('reviews-reputations')
+        seller_ids = f'{seller.id},{buyer.id}'
+        
+        with django_assert_max_num_queries(2):
+            response = api_client.get(url, {'seller_ids': seller_ids})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results']
+        assert results[str(seller.id)]['total_reviews'] == 1
+        assert results[str(buyer.id)]['badges'] == ['new_seller']
+        
+        # Deuxième appel : servi par le cache
+        with django_assert_max_num_queries(0):
+            api_client.get(url, {'seller_ids': seller_ids})
+        
+        response = api_client.get(url, {'seller_ids': 'pas-un-uuid'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = api_client.get(url, {'seller_ids': ''})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
 # ==================== TESTS API FAVORIS ====================
@@ -567,6 +788,70 @@ class TestFavoriteListingViewSet:
         
         assert response.status_code == status.HTTP_200_OK
         assert response.data['is_favorite'] is True
+    
+    def test_check_many_listing_favorites(
+        self, buyer_client, listing, another_listing, buyer, django_assert_num_queries
+    ):
+        """Annonces en favori parmi une liste, en une requête"""
+        client, _ = buyer_client
+        ListingFavorite.objects.create(user=buyer, listing=listing)
+        
+        url = review_url('favorite-listings-check-many')
+        with django_assert_num_queries(1):
+            response = client.get(url, {'ids': f'{listing.id},{another_listing.id}'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['favorite_ids'] == [str(listing.id)]
+    
+    def test_favorites_count_follows_toggles(self, buyer_client, listing):
+        """favorites_count ajusté à chaque ajout / retrait"""
+        client, _ = buyer_client
+        url = review_url('favorite-listings-toggle')
+        
+        client.post(url, {'listing_id': str(listing.id)}, format='json')
+        listing.refresh_from_db()
+        assert listing.favorites_count == 1
+        
+        client.post(url, {'listing_id': str(listing.id)}, format='json')
+        listing.refresh_from_db()
+        assert listing.favorites_count == 0
+        
+        response = client.post(review_url('favorite-listings-list'), {'listing_id': str(listing.id)}, format='json')
+        listing.refresh_from_db()
+        assert listing.favorites_count == 1
+        
+        client.delete(review_url('favorite-listings-detail', pk=response.data['id']))
+        listing.refresh_from_db()
+        assert listing.favorites_count == 0
+    
+    def test_reconcile_favorites_count(self, buyer, another_buyer, listing, another_listing):
+        """Le reconciler recalcule les compteurs faux"""
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.listings.services.favorites import FavoriteService
+        
+        # Écritures directes : compteurs non maintenus
+        ListingFavorite.objects.create(user=buyer, listing=listing)
+        ListingFavorite.objects.create(user=another_buyer, listing=listing)
+        Listing.objects.filter(pk=another_listing.pk).update(favorites_count=5)
+        
+        assert set(FavoriteService.reconcile_counts(dry_run=True)) == {listing.id, another_listing.id}
+        call_command('reconcile_favorites', stdout=StringIO())
+        
+        listing.refresh_from_db()
+        another_listing.refresh_from_db()
+        assert (listing.favorites_count, another_listing.favorites_count) == (2, 0)
+        assert FavoriteService.reconcile_counts() == []
+    
+    def test_check_many_invalid_ids(self, buyer_client):
+        """Ids invalides, absents ou trop nombreux"""
+        client, _ = buyer_client
+        url = review_url('favorite-listings-check-many')
+        
+        assert client.get(url, {'ids': 'pas-un-uuid'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+        too_many = ','.join(str(uuid.uuid4()) for _ in range(101))
+        assert client.get(url, {'ids': too_many}).status_code == status.HTTP_400_BAD_REQUEST
 
 
 @pytest.mark.django_db
@@ -665,6 +950,17 @@ class TestFavoriteSellerViewSet:
         
         assert response.status_code == status.HTTP_200_OK
         assert response.data['is_favorite'] is True
+    
+    def test_check_many_seller_favorites(self, buyer_client, seller, another_buyer, buyer):
+        """Vendeurs en favori parmi une liste"""
+        client, _ = buyer_client
+        FavoriteSeller.objects.create(user=buyer, seller=seller)
+        
+        url = review_url('favorite-sellers-check-many')
+        response = client.get(url, {'ids': f'{seller.id},{another_buyer.id}'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['favorite_ids'] == [str(seller.id)]
 
 
 # ==================== TESTS D'INTÉGRATION ====================
@@ -2,10 +2,14 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
-from .models import Review, ReviewPhoto, ReviewReport, FavoriteSeller
+import uuid
+from .models import Review, ReviewPhoto, ReviewReport, FavoriteSeller, SellerRating
+from .services import SellerReputationService, SellerReviewService
 from apps.listings.models import Favorite as ListingFavorite
+from apps.listings.services.favorites import FavoriteService
 from .serializers import (
     ReviewSerializer, ReviewCreateSerializer, ReviewReportSerializer,
     ReviewReportCreateSerializer, ListingFavoriteSerializer, FavoriteSellerSerializer,
@@ -20,7 +24,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     
     def get_queryset(self):
-        queryset = Review.objects.filter(is_approved=True).select_related('reviewer', 'seller')
+        queryset = Review.objects.filter(is_approved=True).select_related(
+            'reviewer', 'seller'
+        ).prefetch_related('photos').annotate(
+            reports_count=Count('reports')
+        ).order_by('-created_at', '-id')
         
         seller_id = self.request.query_params.get('seller_id')
         if seller_id:
@@ -98,26 +106,38 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return Response(ReviewSerializer(review).data, status=status.HTTP_201_CREATED)
     
     def _check_verified_buyer(self, buyer, seller, listing_id=None):
-        """Vérifier si l'acheteur a eu une transaction avec le vendeur"""
-        from apps.messaging.models import Conversation
+        """Vérifier si l'acheteur a un achat terminé chez le vendeur"""
+        from apps.orders.models import PurchaseRelation
         
-        # Vérifier s'il y a eu une conversation
-        has_conversation = Conversation.objects.filter(
-            buyer=buyer, seller=seller
-        ).exists()
+        return PurchaseRelation.has_purchased(buyer, seller)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def can_review(self, request):
+        """
+        L'utilisateur peut-il laisser un avis (et sera-t-il acheteur vérifié) ?
+        
+        GET ...?seller_id=<uuid>&listing_id=<uuid>
+        """
+        from apps.orders.models import PurchaseRelation
+        
+        seller_id = request.query_params.get('seller_id')
+        if not seller_id:
+            return Response({'error': 'seller_id requis'}, status=status.HTTP_400_BAD_REQUEST)
+        listing_id = request.query_params.get('listing_id') or None
         
-        # Vérifier s'il y a eu un paiement (si le module payments existe)
         try:
-            from apps.payments.models import Payment
-            has_payment = Payment.objects.filter(
-                user=buyer,
-                listing__seller=seller,
-                status='completed'
+            already_reviewed = Review.objects.filter(
+                reviewer=request.user, seller_id=seller_id, listing_id=listing_id
             ).exists()
-        except:
-            has_payment = False
+            is_verified = PurchaseRelation.has_purchased(request.user, seller_id, listing_id)
+        except DjangoValidationError:
+            return Response({'error': 'Identifiant invalide'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return has_conversation or has_payment
+        return Response({
+            'can_review': str(request.user.id) != str(seller_id) and not already_reviewed,
+            'already_reviewed': already_reviewed,
+            'is_verified_buyer': is_verified,
+        })
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_response(self, request, pk=None):
@@ -172,30 +192,36 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def seller_reviews(self, request):
-        """Obtenir tous les avis d'un vendeur avec statistiques"""
+        """
+        Avis d'un vendeur (pagination par curseur) avec statistiques
+        
+        GET ...?seller_id=<uuid>&cursor=<next_cursor>&limit=20
+        """
         seller_id = request.query_params.get('seller_id')
         if not seller_id:
             return Response({'error': 'seller_id requis'}, status=status.HTTP_400_BAD_REQUEST)
         
-        reviews = Review.objects.filter(
-            seller_id=seller_id, is_approved=True, is_flagged=False
-        ).select_related('reviewer')
-        
-        # Calculer la distribution des notes
-        distribution = reviews.values('rating').annotate(count=Count('rating'))
-        rating_dist = {str(i): 0 for i in range(1, 6)}
-        for item in distribution:
-            rating_dist[str(item['rating'])] = item['count']
-        
-        avg_rating = reviews.aggregate(avg=Avg('rating'))['avg'] or 0
+        try:
+            limit = min(
+                int(request.query_params.get('limit', SellerReviewService.PAGE_SIZE)),
+                SellerReviewService.MAX_PAGE_SIZE
+            )
+            reviews, next_cursor = SellerReviewService.page(
+                seller_id, request.query_params.get('cursor'), max(limit, 1)
+            )
+        except ValueError:
+            return Response({'error': 'Paramètres de pagination invalides'}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = ReviewSerializer(reviews, many=True)
+        # Distribution et moyenne : agrégats tenus à jour (SellerRating)
+        stats = SellerRating.for_seller(seller_id)
         
         return Response({
-            'reviews': serializer.data,
-            'count': reviews.count(),
-            'average_rating': round(avg_rating, 2),
-            'rating_distribution': rating_dist
+            'reviews': ReviewSerializer(reviews, many=True).data,
+            'count': stats.rating_count,
+            'average_rating': float(stats.average),
+            'rating_distribution': stats.distribution,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
         })
     
     @action(detail=False, methods=['get'])
@@ -211,58 +237,42 @@ class ReviewViewSet(viewsets.ModelViewSet):
         except CustomUser.DoesNotExist:
             return Response({'error': 'Vendeur non trouvé'}, status=status.HTTP_404_NOT_FOUND)
         
-        reviews = Review.objects.filter(
-            seller=seller, is_approved=True, is_flagged=False
-        ).select_related('reviewer')
+        reviews = SellerReviewService.queryset(seller.id)
         
-        # Distribution des notes
-        distribution = reviews.values('rating').annotate(count=Count('rating'))
-        rating_dist = {str(i): 0 for i in range(1, 6)}
-        for item in distribution:
-            rating_dist[str(item['rating'])] = item['count']
-        
-        # Calculer les badges
-        badges = self._calculate_badges(seller, reviews)
+        # Distribution, badges, taux de réponse : instantané en cache
+        reputation = SellerReputationService.get(seller.id)
         
         return Response({
-            'seller_id': str(seller.id),
+            **reputation,
             'username': seller.username,
-            'avg_rating': float(seller.avg_rating),
-            'total_reviews': seller.total_reviews,
-            'rating_distribution': rating_dist,
-            'badges': badges,
             'recent_reviews': ReviewSerializer(reviews[:5], many=True).data
         })
     
-    def _calculate_badges(self, seller, reviews):
-        """Calculer les badges d'un vendeur"""
-        badges = []
-        
-        total_reviews = reviews.count()
-        avg_rating = seller.avg_rating
-        
-        # Badge: Nouveau vendeur
-        if total_reviews == 0:
-            badges.append('new_seller')
+    @action(detail=False, methods=['get'])
+    def reputations(self, request):
+        """
+        Réputation de plusieurs vendeurs (cartes d'annonces)
         
-        # Badge: Vendeur vérifié (plus de 10 avis)
-        if total_reviews >= 10:
-            badges.append('verified_seller')
+        GET /api/reviews/reviews/reputations/?seller_ids=<uuid>,<uuid>
+        """
+        raw_ids = request.query_params.get('seller_ids', '')
+        seller_ids = [seller_id.strip() for seller_id in raw_ids.split(',') if seller_id.strip()]
         
-        # Badge: Top vendeur (plus de 50 avis avec note >= 4.5)
-        if total_reviews >= 50 and avg_rating >= 4.5:
-            badges.append('top_seller')
+        if not seller_ids:
+            return Response({'error': 'seller_ids requis'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Badge: Excellente réputation (note >= 4.8)
-        if total_reviews >= 5 and avg_rating >= 4.8:
-            badges.append('excellent_reputation')
+        if len(seller_ids) > SellerReputationService.MAX_BATCH:
+            return Response(
+                {'error': f'Maximum {SellerReputationService.MAX_BATCH} seller_ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Badge: Super réactif (répond à plus de 80% des avis)
-        responded = reviews.exclude(seller_response='').count()
-        if total_reviews >= 5 and responded / total_reviews >= 0.8:
-            badges.append('responsive_seller')
+        try:
+            seller_ids = [str(uuid.UUID(seller_id)) for seller_id in seller_ids]
+        except ValueError:
+            return Response({'error': 'seller_ids invalide'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return badges
+        return Response({'results': SellerReputationService.get_many(seller_ids)})
 
 
 class FavoriteListingViewSet(viewsets.ModelViewSet):
@@ -286,17 +296,15 @@ class FavoriteListingViewSet(viewsets.ModelViewSet):
         except Listing.DoesNotExist:
             return Response({'error': 'Annonce non trouvée'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Vérifier si déjà en favori
-        if ListingFavorite.objects.filter(user=request.user, listing=listing).exists():
+        favorite, created = FavoriteService.add_listing(request.user, listing)
+        if not created:
             return Response({'error': 'Déjà en favoris'}, status=status.HTTP_400_BAD_REQUEST)
         
-        favorite = ListingFavorite.objects.create(
-            user=request.user,
-            listing=listing
-        )
-        
         return Response(ListingFavoriteSerializer(favorite).data, status=status.HTTP_201_CREATED)
     
+    def perform_destroy(self, instance):
+        FavoriteService.remove_listing(instance.user_id, instance.listing_id)
+    
     @action(detail=False, methods=['post'])
     def toggle(self, request):
         """Toggle un favori d'annonce"""
@@ -305,15 +313,9 @@ class FavoriteListingViewSet(viewsets.ModelViewSet):
         if not listing_id:
             return Response({'error': 'listing_id requis'}, status=status.HTTP_400_BAD_REQUEST)
         
-        favorite = ListingFavorite.objects.filter(
-            user=request.user, listing_id=listing_id
-        ).first()
-        
-        if favorite:
-            favorite.delete()
+        if FavoriteService.remove_listing(request.user, listing_id):
             return Response({'status': 'removed', 'is_favorite': False})
-        else:
-            return self.create(request)
+        return self.create(request)
     
     @action(detail=False, methods=['get'])
     def check(self, request):
@@ -328,6 +330,26 @@ class FavoriteListingViewSet(viewsets.ModelViewSet):
         ).exists()
         
         return Response({'is_favorite': exists})
+    
+    @action(detail=False, methods=['get'])
+    def check_many(self, request):
+        """
+        Annonces en favori parmi une liste (grilles d'annonces)
+        
+        GET ...?ids=<uuid>,<uuid>  - une seule requête
+        """
+        try:
+            listing_ids = FavoriteService.parse_ids(request.query_params.get('ids'))
+        except ValueError:
+            return Response(
+                {'error': f'ids invalides (maximum {FavoriteService.MAX_BULK_IDS})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not listing_ids:
+            return Response({'error': 'ids requis'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        favorite_ids = FavoriteService.favorited_listing_ids(request.user, listing_ids)
+        return Response({'favorite_ids': [str(listing_id) for listing_id in favorite_ids]})
 
 
 class FavoriteSellerViewSet(viewsets.ModelViewSet):
@@ -396,3 +418,23 @@ class FavoriteSellerViewSet(viewsets.ModelViewSet):
         ).exists()
         
         return Response({'is_favorite': exists})
+    
+    @action(detail=False, methods=['get'])
+    def check_many(self, request):
+        """
+        Vendeurs en favori parmi une liste
+        
+        GET ...?ids=<uuid>,<uuid>  - une seule requête
+        """
+        try:
+            seller_ids = FavoriteService.parse_ids(request.query_params.get('ids'))
+        except ValueError:
+            return Response(
+                {'error': f'ids invalides (maximum {FavoriteService.MAX_BULK_IDS})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not seller_ids:
+            return Response({'error': 'ids requis'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        favorite_ids = FavoriteService.favorited_seller_ids(request.user, seller_ids)
+        return Response({'favorite_ids': [str(seller_id) for seller_id in favorite_ids]})
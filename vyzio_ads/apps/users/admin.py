@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserVerificationToken, SellerSubscription, SellerProfile, PasswordResetToken
+from .models import CustomUser, UserVerificationToken, SellerSubscription, SellerProfile, PasswordResetToken, PrivacyJob
+from .privacy import AccountDeletion
+from .tokens import TokenRevocationList
 
 
 class SellerProfileInline(admin.StackedInline):
@@ -155,19 +157,31 @@ class CustomUserAdmin(UserAdmin):
                 count += 1
             self.message_user(request, f'{count} utilisateur(s) réactivé(s).')
     
+    @staticmethod
+    def _update_claims(queryset, **values):
+        """
+        Met à jour des champs copiés dans les jetons et révoque ces jetons.
+        Ids lus avant l'UPDATE : les filtres de la liste (ex. is_banned=False)
+        ne correspondent plus aux lignes modifiées.
+        """
+        pks = list(queryset.values_list('pk', flat=True))
+        count = CustomUser.objects.filter(pk__in=pks).update(**values)
+        TokenRevocationList.revoke(*pks)
+        return count
+    
     @admin.action(description='Vérifier les utilisateurs sélectionnés')
     def verify_users(self, request, queryset):
-        count = queryset.update(is_verified=True)
+        count = self._update_claims(queryset, is_verified=True)
         self.message_user(request, f'{count} utilisateur(s) vérifié(s).')
     
     @admin.action(description='Bannir les utilisateurs sélectionnés')
     def ban_users(self, request, queryset):
-        count = queryset.update(is_banned=True)
+        count = self._update_claims(queryset, is_banned=True)
         self.message_user(request, f'{count} utilisateur(s) banni(s).')
     
     @admin.action(description='Débannir les utilisateurs sélectionnés')
     def unban_users(self, request, queryset):
-        count = queryset.update(is_banned=False)
+        count = self._update_claims(queryset, is_banned=False)
         self.message_user(request, f'{count} utilisateur(s) débanni(s).')
     
     @admin.action(description='Passer en vendeur')
@@ -321,3 +335,20 @@ class SellerSubscriptionAdmin(admin.ModelAdmin):
     def reset_listings_count(self, request, queryset):
         count = queryset.update(listings_count=0)
         self.message_user(request, f'{count} compteur(s) réinitialisé(s).')
+
+
+@admin.register(PrivacyJob)
+class PrivacyJobAdmin(admin.ModelAdmin):
+    """Admin pour les demandes RGPD (exports et suppressions)"""
+    
+    list_display = ('id', 'user', 'kind', 'status', 'attempts', 'current_step', 'heartbeat_at', 'created_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('id', 'user__email')
+    readonly_fields = ('user', 'kind', 'progress', 'current_step', 'error_message', 'heartbeat_at',
+                       'attempts', 'file_path', 'download_token', 'expires_at', 'created_at', 'finished_at')
+    actions = ['retry_deletions']
+    
+    @admin.action(description='Relancer les suppressions sélectionnées')
+    def retry_deletions(self, request, queryset):
+        count = AccountDeletion.retry(queryset)
+        self.message_user(request, f'{count} suppression(s) relancée(s)')
@@ -14,6 +14,7 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
@@ -31,8 +32,11 @@ from .serializers import (
     PasswordResetRequestSerializer,
     PasswordResetConfirmSerializer,
     LoginSerializer,
+    LoginUserSerializer,
     EmailVerificationSerializer
 )
+from .last_login import LastLoginWriter
+from .tokens import ClaimsRefreshToken
 
 
 # ==================== REGISTRATION ====================
@@ -64,7 +68,7 @@ def register(request):
         send_verification_email(user, token)
         
         # Générer les tokens JWT
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'message': 'Inscription réussie. Veuillez vérifier votre email.',
@@ -94,16 +98,8 @@ def login(request):
     email = serializer.validated_data['email']
     password = serializer.validated_data['password']
     
-    # Authentifier avec email comme username
-    user = authenticate(username=email, password=password)
-    
-    if user is None:
-        # Essayer de trouver l'utilisateur par email
-        try:
-            user_obj = CustomUser.objects.get(email=email)
-            user = authenticate(username=user_obj.username, password=password)
-        except CustomUser.DoesNotExist:
-            pass
+    # Email ou username : une requête, un calcul de hash (EmailBackend)
+    user = authenticate(request, email=email, password=password)
     
     if user is None:
         return Response({
@@ -115,16 +111,15 @@ def login(request):
             'error': 'Votre compte a été suspendu'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Mettre à jour last_login
-    user.last_login = timezone.now()
-    user.save(update_fields=['last_login'])
+    # last_login écrit par lots, hors du chemin de la requête
+    LastLoginWriter.default().record(user.pk)
     
     # Générer les tokens
-    refresh = RefreshToken.for_user(user)
+    refresh = ClaimsRefreshToken.for_user(user)
     
     return Response({
         'message': 'Connexion réussie',
-        'user': UserDetailSerializer(user).data,
+        'user': LoginUserSerializer(user).data,
         'tokens': {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -338,15 +333,23 @@ def token_refresh(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        refresh = RefreshToken(refresh_token)
-        return Response({
-            'access': str(refresh.access_token),
-            'refresh': str(refresh)
-        })
+        refresh = ClaimsRefreshToken(refresh_token)
     except TokenError:
         return Response({
             'error': 'Token invalide ou expiré'
         }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    # Claims du nouveau jeton d'accès relus en base (ban, rôle, vérification)
+    user = CustomUser.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+    if user is None or not user.is_active or user.is_banned:
+        return Response({
+            'error': 'Token invalide ou expiré'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({
+        'access': str(refresh.access_token_for(user)),
+        'refresh': str(refresh)
+    })
 
 
 @api_view(['POST'])
@@ -0,0 +1,32 @@
+"""
+Authentification JWT sans requête sur l'utilisateur.
+"""
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .tokens import TokenRevocationList
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    request.user construit depuis les claims du jeton d'accès (voir
+    apps.users.tokens) ; une lecture de cache pour la date de révocation
+    (relue en base si absente) remplace la requête SELECT sur CustomUser.
+    """
+
+    def get_user(self, validated_token):
+        has_claims = getattr(validated_token, 'has_user_claims', None)
+        if has_claims is None or not has_claims():
+            # Jeton émis avant les claims : utilisateur chargé en base
+            return super().get_user(validated_token)
+
+        if TokenRevocationList.is_revoked(validated_token):
+            raise InvalidToken('Jeton révoqué, veuillez le rafraîchir')
+
+        if not validated_token['is_active']:
+            raise AuthenticationFailed('Utilisateur inactif', code='user_inactive')
+        if validated_token['is_banned']:
+            raise AuthenticationFailed('Votre compte a été suspendu', code='user_banned')
+
+        return validated_token.get_user()
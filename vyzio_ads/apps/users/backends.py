@@ -0,0 +1,39 @@
+"""
+Backend d'authentification par email ou nom d'utilisateur.
+
+Une seule requête (index uniques email / username) et un seul calcul de
+hash par tentative, y compris quand le compte n'existe pas : le temps de
+réponse ne révèle pas l'existence d'un email.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+
+
+class EmailBackend(ModelBackend):
+    """
+    authenticate(username=<email ou username>, password=...)
+    ou authenticate(email=..., password=...)
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        User = get_user_model()
+        identifier = email or username or kwargs.get(User.USERNAME_FIELD)
+        if not identifier or password is None:
+            return None
+
+        candidates = list(
+            User._default_manager.filter(Q(username=identifier) | Q(email=identifier))[:2]
+        )
+        # Priorité au nom d'utilisateur exact (comportement historique)
+        candidates.sort(key=lambda user: user.username != identifier)
+        user = candidates[0] if candidates else None
+
+        if user is None:
+            # Même coût qu'un mot de passe vérifié
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
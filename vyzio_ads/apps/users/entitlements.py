@@ -0,0 +1,149 @@
+"""
+Droits d'un utilisateur : abonnement, limites du plan, crédits, blocages.
+
+Chargés une seule fois par requête (mémorisés sur la requête) et mis en
+cache entre les requêtes sous une clé versionnée. Le cache est supprimé à
+chaque écriture sur Subscription, SubscriptionPlan, PostCredit et
+BlockedUser : les webhooks Stripe, qui passent par ces modèles, invalident
+donc les droits des utilisateurs concernés.
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    """Instantané des droits d'un utilisateur"""
+    user_id: Optional[str] = None
+    # None si aucun abonnement ; sinon statut, limites du plan et compteurs
+    subscription: Optional[dict] = None
+    credits_balance: int = 0
+    # Utilisateurs qui bloquent cet utilisateur / bloqués par lui
+    blocked_by: frozenset = field(default_factory=frozenset)
+    blocking: frozenset = field(default_factory=frozenset)
+
+    @property
+    def has_active_subscription(self) -> bool:
+        from apps.payments.models import Subscription
+        return bool(self.subscription) and self.subscription['status'] in Subscription.ACTIVE_STATUSES
+
+    @property
+    def has_credits(self) -> bool:
+        return self.credits_balance > 0
+
+    @property
+    def can_create_listing(self) -> bool:
+        """Quota d'annonces de l'abonnement actif non atteint"""
+        if not self.has_active_subscription:
+            return False
+        max_listings = self.subscription['max_listings']
+        return max_listings == -1 or self.subscription['listings_used'] < max_listings
+
+    @property
+    def remaining_listings(self):
+        if not self.subscription:
+            return 0
+        if self.subscription['max_listings'] == -1:
+            return float('inf')
+        return max(0, self.subscription['max_listings'] - self.subscription['listings_used'])
+
+    @property
+    def can_publish(self) -> bool:
+        """Abonnement actif avec quota, ou crédits disponibles"""
+        return self.can_create_listing or self.has_credits
+
+    def is_blocked_by(self, user_id) -> bool:
+        return str(user_id) in self.blocked_by
+
+    def is_blocked_with(self, *user_ids) -> bool:
+        """Blocage dans un sens ou dans l'autre avec l'un des utilisateurs"""
+        return any(str(user_id) in self.blocked_by or str(user_id) in self.blocking for user_id in user_ids)
+
+
+class EntitlementService:
+    """Chargement, cache et invalidation des droits"""
+
+    VERSION = 1
+    CACHE_TTL = getattr(settings, 'ENTITLEMENTS_CACHE_TTL', 5 * 60)
+    REQUEST_ATTR = '_entitlements'
+
+    @staticmethod
+    def _key(user_id):
+        return f'users:entitlements:v{EntitlementService.VERSION}:{user_id}'
+
+    @staticmethod
+    def for_request(request) -> Entitlements:
+        """
+        Droits de l'utilisateur de la requête, chargés une seule fois pour
+        toutes les permissions et vérifications de la requête.
+        """
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return Entitlements()
+
+        memo = getattr(request, EntitlementService.REQUEST_ATTR, None)
+        if memo is None or memo.user_id != str(user.pk):
+            memo = EntitlementService.for_user(user.pk)
+            setattr(request, EntitlementService.REQUEST_ATTR, memo)
+        return memo
+
+    @staticmethod
+    def for_user(user_id) -> Entitlements:
+        """Droits d'un utilisateur (cache, sinon base)"""
+        from django.core.cache import cache
+
+        key = EntitlementService._key(user_id)
+        data = cache.get(key)
+        if data is None:
+            data = asdict(EntitlementService.load(user_id))
+            cache.set(key, data, EntitlementService.CACHE_TTL)
+        return Entitlements(**data)
+
+    @staticmethod
+    def load(user_id) -> Entitlements:
+        """Lecture en base : abonnement + plan, crédits, blocages (trois requêtes)"""
+        from django.db.models import F, Q
+        from apps.messaging.models import BlockedUser
+        from apps.payments.models import PostCredit, Subscription
+
+        subscription = Subscription.objects.filter(user_id=user_id).values(
+            'status', 'listings_used', 'boosts_used',
+            plan_name=F('plan__name'),
+            plan_type=F('plan__plan_type'),
+            max_listings=F('plan__max_listings'),
+            max_images_per_listing=F('plan__max_images_per_listing'),
+            can_boost=F('plan__can_boost'),
+            boost_count_per_month=F('plan__boost_count_per_month'),
+            analytics_access=F('plan__analytics_access'),
+        ).first()
+
+        balance = PostCredit.objects.filter(user_id=user_id).values_list('balance', flat=True).first()
+
+        blocked_by, blocking = set(), set()
+        for blocker_id, blocked_id in BlockedUser.objects.filter(
+            Q(blocker_id=user_id) | Q(blocked_id=user_id)
+        ).values_list('blocker_id', 'blocked_id'):
+            if str(blocked_id) == str(user_id):
+                blocked_by.add(str(blocker_id))
+            else:
+                blocking.add(str(blocked_id))
+
+        return Entitlements(
+            user_id=str(user_id),
+            subscription=subscription,
+            credits_balance=balance or 0,
+            blocked_by=frozenset(blocked_by),
+            blocking=frozenset(blocking),
+        )
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Supprime les droits en cache (après commit de la transaction)."""
+        from django.core.cache import cache
+
+        keys = [EntitlementService._key(user_id) for user_id in user_ids if user_id]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
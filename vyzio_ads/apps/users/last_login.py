@@ -0,0 +1,121 @@
+"""
+Écriture groupée de last_login.
+
+La connexion ne fait plus d'UPDATE synchrone : l'horodatage est confié au
+LastLoginWriter du process, qui écrit toutes les connexions en attente en
+un seul UPDATE (CASE WHEN) toutes les LAST_LOGIN_FLUSH_INTERVAL secondes ou
+dès que LAST_LOGIN_MAX_BATCH utilisateurs sont en attente.
+
+Un writer par process (worker Gunicorn) ; les horodatages en attente sont
+écrits à l'arrêt du process. En cas d'arrêt brutal, les dernières
+secondes de connexions sont perdues (last_login est indicatif).
+
+LAST_LOGIN_FLUSH_INTERVAL = None : écriture immédiate (tests).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginWriter:
+    """
+    File des derniers horodatages de connexion, par utilisateur.
+    """
+
+    FLUSH_INTERVAL = getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 5.0)
+    MAX_BATCH = getattr(settings, 'LAST_LOGIN_MAX_BATCH', 500)
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @classmethod
+    def default(cls) -> 'LastLoginWriter':
+        """Writer du process (créé au premier appel)."""
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+                    atexit.register(cls._default.flush)
+        return cls._default
+
+    def record(self, user_id, when=None):
+        """Note une connexion ; écrite au prochain flush."""
+        when = when or timezone.now()
+        if self.FLUSH_INTERVAL is None:
+            self.write_batch({user_id: when})
+            return
+
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or previous < when:
+                self._pending[user_id] = when
+            full = len(self._pending) >= self.MAX_BATCH
+            if full:
+                self._cancel_timer()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.FLUSH_INTERVAL, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Écrit les connexions en attente.
+
+        Returns:
+            Nombre d'utilisateurs mis à jour
+        """
+        with self._lock:
+            self._cancel_timer()
+            batch, self._pending = self._pending, {}
+
+        if not batch:
+            return 0
+
+        try:
+            return self.write_batch(batch)
+        except Exception as e:
+            logger.error(f"Échec écriture last_login ({len(batch)} utilisateurs): {e}")
+            with self._lock:
+                # Remis en file sans écraser une connexion plus récente
+                for user_id, when in batch.items():
+                    self._pending.setdefault(user_id, when)
+            return 0
+        finally:
+            from django.db import connection
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    @staticmethod
+    def write_batch(batch) -> int:
+        """Un seul UPDATE ... SET last_login = CASE id WHEN ... END."""
+        from django.contrib.auth import get_user_model
+        from django.db.models import Case, DateTimeField, Value, When
+
+        User = get_user_model()
+        return User.objects.filter(pk__in=list(batch)).update(
+            last_login=Case(
+                *[When(pk=user_id, then=Value(when)) for user_id, when in batch.items()],
+                output_field=DateTimeField(),
+            )
+        )
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,103 @@
+"""
+Mesure du débit de connexion (POST /api/auth/login/) par worker.
+
+Appelle la vue de connexion en parallèle (threads) avec le hasher de mots
+de passe configuré (PBKDF2 en production) et affiche :
+- connexions par seconde, au total et par worker
+- latences p50 / p95
+- connexions encore en attente d'écriture de last_login
+
+Usage:
+    python manage.py login_benchmark
+    python manage.py login_benchmark --logins 500 --workers 8
+    python manage.py login_benchmark --wrong-password  # chemin d'échec
+
+Crée des utilisateurs temporaires, supprimés à la fin (sauf --keep).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Mesure le débit de connexion par worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Utilisateurs de test')
+        parser.add_argument('--logins', type=int, default=200, help='Nombre total de connexions')
+        parser.add_argument('--workers', type=int, default=4, help='Connexions en parallèle')
+        parser.add_argument('--wrong-password', action='store_true', help='Mesurer les échecs')
+        parser.add_argument('--keep', action='store_true', help='Conserver les utilisateurs créés')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIRequestFactory
+        from apps.users.auth_views import login
+        from apps.users.last_login import LastLoginWriter
+
+        if min(options['users'], options['logins'], options['workers']) < 1:
+            raise CommandError('--users, --logins et --workers doivent être positifs')
+
+        User = get_user_model()
+        run_id = uuid.uuid4().hex[:8]
+        password = f'Bench-{run_id}-Pass!'
+        emails = [f'bench_{run_id}_{i}@example.com' for i in range(options['users'])]
+        for i, email in enumerate(emails):
+            User.objects.create_user(email=email, username=f'bench_{run_id}_{i}', password=password)
+
+        expected = 401 if options['wrong_password'] else 200
+        attempt_password = 'wrong-password' if options['wrong_password'] else password
+        factory = APIRequestFactory()
+        workers = options['workers']
+        shares = [options['logins'] // workers + (i < options['logins'] % workers) for i in range(workers)]
+
+        def run_worker(worker_index, count):
+            latencies, errors = [], 0
+            started = time.monotonic()
+            try:
+                for n in range(count):
+                    email = emails[(worker_index + n * workers) % len(emails)]
+                    request = factory.post(
+                        '/api/auth/login/',
+                        data=json.dumps({'email': email, 'password': attempt_password}),
+                        content_type='application/json',
+                    )
+                    t0 = time.perf_counter()
+                    response = login(request)
+                    latencies.append(time.perf_counter() - t0)
+                    if response.status_code != expected:
+                        errors += 1
+                return latencies, errors, time.monotonic() - started
+            finally:
+                connection.close()
+
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(run_worker, range(workers), shares))
+            elapsed = time.monotonic() - started
+
+            latencies = sorted(latency for worker_latencies, _e, _t in results for latency in worker_latencies)
+            errors = sum(worker_errors for _l, worker_errors, _t in results)
+            per_worker = [len(worker_latencies) / worker_time for worker_latencies, _e, worker_time in results if worker_time]
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+
+            self.stdout.write(f'Connexions : {len(latencies)} en {elapsed:.2f}s ({len(latencies) / elapsed:.1f}/s)')
+            self.stdout.write(f'Par worker ({workers}) : {statistics.mean(per_worker):.1f}/s')
+            self.stdout.write(
+                f'Latence p50 : {statistics.median(latencies) * 1000:.1f} ms, p95 : {p95 * 1000:.1f} ms'
+            )
+            self.stdout.write(f'last_login en attente : {LastLoginWriter.default().pending()}')
+
+            if errors:
+                raise CommandError(f'{errors} réponse(s) inattendue(s) (attendu: {expected})')
+            self.stdout.write(self.style.SUCCESS('✅ Benchmark terminé'))
+        finally:
+            LastLoginWriter.default().flush()
+            if not options['keep']:
+                User.objects.filter(email__in=emails).delete()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='stripe_customer_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_stripe_customer_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrivacyJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('export', 'Export des données'), ('deletion', 'Suppression du compte')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=20)),
+                ('progress', models.JSONField(blank=True, default=dict)),
+                ('current_step', models.CharField(blank=True, max_length=50)),
+                ('error_message', models.TextField(blank=True)),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('download_token', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='privacy_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'users_privacyjob',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'kind', '-created_at'], name='users_privacy_user_kind_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_privacyjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='privacyjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_privacyjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='tokens_valid_after',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_customuser_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='privacyjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='privacyjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('completed', 'Terminé'), ('failed', 'Échec'), ('dead', 'Abandonné (intervention requise)')], default='pending', max_length=20),
+        ),
+    ]
@@ -30,6 +30,8 @@ class CustomUser(AbstractUser):
     subscription_type = models.CharField(max_length=20, choices=SUBSCRIPTION_CHOICES, default='free')
     subscription_start = models.DateTimeField(null=True, blank=True)
     subscription_end = models.DateTimeField(null=True, blank=True)
+    # Customer Stripe (facturation), créé au premier checkout
+    stripe_customer_id = models.CharField(max_length=100, blank=True, db_index=True)
     
     # Seller info
     shop_name = models.CharField(max_length=100, blank=True)
@@ -45,6 +47,8 @@ class CustomUser(AbstractUser):
     is_verified = models.BooleanField(default=False)
     is_active_seller = models.BooleanField(default=False)
     is_banned = models.BooleanField(default=False)
+    # Jetons d'accès émis jusqu'à cette date (timestamp, claim iat) refusés
+    tokens_valid_after = models.PositiveBigIntegerField(default=0, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -63,6 +67,44 @@ class CustomUser(AbstractUser):
     def is_seller(self):
         return self.role in ['seller', 'professional']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_claims = instance._claim_values()
+        return instance
+
+    def _claim_values(self):
+        """Champs copiés dans les jetons d'accès, tels que chargés"""
+        from apps.users.tokens import TOKEN_CLAIM_FIELDS
+        return {name: self.__dict__[name] for name in TOKEN_CLAIM_FIELDS if name in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Ban, rôle, vérification... modifiés : jetons d'accès révoqués
+        loaded = getattr(self, '_loaded_claims', None)
+        claims = self._claim_values()
+        if loaded is not None and any(loaded[name] != claims.get(name) for name in loaded):
+            from apps.users.tokens import TokenRevocationList
+            # Date écrite en base aussi sur l'instance : un save() ultérieur ne l'écrase pas
+            self.tokens_valid_after = TokenRevocationList.revoke(self.pk)
+        self._loaded_claims = claims
+
+    def delete(self, *args, **kwargs):
+        from apps.users.tokens import TokenRevocationList
+
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        TokenRevocationList.revoke(user_id)
+        return result
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Utilisateur construit depuis un jeton : le premier champ différé
+        # lu charge tous les autres en une seule requête
+        deferred = self.get_deferred_fields()
+        if getattr(self, '_from_token', False) and fields is not None and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields)
+
 
 class UserVerificationToken(models.Model):
     """Email verification tokens"""
@@ -179,3 +221,56 @@ class PasswordResetToken(models.Model):
     
     def __str__(self):
         return f"Password reset for {self.user.email}"
+
+
+class PrivacyJob(models.Model):
+    """
+    Demande RGPD traitée en tâche de fond : export (archive zip de fichiers
+    JSONL) ou suppression du compte par lots. Voir apps.users.privacy.
+    """
+    
+    KIND_CHOICES = [
+        ('export', 'Export des données'),
+        ('deletion', 'Suppression du compte'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+        ('dead', 'Abandonné (intervention requise)'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Conservé (NULL) après la suppression du compte
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='privacy_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Lignes traitées par table : {"listings": 120, "messages": 5000, ...}
+    progress = models.JSONField(default=dict, blank=True)
+    current_step = models.CharField(max_length=50, blank=True)
+    error_message = models.TextField(blank=True)
+    # Signe de vie du worker (prise du job, puis chaque lot)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Prises du job par un worker (plafonnées, voir privacy.MAX_ATTEMPTS)
+    attempts = models.PositiveIntegerField(default=0)
+    
+    # Export : archive sur disque et jeton de téléchargement
+    file_path = models.CharField(max_length=500, blank=True)
+    download_token = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'users_privacyjob'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'kind', '-created_at'], name='users_privacy_user_kind_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.status})"
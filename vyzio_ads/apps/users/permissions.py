@@ -91,14 +91,9 @@ class CanSendMessage(BasePermission):
         if not recipient_id:
             return False
         
-        # Vérifier s'il n'est pas bloqué
-        from apps.messaging.models import BlockedUser
-        is_blocked = BlockedUser.objects.filter(
-            blocker_id=recipient_id,
-            blocked_id=request.user.id
-        ).exists()
-        
-        return not is_blocked
+        # Vérifier s'il n'est pas bloqué (droits chargés une fois par requête)
+        from apps.users.entitlements import EntitlementService
+        return not EntitlementService.for_request(request).is_blocked_by(recipient_id)
 
 
 class IsBuyer(BasePermission):
@@ -0,0 +1,421 @@
+"""
+Demandes RGPD : export des données et suppression du compte.
+
+Export : chaque table liée à l'utilisateur est parcourue avec .iterator()
+et écrite ligne par ligne (JSONL) dans une archive zip sur disque, en tâche
+de fond. La mémoire utilisée ne dépend pas du volume du compte. L'archive
+est servie via un jeton de téléchargement puis purgée à expiration.
+
+Suppression : le compte est anonymisé et désactivé immédiatement (jetons
+révoqués), puis les données liées sont supprimées par lots, une transaction
+par lot. Une suppression interrompue reprend là où elle s'était arrêtée.
+Un compte lié à des commandes (conservation comptable, FK PROTECT) reste
+anonymisé au lieu d'être supprimé.
+
+La progression (lignes traitées par table) est enregistrée sur le PrivacyJob,
+avec un signe de vie (heartbeat_at) à chaque lot : un job 'running' sans
+signe de vie depuis STALL_AFTER (worker mort) peut être repris. Après
+MAX_ATTEMPTS prises, une suppression passe en 'dead' et n'est relancée
+que depuis l'admin.
+"""
+from datetime import timedelta
+import json
+import logging
+import os
+import secrets
+import zipfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Job 'running' sans signe de vie depuis ce délai : worker considéré mort
+STALL_AFTER = timedelta(minutes=getattr(settings, 'PRIVACY_JOB_STALL_MINUTES', 30))
+# Prises d'un job par un worker avant abandon ('dead')
+MAX_ATTEMPTS = getattr(settings, 'PRIVACY_JOB_MAX_ATTEMPTS', 5)
+
+
+def _stalled():
+    """Jobs à reprendre : jamais démarrés ou dont le worker est mort"""
+    cutoff = timezone.now() - STALL_AFTER
+    return Q(status='pending', created_at__lt=cutoff) | Q(status='running', heartbeat_at__lt=cutoff)
+
+
+def _claim(job_id, kind):
+    """
+    Passe le job en 'running' s'il est en attente, en échec ou bloqué
+    (worker mort) et compte la prise ; None s'il est terminé, abandonné,
+    pris par un worker vivant ou a épuisé ses MAX_ATTEMPTS prises.
+    """
+    from apps.users.models import PrivacyJob
+
+    claimable = Q(status__in=['pending', 'failed']) | _stalled()
+    claimed = PrivacyJob.objects.filter(claimable, pk=job_id, kind=kind, attempts__lt=MAX_ATTEMPTS).update(
+        status='running', error_message='', heartbeat_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    return PrivacyJob.objects.get(pk=job_id) if claimed else None
+
+
+def _report(job, step, count):
+    job.current_step = step
+    job.progress[step] = count
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['current_step', 'progress', 'heartbeat_at'])
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error_message = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at', 'progress', 'current_step',
+                            'file_path', 'download_token', 'expires_at'])
+
+
+class PrivacyExport:
+    """Export des données personnelles (archive zip de fichiers JSONL)"""
+
+    CHUNK_SIZE = 2000
+
+    @staticmethod
+    def export_dir():
+        return getattr(settings, 'PRIVACY_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'private', 'exports'))
+
+    @staticmethod
+    def ttl():
+        return timedelta(days=getattr(settings, 'PRIVACY_EXPORT_TTL_DAYS', 7))
+
+    @staticmethod
+    def sections(user_id):
+        """(nom du fichier, queryset de dicts) pour chaque table contenant des données de l'utilisateur"""
+        from apps.analytics.models import Event
+        from apps.listings.models import Favorite, Listing, ListingImage, ViewHistory
+        from apps.messaging.models import BlockedUser, Conversation, Message, Notification, Report
+        from apps.orders.models import Order, SellerWallet, WalletTransaction, WithdrawalRequest
+        from apps.payments.models import Invoice, Payment, PostCredit, PostCreditTransaction, Subscription
+        from apps.reviews.models import FavoriteSeller, Review, ReviewReport
+        from apps.users.models import CustomUser, SellerProfile
+
+        profile_fields = [field.attname for field in CustomUser._meta.concrete_fields if field.name != 'password']
+        conversations = Conversation.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id))
+
+        return [
+            ('profile', CustomUser.objects.filter(pk=user_id).values(*profile_fields)),
+            ('seller_profile', SellerProfile.objects.filter(user_id=user_id).values()),
+            ('listings', Listing.objects.filter(seller_id=user_id).values()),
+            ('listing_images', ListingImage.objects.filter(listing__seller_id=user_id).values()),
+            ('favorites', Favorite.objects.filter(user_id=user_id).values()),
+            ('favorite_sellers', FavoriteSeller.objects.filter(user_id=user_id).values()),
+            ('view_history', ViewHistory.objects.filter(user_id=user_id).values()),
+            ('conversations', conversations.values()),
+            ('messages', Message.objects.filter(conversation__in=conversations.values('pk')).values()),
+            ('notifications', Notification.objects.filter(user_id=user_id).values()),
+            ('blocked_users', BlockedUser.objects.filter(blocker_id=user_id).values()),
+            ('reports', Report.objects.filter(reporter_id=user_id).values()),
+            ('reviews_written', Review.objects.filter(reviewer_id=user_id).values()),
+            ('reviews_received', Review.objects.filter(seller_id=user_id).values()),
+            ('review_reports', ReviewReport.objects.filter(reporter_id=user_id).values()),
+            ('payments', Payment.objects.filter(user_id=user_id).values()),
+            ('invoices', Invoice.objects.filter(user_id=user_id).values()),
+            ('subscription', Subscription.objects.filter(user_id=user_id).values()),
+            ('post_credits', PostCredit.objects.filter(user_id=user_id).values()),
+            ('post_credit_transactions', PostCreditTransaction.objects.filter(post_credit__user_id=user_id).values()),
+            ('orders', Order.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id)).values()),
+            ('wallet', SellerWallet.objects.filter(user_id=user_id).values()),
+            ('wallet_transactions', WalletTransaction.objects.filter(wallet__user_id=user_id).values()),
+            ('withdrawals', WithdrawalRequest.objects.filter(wallet__user_id=user_id).values()),
+            ('events', Event.objects.filter(user_id=user_id).values()),
+        ]
+
+    @staticmethod
+    def request(user):
+        """
+        Demande un export (un seul en cours par utilisateur). Un export
+        bloqué (worker mort) est relancé au lieu d'être renvoyé tel quel.
+
+        Returns:
+            PrivacyJob
+        """
+        from apps.users.models import PrivacyJob
+        from apps.users.tasks import run_privacy_export
+
+        job = PrivacyJob.objects.filter(user=user, kind='export', status__in=['pending', 'running']).first()
+        if job is None:
+            job = PrivacyJob.objects.create(user=user, kind='export')
+        elif not PrivacyJob.objects.filter(_stalled(), pk=job.pk).exists():
+            return job
+        job_id = str(job.pk)
+        transaction.on_commit(lambda: run_privacy_export.delay(job_id))
+        return job
+
+    @staticmethod
+    def run(job_id) -> bool:
+        """
+        Écrit l'archive. Fichier temporaire renommé à la fin : une archive
+        servie est toujours complète.
+
+        Returns:
+            True si l'archive est prête (False si échec ou job déjà pris)
+        """
+        job = _claim(job_id, 'export')
+        if job is None:
+            return False
+
+        os.makedirs(PrivacyExport.export_dir(), exist_ok=True)
+        path = os.path.join(PrivacyExport.export_dir(), f'{job.pk}.zip')
+        partial = f'{path}.part'
+        job.progress = {}
+        try:
+            with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for name, queryset in PrivacyExport.sections(job.user_id):
+                    count = 0
+                    with archive.open(f'{name}.jsonl', 'w') as stream:
+                        for row in queryset.iterator(chunk_size=PrivacyExport.CHUNK_SIZE):
+                            stream.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode())
+                            stream.write(b'\n')
+                            count += 1
+                            if count % PrivacyExport.CHUNK_SIZE == 0:
+                                _report(job, name, count)
+                    _report(job, name, count)
+            os.replace(partial, path)
+        except Exception as e:
+            logger.error(f"Export RGPD {job.pk} échoué: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            _finish(job, 'failed', str(e))
+            return False
+
+        job.file_path = path
+        job.download_token = secrets.token_urlsafe(32)
+        job.expires_at = timezone.now() + PrivacyExport.ttl()
+        _finish(job, 'completed')
+        logger.info(f"Export RGPD {job.pk} prêt ({sum(job.progress.values())} lignes)")
+        return True
+
+    @staticmethod
+    def for_download(token):
+        """Job d'export terminé et non expiré pour ce jeton, ou None"""
+        from apps.users.models import PrivacyJob
+
+        if not token:
+            return None
+        return PrivacyJob.objects.filter(
+            kind='export', status='completed', download_token=token, expires_at__gt=timezone.now()
+        ).first()
+
+    @staticmethod
+    def purge_expired() -> int:
+        """Supprime les archives expirées. Returns: nombre d'archives supprimées"""
+        from apps.users.models import PrivacyJob
+
+        expired = PrivacyJob.objects.filter(kind='export', expires_at__lte=timezone.now()).exclude(file_path='')
+        count = 0
+        for job in expired.iterator():
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            PrivacyJob.objects.filter(pk=job.pk).update(file_path='', download_token=None)
+            count += 1
+        return count
+
+
+class AccountDeletion:
+    """Suppression du compte : anonymisation immédiate, données supprimées par lots"""
+
+    CHUNK_SIZE = 500
+
+    @staticmethod
+    def request(user):
+        """
+        Anonymise et désactive le compte (jetons révoqués), puis planifie la
+        suppression des données. Une suppression déjà en cours est renvoyée
+        (relancée si son worker est mort) au lieu d'en créer une autre.
+
+        Returns:
+            PrivacyJob
+        """
+        from apps.users.models import CustomUser, PrivacyJob
+        from apps.users.tasks import run_account_deletion
+
+        with transaction.atomic():
+            user = CustomUser.objects.select_for_update().get(pk=user.pk)
+            AccountDeletion.anonymize(user)
+            job = PrivacyJob.objects.filter(user=user, kind='deletion', status__in=['pending', 'running']).first()
+            if job is None:
+                job = PrivacyJob.objects.create(user=user, kind='deletion')
+            elif not PrivacyJob.objects.filter(_stalled(), pk=job.pk).exists():
+                return job
+            job_id = str(job.pk)
+            transaction.on_commit(lambda: run_account_deletion.delay(job_id))
+        return job
+
+    @staticmethod
+    def anonymize(user):
+        from apps.users.models import PasswordResetToken, SellerProfile, SellerSubscription, UserVerificationToken
+
+        SellerProfile.objects.filter(user=user).delete()
+        SellerSubscription.objects.filter(user=user).delete()
+        UserVerificationToken.objects.filter(user=user).delete()
+        PasswordResetToken.objects.filter(user=user).delete()
+
+        user.email = f'deleted_{user.id}@example.com'
+        user.username = f'deleted_{user.id}'
+        user.first_name = ''
+        user.last_name = ''
+        user.phone = ''
+        user.avatar = None
+        user.bio = ''
+        user.location = ''
+        user.shop_name = ''
+        user.company_name = ''
+        user.is_active = False
+        user.is_verified = False
+        user.set_unusable_password()
+        user.save()
+
+    @staticmethod
+    def steps(user_id):
+        """(étape, queryset, traitement d'un lot) dans l'ordre d'exécution"""
+        from apps.analytics.models import Event
+        from apps.listings.models import Favorite, Listing, ViewHistory
+        from apps.messaging.models import BlockedUser, Conversation, Message, Notification, Report
+        from apps.reviews.models import FavoriteSeller, Review, ReviewReport
+
+        conversations = Conversation.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id))
+        delete = AccountDeletion._delete
+
+        return [
+            ('events', Event.objects.filter(user_id=user_id), lambda batch: batch.update(user=None)),
+            ('events_received', Event.objects.filter(target_user_id=user_id),
+             lambda batch: batch.update(target_user=None)),
+            ('view_history', ViewHistory.objects.filter(user_id=user_id), delete),
+            ('notifications', Notification.objects.filter(user_id=user_id), delete),
+            ('favorites', Favorite.objects.filter(user_id=user_id), AccountDeletion._delete_favorites),
+            ('favorite_sellers', FavoriteSeller.objects.filter(Q(user_id=user_id) | Q(seller_id=user_id)), delete),
+            ('messages', Message.objects.filter(conversation__in=conversations.values('pk')), delete),
+            ('conversations', conversations, delete),
+            ('blocked_users', BlockedUser.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)), delete),
+            ('reports', Report.objects.filter(Q(reporter_id=user_id) | Q(reported_user_id=user_id)), delete),
+            ('review_reports', ReviewReport.objects.filter(reporter_id=user_id), delete),
+            ('reviews_written', Review.objects.filter(reviewer_id=user_id), AccountDeletion._delete_reviews),
+            ('reviews_received', Review.objects.filter(seller_id=user_id), AccountDeletion._delete_reviews),
+            ('listings', Listing.objects.filter(seller_id=user_id), delete),
+        ]
+
+    @staticmethod
+    def _delete(batch):
+        batch.delete()
+
+    @staticmethod
+    def _delete_favorites(batch):
+        """Favoris supprimés et compteurs des annonces ajustés (un favori par annonce)"""
+        from apps.listings.models import Listing
+
+        listing_ids = list(batch.values_list('listing_id', flat=True))
+        batch.delete()
+        Listing.objects.filter(pk__in=listing_ids, favorites_count__gt=0).update(
+            favorites_count=F('favorites_count') - 1
+        )
+
+    @staticmethod
+    def _delete_reviews(batch):
+        """Avis supprimés puis agrégats des vendeurs concernés recalculés"""
+        from apps.reviews.models import SellerRating
+
+        seller_ids = list(set(batch.values_list('seller_id', flat=True)))
+        batch.delete()
+        SellerRating.rebuild(seller_ids=seller_ids)
+
+    @staticmethod
+    def run(job_id) -> bool:
+        """
+        Supprime les données par lots de CHUNK_SIZE, une transaction par lot.
+        Idempotent : relancé après un échec, il reprend les lignes restantes.
+
+        Returns:
+            True si la suppression est terminée
+        """
+        from apps.orders.models import Order
+        from apps.users.models import CustomUser
+
+        job = _claim(job_id, 'deletion')
+        if job is None:
+            return False
+        user_id = job.user_id
+
+        try:
+            if user_id is not None:
+                for name, queryset, handle in AccountDeletion.steps(user_id):
+                    done = job.progress.get(name, 0)
+                    while True:
+                        ids = list(queryset.values_list('pk', flat=True)[:AccountDeletion.CHUNK_SIZE])
+                        if not ids:
+                            break
+                        with transaction.atomic():
+                            handle(queryset.model.objects.filter(pk__in=ids))
+                        done += len(ids)
+                        _report(job, name, done)
+                    _report(job, name, done)
+
+                # Commandes conservées (comptabilité) : le compte reste anonymisé
+                if Order.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id)).exists():
+                    job.progress['account'] = 'anonymized'
+                else:
+                    user = CustomUser.objects.filter(pk=user_id).first()
+                    if user is not None:
+                        user.delete()
+                    job.progress['account'] = 'deleted'
+                job.current_step = 'account'
+        except Exception as e:
+            logger.error(f"Suppression RGPD {job.pk} interrompue à l'étape {job.current_step}: {e}")
+            _finish(job, 'dead' if job.attempts >= MAX_ATTEMPTS else 'failed', str(e))
+            return False
+
+        _finish(job, 'completed')
+        logger.info(f"Suppression RGPD {job.pk} terminée ({job.progress.get('account')})")
+        return True
+
+    @staticmethod
+    def resume_stalled() -> int:
+        """
+        Relance les suppressions en échec, jamais démarrées ou dont le worker
+        est mort. Celles qui ont épuisé leurs MAX_ATTEMPTS prises passent en
+        'dead' (relance depuis l'admin). Returns: nombre de jobs relancés
+        """
+        from apps.users.models import PrivacyJob
+        from apps.users.tasks import run_account_deletion
+
+        stalled = PrivacyJob.objects.filter(kind='deletion').filter(Q(status='failed') | _stalled())
+        exhausted = stalled.filter(attempts__gte=MAX_ATTEMPTS).update(
+            status='dead', finished_at=timezone.now()
+        )
+        if exhausted:
+            logger.error(f"Suppressions RGPD abandonnées après {MAX_ATTEMPTS} tentatives: {exhausted}")
+
+        job_ids = [str(job_id) for job_id in stalled.filter(attempts__lt=MAX_ATTEMPTS).values_list('pk', flat=True)]
+        for job_id in job_ids:
+            run_account_deletion.delay(job_id)
+        return len(job_ids)
+
+    @staticmethod
+    def retry(queryset) -> int:
+        """
+        Relance des suppressions abandonnées ou en échec (action admin),
+        avec un nouveau quota de tentatives.
+
+        Returns:
+            Nombre de suppressions relancées
+        """
+        from apps.users.tasks import run_account_deletion
+
+        job_ids = [
+            str(job_id) for job_id in
+            queryset.filter(kind='deletion', status__in=['dead', 'failed']).values_list('pk', flat=True)
+        ]
+        queryset.model.objects.filter(pk__in=job_ids).update(status='failed', attempts=0, finished_at=None)
+
+        for job_id in job_ids:
+            transaction.on_commit(lambda job_id=job_id: run_account_deletion.delay(job_id))
+        return len(job_ids)
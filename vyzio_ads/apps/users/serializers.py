@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CustomUser, SellerSubscription, SellerProfile, PasswordResetToken
+from .models import CustomUser, SellerSubscription, SellerProfile, PasswordResetToken, PrivacyJob
 from django.contrib.auth.password_validation import validate_password
 
 
@@ -114,6 +114,38 @@ class UserDetailSerializer(serializers.ModelSerializer):
         return None
 
 
+class LoginUserSerializer(serializers.ModelSerializer):
+    """Utilisateur renvoyé à la connexion (sans relations ; détail via /me/)"""
+    
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar', 'role',
+                  'is_professional', 'is_verified', 'is_active_seller', 'subscription_type',
+                  'is_superuser')
+        read_only_fields = fields
+
+
+class PrivacyJobSerializer(serializers.ModelSerializer):
+    """Suivi d'une demande RGPD (export ou suppression)"""
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = PrivacyJob
+        fields = ('id', 'kind', 'status', 'progress', 'current_step', 'error_message',
+                  'created_at', 'finished_at', 'expires_at', 'download_url')
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        from django.urls import reverse
+        from django.utils import timezone
+        
+        if obj.status != 'completed' or not obj.download_token or obj.expires_at <= timezone.now():
+            return None
+        url = f"{reverse('users-export-download')}?token={obj.download_token}"
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
 class PasswordResetRequestSerializer(serializers.Serializer):
     """Serializer pour demande de reset mot de passe"""
     email = serializers.EmailField(required=True)
@@ -0,0 +1,42 @@
+"""
+Tâches Celery des utilisateurs (demandes RGPD).
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def run_privacy_export(job_id):
+    """Écrit l'archive d'export des données d'un utilisateur."""
+    from apps.users.privacy import PrivacyExport
+
+    return PrivacyExport.run(job_id)
+
+
+@shared_task(ignore_result=True)
+def run_account_deletion(job_id):
+    """Supprime par lots les données d'un compte anonymisé."""
+    from apps.users.privacy import AccountDeletion
+
+    return AccountDeletion.run(job_id)
+
+
+@shared_task(ignore_result=True)
+def resume_account_deletions():
+    """Balayage périodique : suppressions en échec ou dont le worker est mort."""
+    from apps.users.privacy import AccountDeletion
+
+    resumed = AccountDeletion.resume_stalled()
+    if resumed:
+        logger.warning(f"Suppressions de compte relancées: {resumed}")
+    return resumed
+
+
+@shared_task(ignore_result=True)
+def purge_privacy_exports():
+    """Supprime les archives d'export expirées."""
+    from apps.users.privacy import PrivacyExport
+
+    return PrivacyExport.purge_expired()
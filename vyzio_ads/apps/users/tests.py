@@ -84,6 +84,21 @@ def seller_client(api_client, create_user):
     return api_client, user
 
 
+@pytest.fixture
+def locmem_cache(settings):
+    """Cache réel (LocMem) : le cache de test est factice"""
+    from django.core.cache import cache
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'users-tests',
+        }
+    }
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
 # ==================== TESTS D'INSCRIPTION ====================
 
 @pytest.mark.django_db
@@ -208,6 +223,84 @@ class TestLogin:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+@pytest.mark.django_db
+class TestLoginPath:
+    """Backend email, last_login par lots, réponse allégée"""
+    
+    def test_backend_email_or_username_single_lookup(self, create_user, django_assert_num_queries):
+        """Une requête par tentative, réussie ou non"""
+        from django.contrib.auth import authenticate
+        user = create_user()
+        
+        with django_assert_num_queries(1):
+            assert authenticate(email='test@example.com', password='TestPassword123!') == user
+        with django_assert_num_queries(1):
+            assert authenticate(username='testuser', password='TestPassword123!') == user
+        with django_assert_num_queries(1):
+            assert authenticate(email='test@example.com', password='Mauvais123!') is None
+        with django_assert_num_queries(1):
+            assert authenticate(email='absent@example.com', password='TestPassword123!') is None
+    
+    def test_inactive_user_cannot_authenticate(self, create_user):
+        from django.contrib.auth import authenticate
+        create_user(is_active=False)
+        assert authenticate(email='test@example.com', password='TestPassword123!') is None
+    
+    def test_login_response_is_lean(self, api_client, create_user):
+        """Pas de relations vendeur dans la réponse de connexion"""
+        user = create_user()
+        
+        response = api_client.post(reverse('auth_login'), {
+            'email': 'test@example.com',
+            'password': 'TestPassword123!'
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['user']['id'] == str(user.id)
+        assert 'seller_subscription' not in response.data['user']
+        assert 'seller_profile' not in response.data['user']
+        user.refresh_from_db()
+        assert user.last_login is not None
+    
+    def test_last_login_writer_batches(self, create_user, django_assert_num_queries):
+        """Connexions écrites en un seul UPDATE, horodatage le plus récent conservé"""
+        from apps.users.last_login import LastLoginWriter
+        users = [create_user(email=f'u{i}@example.com', username=f'u{i}') for i in range(3)]
+        writer = LastLoginWriter()
+        writer.FLUSH_INTERVAL = 60
+        now = timezone.now()
+        
+        writer.record(users[0].pk, now - timedelta(minutes=5))
+        writer.record(users[0].pk, now)
+        writer.record(users[0].pk, now - timedelta(minutes=1))
+        for user in users[1:]:
+            writer.record(user.pk, now)
+        assert writer.pending() == 3
+        assert not CustomUser.objects.filter(last_login__isnull=False).exists()
+        
+        with django_assert_num_queries(1):
+            assert writer.flush() == 3
+        assert writer.pending() == 0
+        assert set(CustomUser.objects.values_list('last_login', flat=True)) == {now}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_login_benchmark_command():
+    """Benchmark de connexion : succès et échecs, utilisateurs supprimés"""
+    from io import StringIO
+    from django.core.management import call_command
+    out = StringIO()
+    
+    # Un seul worker pour le chemin réussi : la base SQLite de test en mémoire
+    # verrouille la table si deux threads écrivent last_login en même temps
+    call_command('login_benchmark', '--users', '3', '--logins', '12', '--workers', '1', stdout=out)
+    call_command('login_benchmark', '--users', '2', '--logins', '4', '--workers', '2', '--wrong-password', stdout=out)
+    
+    assert out.getvalue().count('Benchmark terminé') == 2
+    assert 'Connexions : 12' in out.getvalue()
+    assert not CustomUser.objects.filter(email__startswith='bench_').exists()
+
+
 # ==================== TESTS DU PROFIL (ME) ====================
 
 @pytest.mark.django_db
@@ -403,6 +496,116 @@ class TestPermissions:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+@pytest.mark.django_db
+class TestEntitlements:
+    """Droits (abonnement, crédits, blocages) chargés une fois et mis en cache"""
+    
+    @pytest.fixture
+    def plan(self):
+        from decimal import Decimal
+        from apps.payments.models import SubscriptionPlan
+        return SubscriptionPlan.objects.create(
+            name='Pro', slug='pro', plan_type='pro', billing_cycle='monthly',
+            price=Decimal('29.99'), max_listings=2,
+        )
+    
+    @pytest.fixture
+    def seller(self, create_user, plan):
+        from apps.payments.models import PostCredit, Subscription
+        user = create_user(email='seller@example.com', username='seller', role='seller')
+        Subscription.objects.create(user=user, plan=plan, status='active', stripe_subscription_id='sub_ent')
+        PostCredit.objects.create(user=user, balance=3)
+        return user
+    
+    def test_loaded_once_then_cached(self, seller, locmem_cache, django_assert_num_queries):
+        from apps.users.entitlements import EntitlementService
+        
+        with django_assert_num_queries(3):
+            entitlements = EntitlementService.for_user(seller.pk)
+        with django_assert_num_queries(0):
+            assert EntitlementService.for_user(seller.pk) == entitlements
+        
+        assert entitlements.has_active_subscription
+        assert entitlements.can_create_listing
+        assert entitlements.remaining_listings == 2
+        assert entitlements.credits_balance == 3
+    
+    def test_memoized_on_request(self, seller, django_assert_num_queries):
+        from types import SimpleNamespace
+        from apps.users.entitlements import EntitlementService
+        
+        request = SimpleNamespace(user=seller)
+        with django_assert_num_queries(3):
+            first = EntitlementService.for_request(request)
+            assert EntitlementService.for_request(request) is first
+        
+        anonymous = SimpleNamespace(user=None)
+        assert not EntitlementService.for_request(anonymous).can_publish
+    
+    def test_webhook_invalidates_cached_entitlements(self, seller, locmem_cache, django_capture_on_commit_callbacks):
+        from apps.payments.services import WebhookHandler
+        from apps.users.entitlements import EntitlementService
+        
+        assert EntitlementService.for_user(seller.pk).has_active_subscription
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            assert WebhookHandler().process_event({
+                'id': 'evt_ent_deleted', 'type': 'customer.subscription.deleted',
+                'data': {'object': {'id': 'sub_ent'}},
+            })
+        
+        entitlements = EntitlementService.for_user(seller.pk)
+        assert not entitlements.has_active_subscription
+        assert entitlements.can_publish  # crédits restants
+    
+    def test_credit_use_and_plan_change_invalidate(self, seller, plan, locmem_cache, django_capture_on_commit_callbacks):
+        from apps.users.entitlements import EntitlementService
+        
+        EntitlementService.for_user(seller.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            seller.post_credits.use_credit()
+            plan.max_listings = -1
+            plan.save()
+        
+        entitlements = EntitlementService.for_user(seller.pk)
+        assert entitlements.credits_balance == 2
+        assert entitlements.remaining_listings == float('inf')
+    
+    def test_block_checks(self, create_user, locmem_cache, django_capture_on_commit_callbacks):
+        from types import SimpleNamespace
+        from apps.messaging.models import BlockedUser
+        from apps.users.entitlements import EntitlementService
+        from apps.users.permissions import CanSendMessage
+        
+        sender = create_user(email='sender@example.com', username='sender')
+        recipient = create_user(email='recipient@example.com', username='recipient')
+        permission = CanSendMessage()
+        request = lambda: SimpleNamespace(user=sender, data={'recipient_id': str(recipient.pk)})
+        
+        assert permission.has_permission(request(), None)
+        with django_capture_on_commit_callbacks(execute=True):
+            block = BlockedUser.objects.create(blocker=recipient, blocked=sender)
+        assert not permission.has_permission(request(), None)
+        assert EntitlementService.for_user(recipient.pk).is_blocked_with(sender.pk)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            block.delete()
+        assert permission.has_permission(request(), None)
+    
+    def test_can_publish_endpoint(self, api_client, seller, locmem_cache, django_assert_num_queries):
+        api_client.force_authenticate(user=seller)
+        
+        with django_assert_num_queries(3):
+            response = api_client.get('/api/listings/can-publish/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['can_publish'] is True
+        assert response.data['credits_balance'] == 3
+        assert response.data['subscription_info']['plan_name'] == 'Pro'
+        
+        with django_assert_num_queries(0):
+            assert api_client.get('/api/listings/can-publish/').data['has_subscription'] is True
+
+
 # ==================== TESTS TOKEN REFRESH ====================
 
 @pytest.mark.django_db
@@ -441,6 +644,415 @@ class TestTokenRefresh:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+@pytest.mark.django_db
+class TestTokenClaims:
+    """Jetons d'accès avec claims : request.user sans requête, révocation en cache"""
+    
+    CAN_PUBLISH_URL = '/api/listings/can-publish/'
+    
+    @pytest.fixture
+    def tokens(self, api_client, create_user):
+        user = create_user()
+        response = api_client.post(reverse('auth_login'), {
+            'email': 'test@example.com',
+            'password': 'TestPassword123!'
+        }, format='json')
+        return user, response.data['tokens']
+    
+    def test_authenticated_request_without_user_query(self, api_client, locmem_cache, tokens,
+                                                      django_assert_num_queries):
+        # Date de révocation copiée en cache à la connexion
+        user, issued = tokens
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {issued['access']}")
+        
+        # Acheteur : refus sur le rôle, lu dans le jeton
+        with django_assert_num_queries(0):
+            response = api_client.get(self.CAN_PUBLISH_URL)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['reason'] == 'role'
+    
+    def test_token_user_loads_other_fields_once(self, tokens, django_assert_num_queries):
+        from apps.users.tokens import ClaimsAccessToken
+        user, issued = tokens
+        
+        with django_assert_num_queries(0):
+            token_user = ClaimsAccessToken(issued['access']).get_user()
+            assert isinstance(token_user, CustomUser)
+            assert token_user.pk == user.pk and token_user.role == 'buyer'
+            assert not token_user.is_banned
+        with django_assert_num_queries(1):
+            assert token_user.email == 'test@example.com'
+            assert token_user.username == 'testuser'
+    
+    def test_ban_revokes_access_and_refresh(self, api_client, tokens, locmem_cache, django_capture_on_commit_callbacks):
+        user, issued = tokens
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {issued['access']}")
+        assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_200_OK
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_banned = True
+            user.save()
+        
+        assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_401_UNAUTHORIZED
+        response = api_client.post(reverse('auth_token_refresh'), {'refresh': issued['refresh']}, format='json')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_ban_survives_cache_flush(self, api_client, tokens, locmem_cache, django_capture_on_commit_callbacks):
+        user, issued = tokens
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {issued['access']}")
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_banned = True
+            user.save()
+        # Autre modification de la même instance : la révocation n'est pas écrasée
+        user.bio = 'Nouvelle bio'
+        user.save()
+        locmem_cache.clear()
+        
+        assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_401_UNAUTHORIZED
+        user.refresh_from_db()
+        assert locmem_cache.get(f'users:tokens_revoked:{user.pk}') == user.tokens_valid_after > 0
+    
+    def test_revocation_read_from_database_without_shared_cache(self, api_client, tokens, locmem_cache, settings,
+                                                                django_capture_on_commit_callbacks,
+                                                                django_assert_num_queries):
+        from apps.users.tokens import TokenRevocationList
+        settings.TOKEN_REVOCATION_CACHE = False
+        user, issued = tokens
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {issued['access']}")
+        
+        with django_assert_num_queries(1):
+            assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_200_OK
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+            TokenRevocationList.revoke(user.pk)
+        
+        assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_401_UNAUTHORIZED
+        assert locmem_cache.get(f'users:tokens_revoked:{user.pk}') is None
+    
+    def test_role_change_picked_up_on_refresh(self, api_client, create_user, locmem_cache, monkeypatch,
+                                              django_capture_on_commit_callbacks):
+        import time
+        from datetime import timedelta
+        from types import SimpleNamespace
+        from rest_framework_simplejwt import tokens as jwt_tokens
+        from apps.users import tokens as token_module
+        user = create_user()
+        
+        # Jetons émis il y a 5 s, rôle modifié il y a 2 s, rafraîchissement maintenant
+        now = jwt_tokens.aware_utcnow()
+        with monkeypatch.context() as patch:
+            patch.setattr(jwt_tokens, 'aware_utcnow', lambda: now - timedelta(seconds=5))
+            issued = api_client.post(reverse('auth_login'), {
+                'email': 'test@example.com',
+                'password': 'TestPassword123!'
+            }, format='json').data['tokens']
+        
+        monkeypatch.setattr(token_module, 'time', SimpleNamespace(time=lambda: time.time() - 2))
+        with django_capture_on_commit_callbacks(execute=True):
+            user.role = 'seller'
+            user.save()
+        
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {issued['access']}")
+        assert api_client.get(self.CAN_PUBLISH_URL).status_code == status.HTTP_401_UNAUTHORIZED
+        
+        api_client.credentials()
+        refreshed = api_client.post(reverse('auth_token_refresh'), {'refresh': issued['refresh']}, format='json')
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {refreshed.data['access']}")
+        response = api_client.get(self.CAN_PUBLISH_URL)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['reason'] == 'no_payment'
+    
+    def test_token_without_claims_still_accepted(self, api_client, create_user):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        create_user()
+        user = CustomUser.objects.get(email='test@example.com')
+        
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        response = api_client.get(reverse('auth_me'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['email'] == 'test@example.com'
+    
+    def test_admin_ban_action_revokes(self, tokens, locmem_cache, django_capture_on_commit_callbacks):
+        from unittest.mock import MagicMock
+        from django.contrib.admin.sites import site
+        from apps.users.tokens import ClaimsAccessToken, TokenRevocationList
+        user, issued = tokens
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            site._registry[CustomUser].ban_users(MagicMock(), CustomUser.objects.filter(pk=user.pk))
+        assert TokenRevocationList.is_revoked(ClaimsAccessToken(issued['access']))
+    
+    def test_admin_ban_from_filtered_changelist_revokes(self, tokens, create_user, locmem_cache,
+                                                         django_capture_on_commit_callbacks):
+        from django.test import Client
+        from apps.users.tokens import ClaimsAccessToken, TokenRevocationList
+        user, issued = tokens
+        admin_user = CustomUser.objects.create_superuser(
+            email='admin@example.com', username='admin', password='AdminPassword123!'
+        )
+        client = Client()
+        client.force_login(admin_user)
+        
+        # Liste filtrée sur les non-bannis : plus aucune ligne ne correspond après l'UPDATE
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post('/admin/users/customuser/?is_banned__exact=0', {
+                'action': 'ban_users',
+                '_selected_action': [str(user.pk)],
+            })
+        assert response.status_code == 302
+        
+        user.refresh_from_db()
+        assert user.is_banned
+        assert TokenRevocationList.is_revoked(ClaimsAccessToken(issued['access']))
+
+
+# ==================== TESTS RGPD ====================
+
+@pytest.mark.django_db
+class TestPrivacy:
+    """Export RGPD en archive zip et suppression du compte par lots"""
+    
+    @pytest.fixture
+    def export_dir(self, settings, tmp_path):
+        settings.PRIVACY_EXPORT_DIR = str(tmp_path)
+        return tmp_path
+    
+    @pytest.fixture
+    def account(self, create_user):
+        """Vendeur avec annonces, conversation, avis et favoris"""
+        from apps.listings.models import Category, Listing
+        from apps.listings.services import FavoriteService
+        from apps.messaging.models import Conversation, Message
+        from apps.reviews.models import Review
+        
+        seller = create_user(email='seller@example.com', username='seller', role='seller')
+        other = create_user(email='other@example.com', username='other', role='seller')
+        category = Category.objects.create(name='Vélos', slug='velos')
+        listings = [
+            Listing.objects.create(title=f'Vélo {i}', description='Bon état', price=100,
+                                   seller=seller, category=category, status='active')
+            for i in range(3)
+        ]
+        other_listing = Listing.objects.create(title='Casque', description='Neuf', price=20,
+                                               seller=other, category=category, status='active')
+        FavoriteService.add_listing(seller, other_listing)
+        conversation = Conversation.objects.create(buyer=other, seller=seller, listing=listings[0])
+        for i in range(5):
+            Message.objects.create(conversation=conversation, sender=other, content=f'Message {i}')
+        Review.objects.create(reviewer=other, seller=seller, rating=5, comment='Parfait')
+        Review.objects.create(reviewer=seller, seller=other, rating=4, comment='Bien')
+        return seller, other, other_listing
+    
+    def test_export_streams_related_tables_to_zip(self, api_client, account, export_dir,
+                                                  django_capture_on_commit_callbacks):
+        import io
+        import json
+        import zipfile
+        seller, other, _ = account
+        api_client.force_authenticate(user=seller)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post('/api/users/export_data/')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        
+        response = api_client.get('/api/users/export_data/')
+        assert response.data['status'] == 'completed'
+        assert response.data['progress']['listings'] == 3
+        assert response.data['progress']['messages'] == 5
+        
+        # Téléchargement par jeton, sans authentification
+        download = APIClient().get(response.data['download_url'])
+        assert download.status_code == status.HTTP_200_OK
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(download.streaming_content)))
+        profile = json.loads(archive.read('profile.jsonl').decode())
+        assert profile['email'] == 'seller@example.com'
+        assert 'password' not in profile
+        assert len(archive.read('messages.jsonl').decode().splitlines()) == 5
+        assert len(archive.read('reviews_received.jsonl').decode().splitlines()) == 1
+        assert archive.read('orders.jsonl') == b''
+    
+    def test_expired_export_is_refused_and_purged(self, api_client, account, export_dir):
+        import os
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import PrivacyExport
+        seller, _, _ = account
+        
+        job = PrivacyJob.objects.create(user=seller, kind='export')
+        assert PrivacyExport.run(job.pk)
+        job.refresh_from_db()
+        assert os.path.exists(job.file_path)
+        
+        url = reverse('users-export-download')
+        response = api_client.get(url, {'token': job.download_token})
+        assert response.status_code == status.HTTP_200_OK
+        response.close()
+        
+        PrivacyJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        response = api_client.get(url, {'token': job.download_token})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        
+        assert PrivacyExport.purge_expired() == 1
+        assert not os.path.exists(job.file_path)
+    
+    def test_stalled_export_is_restarted(self, account, export_dir, django_capture_on_commit_callbacks):
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import STALL_AFTER, PrivacyExport
+        seller, _, _ = account
+        
+        # Worker mort après avoir pris le job
+        stalled = PrivacyJob.objects.create(user=seller, kind='export', status='running',
+                                            heartbeat_at=timezone.now() - STALL_AFTER - timedelta(minutes=1))
+        with django_capture_on_commit_callbacks(execute=True):
+            job = PrivacyExport.request(seller)
+        
+        assert job.pk == stalled.pk
+        job.refresh_from_db()
+        assert job.status == 'completed' and job.download_token
+    
+    def test_running_job_with_live_worker_is_not_reclaimed(self, account, export_dir):
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import AccountDeletion, PrivacyExport
+        seller, _, _ = account
+        
+        export = PrivacyJob.objects.create(user=seller, kind='export', status='running', heartbeat_at=timezone.now())
+        deletion = PrivacyJob.objects.create(user=seller, kind='deletion', status='running', heartbeat_at=timezone.now())
+        
+        assert PrivacyExport.request(seller).pk == export.pk
+        assert not PrivacyExport.run(export.pk)
+        assert AccountDeletion.resume_stalled() == 0
+        assert PrivacyJob.objects.get(pk=deletion.pk).status == 'running'
+    
+    def test_stalled_deletion_is_resumed(self, account):
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import STALL_AFTER, AccountDeletion
+        seller, _, _ = account
+        AccountDeletion.anonymize(seller)
+        
+        job = PrivacyJob.objects.create(user=seller, kind='deletion', status='running', current_step='messages',
+                                        heartbeat_at=timezone.now() - STALL_AFTER - timedelta(minutes=1))
+        
+        assert AccountDeletion.resume_stalled() == 1
+        job.refresh_from_db()
+        assert job.status == 'completed' and job.progress['account'] == 'deleted'
+        assert not CustomUser.objects.filter(pk=seller.pk).exists()
+    
+    def test_failing_deletion_is_abandoned_after_max_attempts(self, account, monkeypatch,
+                                                              django_capture_on_commit_callbacks):
+        from django.contrib.admin.sites import site
+        from unittest.mock import MagicMock
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import MAX_ATTEMPTS, AccountDeletion
+        seller, _, _ = account
+        AccountDeletion.anonymize(seller)
+        job = PrivacyJob.objects.create(user=seller, kind='deletion', status='failed')
+        
+        with monkeypatch.context() as patch:
+            patch.setattr(AccountDeletion, 'steps', staticmethod(MagicMock(side_effect=RuntimeError('boom'))))
+            resumed = [AccountDeletion.resume_stalled() for _ in range(MAX_ATTEMPTS + 1)]
+        
+        # Une prise par balayage, puis plus aucune relance
+        assert resumed == [1] * MAX_ATTEMPTS + [0]
+        job.refresh_from_db()
+        assert (job.status, job.attempts, job.error_message) == ('dead', MAX_ATTEMPTS, 'boom')
+        assert AccountDeletion.run(job.pk) is False
+        
+        # Relance depuis l'admin : nouveau quota de tentatives
+        with django_capture_on_commit_callbacks(execute=True):
+            site._registry[PrivacyJob].retry_deletions(MagicMock(), PrivacyJob.objects.filter(pk=job.pk))
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == ('completed', 1)
+        assert not CustomUser.objects.filter(pk=seller.pk).exists()
+    
+    def test_exhausted_stalled_deletion_is_marked_dead(self, account):
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import MAX_ATTEMPTS, STALL_AFTER, AccountDeletion
+        seller, _, _ = account
+        job = PrivacyJob.objects.create(user=seller, kind='deletion', status='running', attempts=MAX_ATTEMPTS,
+                                        heartbeat_at=timezone.now() - STALL_AFTER - timedelta(minutes=1))
+        
+        assert AccountDeletion.resume_stalled() == 0
+        job.refresh_from_db()
+        assert job.status == 'dead' and job.finished_at is not None
+    
+    def test_repeated_deletion_request_reuses_job(self, account, django_capture_on_commit_callbacks):
+        from unittest.mock import patch
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import AccountDeletion
+        seller, _, _ = account
+        
+        with patch('apps.users.tasks.run_account_deletion.delay') as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                first = AccountDeletion.request(seller)
+                second = AccountDeletion.request(seller)
+        
+        assert first.pk == second.pk
+        assert PrivacyJob.objects.filter(user=seller, kind='deletion').count() == 1
+        delay.assert_called_once_with(str(first.pk))
+    
+    def test_deletion_removes_data_in_batches(self, api_client, account, monkeypatch,
+                                              django_capture_on_commit_callbacks):
+        from apps.listings.models import Listing
+        from apps.messaging.models import Conversation, Message
+        from apps.reviews.models import Review
+        from apps.users.models import PrivacyJob
+        from apps.users.privacy import AccountDeletion
+        seller, other, other_listing = account
+        monkeypatch.setattr(AccountDeletion, 'CHUNK_SIZE', 2)
+        api_client.force_authenticate(user=seller)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.delete('/api/users/delete_account/')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        
+        assert not CustomUser.objects.filter(pk=seller.pk).exists()
+        job = PrivacyJob.objects.get(pk=response.data['job']['id'])
+        assert job.status == 'completed'
+        assert job.progress['messages'] == 5 and job.progress['listings'] == 3
+        assert job.progress['account'] == 'deleted'
+        
+        assert not Listing.objects.filter(seller_id=seller.pk).exists()
+        assert not Conversation.objects.exists() and not Message.objects.exists()
+        assert not Review.objects.exists()
+        other_listing.refresh_from_db()
+        other.refresh_from_db()
+        assert other_listing.favorites_count == 0
+        assert other.total_reviews == 0
+    
+    def test_account_with_orders_is_kept_anonymized(self, api_client, account,
+                                                    django_capture_on_commit_callbacks):
+        from decimal import Decimal
+        from apps.orders.models import Order
+        from apps.users.models import PrivacyJob
+        seller, other, _ = account
+        Order.objects.create(buyer=other, seller=seller, listing_title='Vélo',
+                             item_price=Decimal('100'), seller_amount=Decimal('95'))
+        api_client.force_authenticate(user=seller)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.delete('/api/users/delete_account/')
+        
+        seller.refresh_from_db()
+        assert seller.email == f'deleted_{seller.pk}@example.com'
+        assert not seller.is_active and not seller.has_usable_password()
+        assert Order.objects.filter(seller=seller).exists()
+        assert PrivacyJob.objects.get(user=seller, kind='deletion').progress['account'] == 'anonymized'
+    
+    def test_deletion_revokes_access_tokens(self, api_client, create_user, locmem_cache,
+                                            django_capture_on_commit_callbacks):
+        create_user()
+        tokens = api_client.post(reverse('auth_login'), {
+            'email': 'test@example.com',
+            'password': 'TestPassword123!'
+        }, format='json').data['tokens']
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            assert api_client.delete('/api/users/delete_account/').status_code == status.HTTP_202_ACCEPTED
+        assert api_client.get('/api/users/me/').status_code == status.HTTP_401_UNAUTHORIZED
+
+
 # ==================== TESTS MODÈLES ====================
 
 @pytest.mark.django_db
@@ -0,0 +1,149 @@
+"""
+Jetons JWT portant les champs d'autorisation de l'utilisateur.
+
+Le jeton d'accès embarque id, rôle et statuts (banni, vérifié, staff...) :
+l'authentification construit request.user depuis le jeton, sans requête.
+Les autres champs sont chargés en une requête au premier accès.
+
+Un changement de ces champs (ban, rôle, vérification) révoque les jetons
+d'accès émis avant lui : le client reçoit un 401 et rafraîchit son jeton,
+dont les claims sont relus en base. La révocation est enregistrée sur
+l'utilisateur (tokens_valid_after) ; le cache n'en garde qu'une copie.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# Champs de CustomUser copiés dans le jeton d'accès
+TOKEN_CLAIM_FIELDS = ('role', 'is_banned', 'is_verified', 'is_staff', 'is_superuser', 'is_active')
+
+
+def set_user_claims(token, user):
+    for name in TOKEN_CLAIM_FIELDS:
+        token[name] = getattr(user, name)
+
+
+class ClaimsAccessToken(AccessToken):
+    """Jeton d'accès avec les claims de l'utilisateur"""
+
+    def has_user_claims(self) -> bool:
+        """False pour les jetons émis avant les claims (utilisateur chargé en base)"""
+        return all(name in self.payload for name in TOKEN_CLAIM_FIELDS)
+
+    def get_user(self):
+        """
+        Utilisateur construit depuis le jeton : instance de CustomUser dont
+        seuls l'id et les claims sont chargés, le reste étant différé.
+        """
+        User = get_user_model()
+        pk = User._meta.pk
+        values = {
+            pk.attname: pk.to_python(self.payload[api_settings.USER_ID_CLAIM]),
+            **{name: self.payload[name] for name in TOKEN_CLAIM_FIELDS},
+        }
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        user = User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+        user._from_token = True
+        return user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Jeton de rafraîchissement émettant des ClaimsAccessToken"""
+
+    access_token_class = ClaimsAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        TokenRevocationList.prime(user)
+        return token
+
+    def access_token_for(self, user) -> ClaimsAccessToken:
+        """Nouveau jeton d'accès avec les claims relus en base"""
+        access = self.access_token
+        set_user_claims(access, user)
+        return access
+
+
+class TokenRevocationList:
+    """
+    Révocations des jetons d'accès, par utilisateur.
+
+    La date de révocation est enregistrée sur l'utilisateur
+    (tokens_valid_after) : une éviction ou un vidage du cache ne la perd pas.
+    Le cache n'en garde qu'une copie, relue en base en cas d'absence, pour
+    la durée d'un jeton d'accès. Sans cache partagé entre processus
+    (TOKEN_REVOCATION_CACHE = False), la base est lue à chaque requête.
+
+    Précision à la seconde (claim iat) : un jeton émis dans la seconde de
+    la révocation est refusé lui aussi, le client le rafraîchit.
+    """
+
+    TTL = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+    @staticmethod
+    def _key(user_id):
+        return f'users:tokens_revoked:{user_id}'
+
+    @staticmethod
+    def _uses_cache() -> bool:
+        return getattr(settings, 'TOKEN_REVOCATION_CACHE', True)
+
+    @staticmethod
+    def revoke(*user_ids):
+        """
+        Révoque les jetons d'accès émis jusqu'ici : écrit en base dans la
+        transaction courante, copié dans le cache après commit.
+        """
+        from django.core.cache import cache
+
+        revoked_at = int(time.time())
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids:
+            return revoked_at
+        get_user_model().objects.filter(pk__in=user_ids).update(tokens_valid_after=revoked_at)
+        if TokenRevocationList._uses_cache():
+            entries = {TokenRevocationList._key(user_id): revoked_at for user_id in user_ids}
+            transaction.on_commit(lambda: cache.set_many(entries, TokenRevocationList.TTL))
+        return revoked_at
+
+    @staticmethod
+    def prime(user):
+        """Copie en cache la date de révocation d'un utilisateur chargé (connexion)."""
+        from django.core.cache import cache
+
+        if TokenRevocationList._uses_cache() and 'tokens_valid_after' in user.__dict__:
+            cache.add(TokenRevocationList._key(user.pk), user.tokens_valid_after, TokenRevocationList.TTL)
+
+    @staticmethod
+    def valid_after(user_id):
+        """
+        Date de révocation de l'utilisateur, None s'il n'existe plus.
+        Copie en cache par add : une révocation écrite entre-temps n'est
+        pas écrasée par une valeur lue avant elle.
+        """
+        from django.core.cache import cache
+
+        key = TokenRevocationList._key(user_id)
+        if TokenRevocationList._uses_cache():
+            revoked_at = cache.get(key)
+            if revoked_at is not None:
+                return revoked_at
+
+        revoked_at = get_user_model().objects.filter(pk=user_id).values_list(
+            'tokens_valid_after', flat=True
+        ).first()
+        if revoked_at is not None and TokenRevocationList._uses_cache():
+            cache.add(key, revoked_at, TokenRevocationList.TTL)
+        return revoked_at
+
+    @staticmethod
+    def is_revoked(token) -> bool:
+        revoked_at = TokenRevocationList.valid_after(token[api_settings.USER_ID_CLAIM])
+        # Utilisateur supprimé : tous ses jetons sont refusés
+        return revoked_at is None or token.get('iat', 0) <= revoked_at
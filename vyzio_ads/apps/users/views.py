@@ -1,9 +1,10 @@
+import os
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import CustomUser, SellerSubscription
-from .serializers import UserRegistrationSerializer, UserProfileSerializer, UserDetailSerializer, SellerSubscriptionSerializer
+from .models import CustomUser, SellerSubscription, PrivacyJob
+from .serializers import UserRegistrationSerializer, UserProfileSerializer, UserDetailSerializer, SellerSubscriptionSerializer, PrivacyJobSerializer
 from django.contrib.auth import authenticate
 from django_ratelimit.decorators import ratelimit
 from django.db import models
@@ -41,8 +42,8 @@ class UserViewSet(viewsets.ModelViewSet):
         
         user = authenticate(username=email, password=password)
         if user is not None:
-            from rest_framework_simplejwt.tokens import RefreshToken
-            refresh = RefreshToken.for_user(user)
+            from apps.users.tokens import ClaimsRefreshToken
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -112,45 +113,49 @@ class UserViewSet(viewsets.ModelViewSet):
             'subscription': SellerSubscriptionSerializer(request.user.seller_subscription).data if hasattr(request.user, 'seller_subscription') else None
         })
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['get', 'post'], permission_classes=[IsAuthenticated])
     def export_data(self, request):
-        """Export des données personnelles de l'utilisateur connecté (RGPD)"""
-        user = request.user
-        # Récupérer les données principales
-        user_data = UserDetailSerializer(user).data
-        # Ajouter les données associées si besoin (ex: seller_profile, seller_subscription)
-        # Ajoutez ici d'autres données liées si nécessaire
-        return Response(user_data)
+        """
+        Export des données personnelles (RGPD).
+        POST : lance l'export en tâche de fond ; GET : suivi du dernier export
+        (progression, puis lien de téléchargement).
+        """
+        from .privacy import PrivacyExport
+        
+        if request.method == 'POST':
+            job = PrivacyExport.request(request.user)
+            return Response(PrivacyJobSerializer(job, context={'request': request}).data,
+                            status=status.HTTP_202_ACCEPTED)
+        
+        job = PrivacyJob.objects.filter(user_id=request.user.pk, kind='export').first()
+        if job is None:
+            return Response({'detail': 'Aucun export demandé.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(PrivacyJobSerializer(job, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny],
+            url_path='export-data/download', url_name='export-download')
+    def export_download(self, request):
+        """Téléchargement de l'archive d'export (jeton à usage limité dans le temps)"""
+        from django.http import FileResponse
+        from .privacy import PrivacyExport
+        
+        job = PrivacyExport.for_download(request.query_params.get('token'))
+        if job is None or not os.path.exists(job.file_path):
+            return Response({'detail': 'Lien invalide ou expiré.'}, status=status.HTTP_404_NOT_FOUND)
+        filename = f"vyzio-export-{job.created_at:%Y-%m-%d}.zip"
+        return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=filename,
+                            content_type='application/zip')
 
     @action(detail=False, methods=['delete'], permission_classes=[IsAuthenticated])
     def delete_account(self, request):
-        """Suppression définitive du compte utilisateur (RGPD)"""
-        user = request.user
-        # Anonymisation/suppression des données associées
-        # Supprimer les profils liés
-        if hasattr(user, 'seller_profile'):
-            user.seller_profile.delete()
-        if hasattr(user, 'seller_subscription'):
-            user.seller_subscription.delete()
-        # Supprimer les tokens de reset et de vérification
-        if hasattr(user, 'verification_token'):
-            user.verification_token.delete()
-        if hasattr(user, 'password_reset_tokens'):
-            user.password_reset_tokens.all().delete()
-        # Anonymiser l'utilisateur avant suppression (optionnel)
-        user.email = f'deleted_{user.id}@example.com'
-        user.username = f'deleted_{user.id}'
-        user.first_name = ''
-        user.last_name = ''
-        user.phone = ''
-        user.avatar = None
-        user.bio = ''
-        user.location = ''
-        user.shop_name = ''
-        user.company_name = ''
-        user.is_active = False
-        user.is_verified = False
-        user.save()
-        # Supprimer le compte
-        user.delete()
-        return Response({'detail': 'Votre compte et vos données personnelles ont été supprimés.'}, status=status.HTTP_204_NO_CONTENT)
+        """
+        Suppression du compte (RGPD) : anonymisation et déconnexion immédiates,
+        données supprimées par lots en tâche de fond.
+        """
+        from .privacy import AccountDeletion
+        
+        job = AccountDeletion.request(request.user)
+        return Response({
+            'detail': 'Votre compte a été désactivé ; vos données personnelles sont en cours de suppression.',
+            'job': PrivacyJobSerializer(job).data,
+        }, status=status.HTTP_202_ACCEPTED)
@@ -1 +1,6 @@
 # Config package
+
+# Charger l'app Celery au démarrage de Django (shared_task)
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -107,10 +107,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom user model
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Connexion par email ou username : une requête, un calcul de hash
+AUTHENTICATION_BACKENDS = ['apps.users.backends.EmailBackend']
+
+# last_login écrit par lots (secondes entre deux écritures)
+LAST_LOGIN_FLUSH_INTERVAL = config('LAST_LOGIN_FLUSH_INTERVAL', default=5.0, cast=float)
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -131,6 +137,8 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Jetons d'accès avec rôle et statuts : pas de requête utilisateur par appel
+    'AUTH_TOKEN_CLASSES': ('apps.users.tokens.ClaimsAccessToken',),
 }
 
 # Celery Configuration
@@ -140,6 +148,43 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Paris'
+CELERY_BEAT_SCHEDULE = {
+    # Nouvelles tentatives des webhooks Stripe (backoff) et reprise des workers morts
+    'process-stripe-webhooks': {
+        'task': 'apps.payments.tasks.process_webhook_queue',
+        'schedule': 30.0,
+    },
+    # Clôture des commandes livrées non confirmées + libération des fonds
+    'complete-delivered-orders': {
+        'task': 'apps.orders.tasks.complete_delivered_orders',
+        'schedule': 60.0 * 60,
+    },
+    # Reconstruction des notes vendeurs (agrégats incrémentaux)
+    'reconcile-seller-ratings': {
+        'task': 'apps.reviews.tasks.reconcile_seller_ratings',
+        'schedule': 60.0 * 60 * 24,
+    },
+    # RGPD : reprise des suppressions de compte interrompues
+    'resume-account-deletions': {
+        'task': 'apps.users.tasks.resume_account_deletions',
+        'schedule': 60.0 * 60,
+    },
+    # RGPD : suppression des archives d'export expirées
+    'purge-privacy-exports': {
+        'task': 'apps.users.tasks.purge_privacy_exports',
+        'schedule': 60.0 * 60 * 24,
+    },
+}
+
+# Commandes : clôture automatique N jours après la livraison
+ORDER_AUTO_COMPLETE_DAYS = config('ORDER_AUTO_COMPLETE_DAYS', default=7, cast=int)
+
+# RGPD : archives d'export (hors MEDIA_ROOT, servies via jeton) et durée de validité
+PRIVACY_EXPORT_DIR = config('PRIVACY_EXPORT_DIR', default=str(BASE_DIR / 'private' / 'exports'))
+PRIVACY_EXPORT_TTL_DAYS = config('PRIVACY_EXPORT_TTL_DAYS', default=7, cast=int)
+
+# Webhooks Stripe : 'celery' (tâche par événement) ou 'poll' (manage.py process_webhooks)
+STRIPE_WEBHOOK_DISPATCH = config('STRIPE_WEBHOOK_DISPATCH', default='celery')
 
 # Channels Configuration
 CHANNEL_LAYERS = {
@@ -155,6 +200,8 @@ CHANNEL_LAYERS = {
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# URL de l'API Stripe (vide = api.stripe.com) ; ex. serveur local `manage.py stripe_standin`
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
 
 # Cloudinary Configuration
 CLOUDINARY_STORAGE = {
@@ -16,6 +16,9 @@ DATABASES = {
     }
 }
 
+# Index couvrants (INCLUDE) : ignorés par SQLite
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 # CORS - Allow all in development
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -30,6 +33,9 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Webhooks Stripe traités par `python manage.py process_webhooks` (pas de Celery)
+STRIPE_WEBHOOK_DISPATCH = 'poll'
+
 # Disable HTTPS requirements for development
 SECURE_SSL_REDIRECT = False
 SESSION_COOKIE_SECURE = False
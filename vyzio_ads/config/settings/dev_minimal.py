@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'apps.listings',
     'apps.messaging',
     'apps.payments',
+    'apps.orders',
     'apps.reviews',
     'apps.analytics',
     'apps.admin_panel',
@@ -81,6 +82,10 @@ DATABASES = {
     }
 }
 
+# Index couvrants (INCLUDE) : ignorés par SQLite
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -104,11 +109,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom user model
 AUTH_USER_MODEL = 'users.CustomUser'
+AUTHENTICATION_BACKENDS = ['apps.users.backends.EmailBackend']
 
 # DRF settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -130,6 +136,7 @@ from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'AUTH_TOKEN_CLASSES': ('apps.users.tokens.ClaimsAccessToken',),
 }
 
 # DISABLE verbose logging
@@ -83,6 +83,8 @@ else:
             'LOCATION': 'unique-snowflake',
         }
     }
+    # Cache propre à chaque processus : révocations des jetons lues en base
+    TOKEN_REVOCATION_CACHE = False
 
 # Static files - WhiteNoise compression
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
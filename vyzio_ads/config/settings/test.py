@@ -16,6 +16,12 @@ DATABASES = {
     }
 }
 
+# Index couvrants (INCLUDE) : ignorés par SQLite
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# last_login écrit immédiatement (pas de thread d'écriture)
+LAST_LOGIN_FLUSH_INTERVAL = None
+
 # Password hashers - Use faster hasher for tests
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
@@ -2,12 +2,19 @@
 Routage WebSocket pour Django Channels
 """
 from django.urls import re_path
-from apps.messaging.consumers import ChatConsumer, NotificationConsumer, TypingIndicatorConsumer
+from apps.messaging.consumers import ChatConsumer, NotificationConsumer, TypingIndicatorConsumer, UserStreamConsumer
 
 websocket_urlpatterns = [
+    # Socket multiplexé par utilisateur (conversations, notifications, frappe)
+    re_path(
+        r'ws/stream/$',
+        UserStreamConsumer.as_asgi(),
+        name='ws_stream'
+    ),
+    
     # Chat temps réel par conversation
     re_path(
-        r'ws/chat/(?P<conversation_id>\d+)/$',
+        r'ws/chat/(?P<conversation_id>[0-9a-f-]+)/$',
         ChatConsumer.as_asgi(),
         name='ws_chat'
     ),
@@ -21,7 +28,7 @@ websocket_urlpatterns = [
     
     # Indicateur de frappe (typing indicator)
     re_path(
-        r'ws/typing/(?P<conversation_id>\d+)/$',
+        r'ws/typing/(?P<conversation_id>[0-9a-f-]+)/$',
         TypingIndicatorConsumer.as_asgi(),
         name='ws_typing'
     ),